@@ -1,5 +1,23 @@
-from django.contrib import admin
+import io
+
+from django import forms
+from django.contrib import admin, messages
+from django.db import IntegrityError
+from django.shortcuts import redirect, render
+from django.urls import path
+
 from .models import User, Student, Parent
+from .utils import import_accounts, read_account_rows
+
+
+class AccountImportForm(forms.Form):
+    csv_file = forms.FileField(
+        help_text="Columns: first_name, last_name, email, gender, phone, address "
+        "and, for students, level and program."
+    )
+    role = forms.ChoiceField(
+        choices=[("student", "Students"), ("lecturer", "Lecturers")]
+    )
 
 
 class UserAdmin(admin.ModelAdmin):
@@ -24,6 +42,49 @@ class UserAdmin(admin.ModelAdmin):
         "is_staff",
     ]
 
+    change_list_template = "admin/accounts/user/change_list.html"
+
+    def get_urls(self):
+        urls = [
+            path(
+                "import/",
+                self.admin_site.admin_view(self.import_accounts_view),
+                name="accounts_user_import",
+            )
+        ]
+        return urls + super().get_urls()
+
+    def import_accounts_view(self, request):
+        if not self.has_add_permission(request):
+            return redirect("admin:accounts_user_changelist")
+        form = AccountImportForm(request.POST or None, request.FILES or None)
+        if request.method == "POST" and form.is_valid():
+            is_student = form.cleaned_data["role"] == "student"
+            csv_file = io.TextIOWrapper(
+                form.cleaned_data["csv_file"], encoding="utf-8-sig"
+            )
+            try:
+                rows = read_account_rows(csv_file, is_student)
+            except ValueError as error:
+                form.add_error("csv_file", str(error))
+            else:
+                try:
+                    users = import_accounts(rows, is_student)
+                except IntegrityError as error:
+                    form.add_error(None, f"The accounts could not be imported: {error}")
+                else:
+                    self.message_user(
+                        request, f"Imported {len(users)} accounts.", messages.SUCCESS
+                    )
+                    return redirect("admin:accounts_user_changelist")
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": "Import accounts",
+            "form": form,
+        }
+        return render(request, "admin/accounts/user/import.html", context)
+
     class Meta:
         managed = True
         verbose_name = "User"
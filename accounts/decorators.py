@@ -1,3 +1,5 @@
+from functools import wraps
+
 from django.shortcuts import redirect
 
 
@@ -22,7 +24,7 @@ def admin_required(
         # Redirect to the specified URL if the user fails the test
         return redirect(redirect_to)
 
-    return wrapper if function else test_func
+    return wraps(function)(wrapper) if function else test_func
 
 
 def lecturer_required(
@@ -46,7 +48,7 @@ def lecturer_required(
         # Redirect to the specified URL if the user fails the test
         return redirect(redirect_to)
 
-    return wrapper if function else test_func
+    return wraps(function)(wrapper) if function else test_func
 
 
 def student_required(
@@ -70,4 +72,4 @@ def student_required(
         # Redirect to the specified URL if the user fails the test
         return redirect(redirect_to)
 
-    return wrapper if function else test_func
+    return wraps(function)(wrapper) if function else test_func
@@ -0,0 +1,186 @@
+"""
+Profile picture variants.
+
+Decoding and resizing an uploaded picture is too slow to do while the
+request waits, and pointless when the picture did not change. User.save
+queues the user on a background worker whenever the picture changes; the
+worker writes one resized copy per PROFILE_PICTURE_SIZES entry, in the
+picture's own format and in WebP, next to the original and records them in
+User.picture_variants, then downscales a JPEG or PNG original larger than
+PROFILE_PICTURE_MAX_SIZE. Until then get_picture serves the original.
+
+Whatever the worker did not get to before its process stopped is handled by
+the `process_profile_pictures` management command.
+"""
+
+import logging
+import posixpath
+import queue
+import threading
+from functools import partial
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+PROFILE_PICTURE_SIZES = getattr(settings, "PROFILE_PICTURE_SIZES", (64, 150, 300))
+PROFILE_PICTURE_MAX_SIZE = getattr(settings, "PROFILE_PICTURE_MAX_SIZE", 300)
+DEFAULT_PICTURE = "default.png"
+WEBP = "webp"
+
+
+def has_own_picture(user):
+    return bool(user.picture) and user.picture.name != DEFAULT_PICTURE
+
+
+def needs_variants(user):
+    variants = user.picture_variants or {}
+    return has_own_picture(user) and variants.get("source") != user.picture.name
+
+
+def encode(image, format):
+    buffer = BytesIO()
+    if format == "JPEG":
+        image.convert("RGB").save(buffer, format, quality=85, optimize=True)
+    elif format == "WEBP":
+        image.save(buffer, format, quality=80, method=4)
+    else:
+        image.save(buffer, format, optimize=True)
+    return ContentFile(buffer.getvalue())
+
+
+def create_variants(picture, sizes=PROFILE_PICTURE_SIZES):
+    """
+    Save the resized copies of `picture` (an ImageField file), downscale the
+    original if needed and return
+    {"source": picture name, "sizes": {size: {"image": name, "webp": name}}}.
+    """
+    storage = picture.storage
+    with picture.open("rb") as file:
+        image = Image.open(file)
+        image.load()
+    source_format = image.format
+    # JPEG and PNG keep their format, anything else (GIF, BMP...) becomes PNG
+    format = "JPEG" if image.format == "JPEG" else "PNG"
+    image = ImageOps.exif_transpose(image)
+    if format == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    elif image.mode not in ("RGB", "RGBA", "L", "LA"):
+        image = image.convert("RGBA")
+
+    root = posixpath.splitext(picture.name)[0]
+    extension = ".jpg" if format == "JPEG" else ".png"
+    variants = {"source": picture.name, "sizes": {}}
+    for size in sorted(sizes):
+        resized = image.copy()
+        resized.thumbnail((size, size), Image.LANCZOS)
+        variants["sizes"][str(size)] = {
+            "image": storage.save(f"{root}_{size}{extension}", encode(resized, format)),
+            WEBP: storage.save(f"{root}_{size}.webp", encode(resized, "WEBP")),
+        }
+
+    # the original is not served once the variants exist, keep it small
+    if source_format in ("JPEG", "PNG") and (
+        max(image.size) > PROFILE_PICTURE_MAX_SIZE
+    ):
+        image.thumbnail((PROFILE_PICTURE_MAX_SIZE,) * 2, Image.LANCZOS)
+        with storage.open(picture.name, "wb") as file:
+            file.write(encode(image, source_format).read())
+    return variants
+
+
+def variant_names(variants):
+    for variant in (variants or {}).get("sizes", {}).values():
+        yield from variant.values()
+
+
+def delete_variants(storage, variants):
+    for name in variant_names(variants):
+        try:
+            storage.delete(name)
+        except OSError:
+            logger.warning("Could not delete the picture variant %s", name)
+
+
+def process_picture(user_id):
+    """
+    Create the variants of the user's current picture and drop those of the
+    previous one. Returns whether variants were created.
+    """
+    User = get_user_model()
+    user = User.objects.filter(pk=user_id).only("picture", "picture_variants").first()
+    if user is None or not needs_variants(user):
+        return False
+
+    storage = user.picture.storage
+    try:
+        variants = create_variants(user.picture)
+    except (OSError, Image.DecompressionBombError) as error:
+        # not worth retrying, get_picture keeps serving the original
+        logger.warning("Could not resize the picture of user %s: %s", user_id, error)
+        variants = {"source": user.picture.name, "sizes": {}}
+
+    # the picture may have been replaced again while we were resizing it
+    updated = User.objects.filter(pk=user_id, picture=user.picture.name).update(
+        picture_variants=variants
+    )
+    if updated:
+        delete_variants(storage, user.picture_variants)
+    else:
+        delete_variants(storage, variants)
+    return bool(updated and variants["sizes"])
+
+
+def process_pending_pictures():
+    """Process every picture without up-to-date variants, return the count."""
+    User = get_user_model()
+    users = (
+        User.objects.exclude(picture="")
+        .exclude(picture=DEFAULT_PICTURE)
+        .exclude(picture__isnull=True)
+        .only("picture", "picture_variants")
+    )
+    return sum(
+        process_picture(user.pk) for user in users.iterator() if needs_variants(user)
+    )
+
+
+class PictureWorker:
+    """A daemon thread per process resizing the queued users' pictures."""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def put(self, user_id):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self.run, name="profile-pictures", daemon=True
+                )
+                self._thread.start()
+        self._queue.put(user_id)
+
+    def run(self):
+        while True:
+            user_id = self._queue.get()
+            try:
+                process_picture(user_id)
+            except Exception:
+                logger.exception("Processing the picture of user %s failed", user_id)
+            finally:
+                close_old_connections()
+
+
+worker = PictureWorker()
+
+
+def queue_picture(user_id):
+    """Resize the user's picture in the background once the transaction commits."""
+    transaction.on_commit(partial(worker.put, user_id))
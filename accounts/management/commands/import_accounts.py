@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.utils import import_accounts, read_account_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Create student or lecturer accounts in bulk from a CSV file with the "
+        "columns first_name, last_name, email, gender, phone, address and, for "
+        "students, level and program (title)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("csv_file", help="Path of the CSV file to import.")
+        parser.add_argument(
+            "--role", choices=["student", "lecturer"], default="student"
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Processes used to hash passwords (default: one per CPU).",
+        )
+
+    def handle(self, *args, **options):
+        is_student = options["role"] == "student"
+        start = time.monotonic()
+        try:
+            with open(options["csv_file"], newline="", encoding="utf-8-sig") as f:
+                rows = read_account_rows(f, is_student)
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+
+        users = import_accounts(rows, is_student, workers=options["workers"])
+        if users:
+            self.stdout.write(
+                f"Created {options['role']}s {users[0].username} "
+                f"to {users[-1].username}."
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {len(users)} accounts in {time.monotonic() - start:.1f}s."
+            )
+        )
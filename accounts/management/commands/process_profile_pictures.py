@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from accounts.images import process_pending_pictures
+
+
+class Command(BaseCommand):
+    help = "Create the resized variants of the profile pictures that lack them."
+
+    def handle(self, *args, **options):
+        processed = process_pending_pictures()
+        self.stdout.write(f"Processed {processed} profile pictures.")
@@ -4,10 +4,17 @@ from django.contrib.auth.models import AbstractUser, UserManager
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 from django.db.models import Q
-from PIL import Image
 
+from core.models import SequenceManager
 from course.models import Program
 
+from .images import (
+    DEFAULT_PICTURE,
+    WEBP,
+    delete_variants,
+    has_own_picture,
+    queue_picture,
+)
 
 # LEVEL_COURSE = "Level course"
 BACHELOR_DEGREE = _("Bachelor")
@@ -77,6 +84,8 @@ class User(AbstractUser):
     picture = models.ImageField(
         upload_to="profile_pictures/%y/%m/%d/", default="default.png", null=True
     )
+    # resized copies of the picture, see accounts.images
+    picture_variants = models.JSONField(default=dict, blank=True, editable=False)
     email = models.EmailField(max_length=250, blank=True, null=True)
 
     objects = CustomUserManager()
@@ -107,29 +116,56 @@ class User(AbstractUser):
 
         return role
 
-    def get_picture(self):
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # to tell in save() whether the picture changed
+        instance._loaded_picture = instance.__dict__.get("picture")
+        return instance
+
+    def get_picture_variant(self, size=300):
+        """
+        The smallest variant of the picture at least `size` pixels wide (the
+        largest one if none is), None while the variants are not ready.
+        """
+        variants = self.picture_variants or {}
+        if not self.picture or variants.get("source") != self.picture.name:
+            return None
+        sizes = sorted(variants.get("sizes", {}), key=int)
+        fitting = [name for name in sizes if int(name) >= size] or sizes[-1:]
+        return variants["sizes"][fitting[0]] if fitting else None
+
+    def get_picture(self, size=300, webp=False):
+        """
+        URL of the variant of the picture fitting `size`, or of the original
+        picture while the variants are not ready.
+        """
         try:
-            return self.picture.url
-        except:
-            no_picture = settings.MEDIA_URL + "default.png"
-            return no_picture
+            url = self.picture.url
+        except ValueError:
+            return settings.MEDIA_URL + DEFAULT_PICTURE
+        variant = self.get_picture_variant(size)
+        if variant is None:
+            return url
+        return self.picture.storage.url(variant[WEBP] if webp else variant["image"])
+
+    def get_small_picture(self):
+        """The picture for avatars, as small as the navbar shows it."""
+        return self.get_picture(64)
 
     def get_absolute_url(self):
         return reverse("profile_single", kwargs={"user_id": self.id})
 
     def save(self, *args, **kwargs):
+        picture_changed = self.picture.name != getattr(self, "_loaded_picture", None)
         super().save(*args, **kwargs)
-        try:
-            img = Image.open(self.picture.path)
-            if img.height > 300 or img.width > 300:
-                output_size = (300, 300)
-                img.thumbnail(output_size)
-                img.save(self.picture.path)
-        except:
-            pass
+        self._loaded_picture = self.picture.name
+        if picture_changed and has_own_picture(self):
+            queue_picture(self.pk)
 
     def delete(self, *args, **kwargs):
         if self.picture.url != settings.MEDIA_URL + "default.png":
+            delete_variants(self.picture.storage, self.picture_variants)
             self.picture.delete()
         super().delete(*args, **kwargs)
 
@@ -207,3 +243,15 @@ class DepartmentHead(models.Model):
 
     def __str__(self):
         return "{}".format(self.user)
+
+
+class IdSequence(models.Model):
+    """The last number handed out for student and lecturer IDs."""
+
+    name = models.CharField(max_length=50, unique=True)
+    value = models.PositiveIntegerField(default=0)
+
+    objects = SequenceManager()
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
@@ -5,23 +5,26 @@ from .utils import (
 )
 
 
-def post_save_account_receiver(instance=None, created=False, *args, **kwargs):
+def post_save_account_receiver(
+    sender, instance=None, created=False, raw=False, *args, **kwargs
+):
     """
     Send email notification
     """
-    if created:
+    if created and not raw:
         if instance.is_student:
             username, password = generate_student_credentials()
-            instance.username = username
-            instance.set_password(password)
-            instance.save()
-            # Send email with the generated credentials
-            send_new_account_email(instance, password)
-
-        if instance.is_lecturer:
+        elif instance.is_lecturer:
             username, password = generate_lecturer_credentials()
-            instance.username = username
-            instance.set_password(password)
-            instance.save()
-            # Send email with the generated credentials
-            send_new_account_email(instance, password)
+        else:
+            return
+
+        instance.username = username
+        instance.set_password(password)
+        # a plain UPDATE instead of a second save(), which would run this
+        # receiver and the picture resizing again
+        sender.objects.filter(pk=instance.pk).update(
+            username=instance.username, password=instance.password
+        )
+        # Send email with the generated credentials
+        send_new_account_email(instance, password)
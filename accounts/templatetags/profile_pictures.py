@@ -0,0 +1,23 @@
+from django import template
+from django.utils.html import format_html
+
+from accounts.images import WEBP
+
+register = template.Library()
+
+
+@register.simple_tag
+def profile_picture(user, size=300, css_class=""):
+    """
+    The user's picture fitting `size` pixels, in a <picture> offering the
+    WebP variant once the variants exist.
+    """
+    img = format_html('<img src="{}" class="{}">', user.get_picture(size), css_class)
+    variant = user.get_picture_variant(size)
+    if variant is None:
+        return img
+    return format_html(
+        '<picture><source srcset="{}" type="image/webp">{}</picture>',
+        user.picture.storage.url(variant[WEBP]),
+        img,
+    )
@@ -0,0 +1,124 @@
+import io
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from accounts.images import process_picture
+
+User = get_user_model()
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def picture_file(name="me.jpg", size=(800, 600), format="JPEG"):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "red").save(buffer, format)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ProfilePictureTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.user = User.objects.create(username="user", picture=picture_file())
+        self.assertEqual(len(callbacks), 1)
+
+    def test_unchanged_picture_is_not_processed_again(self):
+        user = User.objects.get(pk=self.user.pk)
+        with self.captureOnCommitCallbacks() as callbacks:
+            user.first_name = "Ada"
+            user.save()
+        self.assertEqual(callbacks, [])
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            user.picture = picture_file("new.jpg")
+            user.save()
+        self.assertEqual(len(callbacks), 1)
+
+    def test_variants(self):
+        original = self.user.get_picture()
+        self.assertEqual(original, self.user.picture.url)
+
+        self.assertTrue(process_picture(self.user.pk))
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual(
+            sorted(user.picture_variants["sizes"], key=int), ["64", "150", "300"]
+        )
+        for size, variant in user.picture_variants["sizes"].items():
+            self.assertTrue(variant["image"].endswith(f"_{size}.jpg"))
+            with default_storage.open(variant["webp"]) as file:
+                image = Image.open(file)
+                self.assertEqual(image.format, "WEBP")
+                self.assertEqual(image.width, int(size))
+
+        self.assertTrue(user.get_picture(64).endswith("_64.jpg"))
+        self.assertTrue(user.get_picture(100, webp=True).endswith("_150.webp"))
+        self.assertTrue(user.get_picture().endswith("_300.jpg"))
+        self.assertTrue(user.get_picture(1000).endswith("_300.jpg"))
+        self.assertTrue(user.get_small_picture().endswith("_64.jpg"))
+        self.assertFalse(process_picture(self.user.pk))
+
+    def test_original_is_downscaled(self):
+        process_picture(self.user.pk)
+        with default_storage.open(self.user.picture.name) as file:
+            image = Image.open(file)
+            self.assertEqual((image.format, image.size), ("JPEG", (300, 225)))
+
+    def test_profile_picture_tag(self):
+        template = Template(
+            '{% load profile_pictures %}{% profile_picture user css_class="w-100" %}'
+        )
+        html = template.render(Context({"user": self.user}))
+        self.assertEqual(html, f'<img src="{self.user.picture.url}" class="w-100">')
+
+        process_picture(self.user.pk)
+        user = User.objects.get(pk=self.user.pk)
+        html = template.render(Context({"user": user}))
+        self.assertTrue(html.startswith("<picture><source srcset="))
+        self.assertIn('_300.webp" type="image/webp"><img src="', html)
+        self.assertIn('_300.jpg" class="w-100"></picture>', html)
+
+    def test_replaced_picture_drops_the_old_variants(self):
+        process_picture(self.user.pk)
+        user = User.objects.get(pk=self.user.pk)
+        old_variants = user.picture_variants["sizes"]["64"]
+        user.picture = picture_file("new.png", format="PNG")
+        user.save()
+        # stale variants are never served
+        self.assertEqual(user.get_picture(64), user.picture.url)
+
+        process_picture(user.pk)
+        user.refresh_from_db()
+        self.assertTrue(user.get_picture(64).endswith("_64.png"))
+        self.assertFalse(default_storage.exists(old_variants["image"]))
+        self.assertFalse(default_storage.exists(old_variants["webp"]))
+
+    def test_unreadable_picture_keeps_the_original(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.picture = SimpleUploadedFile("broken.jpg", b"not an image")
+        user.save()
+        with self.assertLogs("accounts.images", "WARNING"):
+            self.assertFalse(process_picture(user.pk))
+        user.refresh_from_db()
+        self.assertEqual(user.get_picture(64), user.picture.url)
+        self.assertFalse(process_picture(user.pk))
+
+    def test_pending_pictures_command(self):
+        User.objects.create(username="default")
+        out = io.StringIO()
+        call_command("process_profile_pictures", stdout=out)
+        self.assertIn("Processed 1 profile pictures.", out.getvalue())
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.get_picture(64).endswith("_64.jpg"))
@@ -0,0 +1,138 @@
+import io
+import os
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from accounts.models import IdSequence, Student, User
+from accounts.utils import (
+    PASSWORD_HASH_POOL_THRESHOLD,
+    hash_passwords,
+    import_accounts,
+    generate_student_id,
+    read_account_rows,
+)
+from core.models import OutboxEmail
+from course.models import Program
+
+FAST_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+
+
+def student_csv(count, program="Computer Science"):
+    lines = ["first_name,last_name,email,gender,phone,address,level,program"]
+    for i in range(count):
+        lines.append(
+            f"Student,{i},student{i}@example.com,M,0900000000,Addis,Bachelor,{program}"
+        )
+    return "\n".join(lines) + "\n"
+
+
+class IdSequenceTestCase(TestCase):
+    def test_blocks_do_not_overlap(self):
+        first = IdSequence.objects.reserve("student", 3, start=10)
+        second = IdSequence.objects.reserve("student", 2, start=10)
+        self.assertEqual(list(first), [11, 12, 13])
+        self.assertEqual(list(second), [14, 15])
+
+    @override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+    def test_registration_receiver_uses_the_sequence(self):
+        first = User.objects.create(username="tmp1", is_student=True)
+        second = User.objects.create(username="tmp2", is_student=True)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        prefix = settings.STUDENT_ID_PREFIX
+        self.assertTrue(first.username.startswith(f"{prefix}-"))
+        self.assertTrue(first.username.endswith("-1"))
+        self.assertTrue(second.username.endswith("-2"))
+        self.assertTrue(first.has_usable_password())
+        self.assertEqual(OutboxEmail.objects.count(), 2)
+
+    @override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+    def test_sequence_starts_after_the_highest_number(self):
+        users = [
+            User.objects.create(username=f"tmp{i}", is_student=True) for i in range(3)
+        ]
+        users[0].delete()
+        IdSequence.objects.all().delete()
+        self.assertTrue(generate_student_id().endswith("-4"))
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ImportAccountsTestCase(TestCase):
+    def setUp(self):
+        Program.objects.create(title="Computer Science")
+
+    def rows(self, count):
+        return read_account_rows(io.StringIO(student_csv(count)), is_student=True)
+
+    def test_import_students(self):
+        users = import_accounts(self.rows(5), is_student=True, workers=1)
+
+        self.assertEqual(len({user.username for user in users}), 5)
+        self.assertEqual(Student.objects.count(), 5)
+        self.assertEqual(OutboxEmail.objects.count(), 5)
+        user = User.objects.get(email="student0@example.com")
+        self.assertTrue(user.is_student)
+        self.assertEqual(user.student.program.title, "Computer Science")
+        self.assertTrue(user.has_usable_password())
+
+    def test_query_count_does_not_grow_with_the_import(self):
+        rows = self.rows(40)
+        import_accounts(self.rows(1), is_student=True, workers=1)
+        with self.assertNumQueries(10):
+            import_accounts(rows[:5], is_student=True, workers=1)
+        with self.assertNumQueries(10):
+            import_accounts(rows, is_student=True, workers=1)
+        self.assertEqual(IdSequence.objects.get(name="student").value, 46)
+
+    def test_passwords_are_hashed_in_a_pool(self):
+        passwords = [f"password{i}" for i in range(PASSWORD_HASH_POOL_THRESHOLD)]
+        hashes = hash_passwords(passwords, workers=2)
+        self.assertTrue(all(map(check_password, passwords, hashes)))
+
+    def test_invalid_rows_are_reported(self):
+        with self.assertRaisesMessage(ValueError, "Line 3: unknown program"):
+            read_account_rows(
+                io.StringIO(student_csv(1) + "A,B,,,,,Bachelor,History\n"),
+                is_student=True,
+            )
+        with self.assertRaisesMessage(ValueError, "Missing columns: last_name"):
+            read_account_rows(io.StringIO("first_name\nA\n"), is_student=False)
+
+    def test_import_command(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as f:
+            f.write(student_csv(3))
+        self.addCleanup(os.remove, f.name)
+        out = io.StringIO()
+        call_command("import_accounts", f.name, "--workers=1", stdout=out)
+        self.assertIn("Imported 3 accounts", out.getvalue())
+        self.assertEqual(User.objects.filter(is_student=True).count(), 3)
+
+    @override_settings(
+        LANGUAGE_CODE="en",
+        STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage",
+    )
+    def test_admin_import(self):
+        admin = User.objects.create_superuser(username="admin", password="password")
+        self.client.force_login(admin)
+        url = reverse("admin:accounts_user_import")
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        upload = SimpleUploadedFile("students.csv", student_csv(2).encode())
+        response = self.client.post(url, {"csv_file": upload, "role": "student"})
+        self.assertRedirects(response, reverse("admin:accounts_user_changelist"))
+        self.assertEqual(Student.objects.count(), 2)
+
+        upload = SimpleUploadedFile("students.csv", student_csv(2).encode())
+        with mock.patch(
+            "accounts.admin.import_accounts", side_effect=IntegrityError("duplicate")
+        ):
+            response = self.client.post(url, {"csv_file": upload, "role": "student"})
+        self.assertContains(response, "could not be imported: duplicate")
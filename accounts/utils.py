@@ -1,26 +1,85 @@
-import threading
+import csv
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
 from django.conf import settings
-from core.utils import send_html_email
+from django.db import transaction
+from core.mail import queue_emails, render_html_email
+from core.stats import mark_stale
+from course.models import Program
+from .models import LEVEL, IdSequence, Student
+
+# Hashing is deliberately slow, big imports hash in a pool of processes.
+PASSWORD_HASH_POOL_THRESHOLD = 20
+IMPORT_BATCH_SIZE = 500
+
+STUDENT_IMPORT_FIELDS = (
+    "first_name",
+    "last_name",
+    "email",
+    "gender",
+    "phone",
+    "address",
+    "level",
+    "program",
+)
+LECTURER_IMPORT_FIELDS = (
+    "first_name",
+    "last_name",
+    "email",
+    "gender",
+    "phone",
+    "address",
+)
 
 
 def generate_password():
     return get_user_model().objects.make_random_password()
 
 
-def generate_student_id():
-    # Generate a username based on first and last name and registration date
+def _highest_id_number(prefix, role_filter):
+    """
+    The largest number used in a `{prefix}-{year}-{number}` username. Users
+    may have been deleted, so counting them could hand out a taken number.
+    """
+    usernames = (
+        get_user_model()
+        .objects.filter(username__startswith=f"{prefix}-", **role_filter)
+        .values_list("username", flat=True)
+        .iterator()
+    )
+    numbers = (username.rpartition("-")[2] for username in usernames)
+    return max((int(number) for number in numbers if number.isdigit()), default=0)
+
+
+def _generate_ids(name, prefix, count, role_filter):
     registered_year = datetime.now().strftime("%Y")
-    students_count = get_user_model().objects.filter(is_student=True).count()
-    return f"{settings.STUDENT_ID_PREFIX}-{registered_year}-{students_count}"
+    numbers = IdSequence.objects.reserve(
+        name, count, start=lambda: _highest_id_number(prefix, role_filter)
+    )
+    return [f"{prefix}-{registered_year}-{number}" for number in numbers]
+
+
+def generate_student_ids(count):
+    # Reserve a block of sequential IDs, safe with concurrent registrations
+    return _generate_ids(
+        "student", settings.STUDENT_ID_PREFIX, count, {"is_student": True}
+    )
+
+
+def generate_lecturer_ids(count):
+    return _generate_ids(
+        "lecturer", settings.LECTURER_ID_PREFIX, count, {"is_lecturer": True}
+    )
+
+
+def generate_student_id():
+    return generate_student_ids(1)[0]
 
 
 def generate_lecturer_id():
-    # Generate a username based on first and last name and registration date
-    registered_year = datetime.now().strftime("%Y")
-    lecturers_count = get_user_model().objects.filter(is_lecturer=True).count()
-    return f"{settings.LECTURER_ID_PREFIX}-{registered_year}-{lecturers_count}"
+    return generate_lecturer_ids(1)[0]
 
 
 def generate_student_credentials():
@@ -31,32 +90,120 @@ def generate_lecturer_credentials():
     return generate_lecturer_id(), generate_password()
 
 
-class EmailThread(threading.Thread):
-    def __init__(self, subject, recipient_list, template_name, context):
-        self.subject = subject
-        self.recipient_list = recipient_list
-        self.template_name = template_name
-        self.context = context
-        threading.Thread.__init__(self)
-
-    def run(self):
-        send_html_email(
-            subject=self.subject,
-            recipient_list=self.recipient_list,
-            template=self.template_name,
-            context=self.context,
-        )
+def hash_passwords(passwords, workers=None):
+    """Hash the passwords, in a process pool when there are many of them."""
+    passwords = list(passwords)
+    if workers == 1 or len(passwords) < PASSWORD_HASH_POOL_THRESHOLD:
+        return [make_password(password) for password in passwords]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(make_password, passwords, chunksize=10))
 
 
-def send_new_account_email(user, password):
+def new_account_email(user, password):
     if user.is_student:
         template_name = "accounts/email/new_student_account_confirmation.html"
     else:
         template_name = "accounts/email/new_lecturer_account_confirmation.html"
-    email = {
-        "subject": "Your SkyLearn account confirmation and credentials",
-        "recipient_list": [user.email],
-        "template_name": template_name,
-        "context": {"user": user, "password": password},
-    }
-    EmailThread(**email).start()
+    return render_html_email(
+        subject="Your SkyLearn account confirmation and credentials",
+        recipient_list=[user.email],
+        template=template_name,
+        context={"user": user, "password": password},
+    )
+
+
+def send_new_account_email(user, password):
+    queue_emails([new_account_email(user, password)])
+
+
+def read_account_rows(csv_file, is_student):
+    """
+    Parse an import CSV (with a header line) into a list of dicts. Students
+    need a `level` and the title of an existing `program`. Raises ValueError
+    naming the offending line.
+    """
+    fields = STUDENT_IMPORT_FIELDS if is_student else LECTURER_IMPORT_FIELDS
+    reader = csv.DictReader(csv_file)
+    missing = {"first_name", "last_name"}.difference(reader.fieldnames or [])
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(sorted(missing))}")
+
+    rows = [
+        (line, {field: (row.get(field) or "").strip() for field in fields})
+        for line, row in enumerate(reader, start=2)
+    ]
+    programs = {}
+    if is_student:
+        programs = {
+            program.title: program
+            for program in Program.objects.filter(
+                title__in={row["program"] for _, row in rows}
+            )
+        }
+    levels = {str(level) for level, _ in LEVEL}
+
+    for line, row in rows:
+        if not row["first_name"] or not row["last_name"]:
+            raise ValueError(f"Line {line}: first_name and last_name are required.")
+        if row["gender"] and row["gender"] not in ("M", "F"):
+            raise ValueError(f"Line {line}: gender must be M or F.")
+        if is_student:
+            if row["level"] not in levels:
+                raise ValueError(f"Line {line}: unknown level {row['level']!r}.")
+            if row["program"] not in programs:
+                raise ValueError(f"Line {line}: unknown program {row['program']!r}.")
+            row["program"] = programs[row["program"]]
+    return [row for _, row in rows]
+
+
+def import_accounts(rows, is_student, workers=None):
+    """
+    Create student or lecturer accounts for the given rows (as returned by
+    read_account_rows) in bulk: one block of IDs is reserved, the passwords
+    are hashed in a process pool, the rows are written with bulk_create and
+    the credential emails are queued together. Returns the created users.
+    """
+    User = get_user_model()
+    rows = list(rows)
+    passwords = [generate_password() for _ in rows]
+    hashes = hash_passwords(passwords, workers)
+
+    with transaction.atomic():
+        if is_student:
+            usernames = generate_student_ids(len(rows))
+        else:
+            usernames = generate_lecturer_ids(len(rows))
+        users = [
+            User(
+                username=username,
+                password=password_hash,
+                is_student=is_student,
+                is_lecturer=not is_student,
+                first_name=row["first_name"],
+                last_name=row["last_name"],
+                email=row.get("email") or None,
+                gender=row.get("gender") or None,
+                phone=row.get("phone") or None,
+                address=row.get("address") or None,
+            )
+            for username, password_hash, row in zip(usernames, hashes, rows)
+        ]
+        User.objects.bulk_create(users, batch_size=IMPORT_BATCH_SIZE)
+        if is_student:
+            Student.objects.bulk_create(
+                [
+                    Student(student=user, level=row["level"], program=row["program"])
+                    for user, row in zip(users, rows)
+                ],
+                batch_size=IMPORT_BATCH_SIZE,
+            )
+        # bulk_create sends no signals
+        mark_stale("people")
+        queue_emails(
+            [
+                new_account_email(user, password)
+                for user, password in zip(users, passwords)
+                if user.email
+            ]
+        )
+    return users
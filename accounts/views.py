@@ -21,7 +21,7 @@ from accounts.forms import (
     StudentAddForm,
 )
 from accounts.models import Parent, Student, User
-from core.models import Semester, Session
+from core.models import get_academic_period
 from course.models import Course, Program
 from result.models import TakenCourse
 
@@ -116,10 +116,8 @@ def register(request):
 @login_required
 def profile(request):
     """Show profile of the current user."""
-    current_session = Session.objects.filter(is_current_session=True).first()
-    current_semester = Semester.objects.filter(
-        is_current_semester=True, session=current_session
-    ).first()
+    period = get_academic_period()
+    current_session, current_semester = period.session, period.session_semester
 
     context = {
         "title": request.user.get_full_name,
@@ -162,10 +160,8 @@ def profile_single(request, user_id):
     if request.user.id == user_id:
         return redirect("profile")
 
-    current_session = Session.objects.filter(is_current_session=True).first()
-    current_semester = Semester.objects.filter(
-        is_current_semester=True, session=current_session
-    ).first()
+    period = get_academic_period()
+    current_session, current_semester = period.session, period.session_semester
     user = get_object_or_404(User, pk=user_id)
 
     context = {
@@ -70,6 +70,8 @@ PROJECT_APPS = [
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + PROJECT_APPS
 
 MIDDLEWARE = [
+    "core.metrics.RequestMetricsMiddleware",
+    "core.activity.ActivityLogMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -85,7 +87,7 @@ ROOT_URLCONF = "config.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "core.metrics.DjangoTemplates",
         "DIRS": [os.path.join(BASE_DIR, "templates")],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -94,6 +96,7 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "core.context_processors.academic_period",
                 # 'django.template.context_processors.i18n',
                 # 'django.template.context_processors.media',
                 # 'django.template.context_processors.static',
@@ -242,6 +245,27 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 STUDENT_ID_PREFIX = config("STUDENT_ID_PREFIX", "ugr")
 LECTURER_ID_PREFIX = config("LECTURER_ID_PREFIX", "lec")
 
+# A score sheet posts five fields per student taking the course
+DATA_UPLOAD_MAX_NUMBER_FIELDS = 10000
+
+# Request instrumentation (core.metrics): share of the requests recorded and
+# duration in ms above which a request is always recorded with its SQL
+REQUEST_METRICS_SAMPLE_RATE = config(
+    "REQUEST_METRICS_SAMPLE_RATE", default=0.0, cast=float
+)
+REQUEST_METRICS_SLOW_MS = config("REQUEST_METRICS_SLOW_MS", default=1000, cast=int)
+
+# Internal location of the front-end server (e.g. an nginx alias of
+# MEDIA_ROOT) serving course videos after the access check, see
+# course.streaming. Empty to stream them from Django.
+MEDIA_ACCEL_REDIRECT_PREFIX = config("MEDIA_ACCEL_REDIRECT_PREFIX", default="")
+
+# Uploaded videos are transcoded with these binaries by course.transcoding,
+# VIDEO_TRANSCODE_WORKERS videos at a time
+FFMPEG_BINARY = config("FFMPEG_BINARY", default="ffmpeg")
+FFPROBE_BINARY = config("FFPROBE_BINARY", default="ffprobe")
+VIDEO_TRANSCODE_WORKERS = config("VIDEO_TRANSCODE_WORKERS", default=2, cast=int)
+
 
 # Constants
 YEARS = (
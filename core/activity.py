@@ -0,0 +1,111 @@
+"""
+Buffered activity log.
+
+`log_activity` does not write anything inside a transaction: each entry is
+registered with on_commit, so it is dropped with the transaction, or the
+savepoint, that rolls back, and only reaches the log once it committed.
+Outside a transaction an entry is written right away, as before.
+
+Committed entries are written one at a time, except within
+`batched_activity()`, where they are kept and written with a single
+bulk_create when the block ends. ActivityLogMiddleware wraps every request
+in it, so a request creating many courses writes its entries together.
+
+Entries older than ACTIVITY_LOG_RETENTION_DAYS are counted per day into
+ActivityRollup rows and deleted by `prune_activity_log`, run from cron
+through the `prune_activity_log` management command.
+"""
+
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ActivityLog, ActivityRollup
+
+ACTIVITY_LOG_RETENTION_DAYS = getattr(settings, "ACTIVITY_LOG_RETENTION_DAYS", 90)
+ACTIVITY_LOG_PRUNE_BATCH_SIZE = 1000
+
+# the committed entries of the current batched_activity() block
+_batch = ContextVar("activity_batch", default=None)
+
+
+@contextmanager
+def batched_activity():
+    """Write the entries committed inside the block together when it ends."""
+    if _batch.get() is not None:
+        # nested, the outermost block writes them
+        yield
+        return
+    entries = []
+    token = _batch.set(entries)
+    try:
+        yield
+    finally:
+        _batch.reset(token)
+        if entries:
+            ActivityLog.objects.bulk_create(entries)
+
+
+class ActivityLogMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with batched_activity():
+            return self.get_response(request)
+
+
+def _committed(entry):
+    entries = _batch.get()
+    if entries is None:
+        entry.save()
+    else:
+        entries.append(entry)
+
+
+def log_activity(message):
+    # created_at defaults to now: when the entry is logged, not written
+    entry = ActivityLog(message=str(message))
+    if not connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        entry.save()
+        return
+    transaction.on_commit(partial(_committed, entry))
+
+
+def prune_activity_log(days=ACTIVITY_LOG_RETENTION_DAYS):
+    """
+    Add the entries older than `days` days to the daily ActivityRollup counts
+    and delete them, a batch at a time so the table is never locked for long.
+    Returns the number of entries deleted.
+    """
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                ActivityLog.objects.filter(created_at__lt=cutoff)
+                .order_by("pk")
+                .select_for_update()
+                .values_list("pk", "created_at")[:ACTIVITY_LOG_PRUNE_BATCH_SIZE]
+            )
+            if not batch:
+                return deleted
+            per_day = Counter(timezone.localdate(created_at) for _, created_at in batch)
+            for date, entries in per_day.items():
+                rollup, created = ActivityRollup.objects.get_or_create(
+                    date=date, defaults={"entries": entries}
+                )
+                if not created:
+                    ActivityRollup.objects.filter(pk=rollup.pk).update(
+                        entries=F("entries") + entries
+                    )
+            deleted += ActivityLog.objects.filter(
+                pk__in=[pk for pk, _ in batch]
+            ).delete()[0]
@@ -1,6 +1,10 @@
 from django.contrib import admin
+from django.shortcuts import render
+from django.urls import path
+from django.utils import timezone
 from modeltranslation.admin import TranslationAdmin
-from .models import Session, Semester, NewsAndEvents
+
+from .models import Session, Semester, NewsAndEvents, OutboxEmail, RequestMetric
 
 
 class NewsAndEventsAdmin(TranslationAdmin):
@@ -10,3 +14,73 @@ class NewsAndEventsAdmin(TranslationAdmin):
 admin.site.register(Semester)
 admin.site.register(Session)
 admin.site.register(NewsAndEvents, NewsAndEventsAdmin)
+
+
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ["subject", "status", "attempts", "next_attempt_at", "sent_at"]
+    list_filter = ["status"]
+    search_fields = ["subject", "recipients"]
+    # the bodies of account emails contain passwords
+    exclude = ["body", "html_body"]
+    actions = ["retry_now"]
+
+    @admin.action(description="Retry the selected emails now")
+    def retry_now(self, request, queryset):
+        from .mail import worker
+
+        queryset.exclude(status=OutboxEmail.SENT).update(
+            status=OutboxEmail.PENDING, attempts=0, next_attempt_at=timezone.now()
+        )
+        worker.wake()
+
+
+admin.site.register(OutboxEmail, OutboxEmailAdmin)
+
+
+class RequestMetricAdmin(admin.ModelAdmin):
+    list_display = [
+        "view",
+        "method",
+        "status_code",
+        "duration",
+        "query_count",
+        "db_time",
+        "render_time",
+        "response_size",
+        "slow",
+        "created_at",
+    ]
+    list_filter = ["slow", "method", "status_code"]
+    search_fields = ["view", "path"]
+    date_hierarchy = "created_at"
+    change_list_template = "admin/core/requestmetric/change_list.html"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        urls = [
+            path(
+                "summary/",
+                self.admin_site.admin_view(self.summary_view),
+                name="core_requestmetric_summary",
+            )
+        ]
+        return urls + super().get_urls()
+
+    def summary_view(self, request):
+        from .metrics import REQUEST_METRICS_SUMMARY_DAYS, view_summary
+
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": f"Request metrics of the last {REQUEST_METRICS_SUMMARY_DAYS} days",
+            "summary": view_summary(),
+        }
+        return render(request, "admin/core/requestmetric/summary.html", context)
+
+
+admin.site.register(RequestMetric, RequestMetricAdmin)
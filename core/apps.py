@@ -3,3 +3,26 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = "core"
+
+    def ready(self) -> None:
+        from django.contrib.auth.signals import user_logged_in
+        from django.db.models.signals import post_delete, post_save
+        from accounts.models import Student, User
+        from course.models import Course, Program, Upload, UploadVideo
+        from result.models import TakenCourse
+        from .signals import (
+            courses_changed_receiver,
+            people_changed_receiver,
+            resources_changed_receiver,
+            user_logged_in_receiver,
+        )
+
+        for signal in (post_save, post_delete):
+            signal.connect(people_changed_receiver, sender=User)
+            signal.connect(people_changed_receiver, sender=Student)
+            signal.connect(courses_changed_receiver, sender=TakenCourse)
+            for model in (Program, Course, Upload, UploadVideo):
+                signal.connect(resources_changed_receiver, sender=model)
+        user_logged_in.connect(user_logged_in_receiver)
+
+        return super().ready()
@@ -0,0 +1,407 @@
+"""
+Frontend asset bundles.
+
+Every page used to load FontAwesome, Bootstrap, jQuery and the site's own
+files separately, with all of FontAwesome's icons and the fonts in up to
+five formats. `python manage.py build_assets` writes to static/dist/:
+
+- app.css, the BUNDLES stylesheets in one file, without the rules whose
+  classes appear nowhere in the templates, the Python code, the project's
+  scripts or the bundled scripts (Bootstrap adds classes such as "show" at
+  run time, they are found in its source);
+- app.js, the BUNDLES scripts in one file;
+- fonts/, the fonts of the remaining @font-face rules as woff2 only, the
+  icon fonts reduced to the icons left in app.css and the text fonts to
+  TEXT_FONT_UNICODES (subsetting needs fontTools, the fonts are copied
+  unchanged without it).
+
+It runs before collectstatic, whose CompressedManifestStaticFilesStorage
+fingerprints the bundles and writes their gzip and brotli variants next to
+them. The `asset_bundle` template tag (core.templatetags.assets) links a
+bundle once it is built and its sources otherwise, so a fresh checkout works
+without the build step.
+"""
+
+import gzip
+import logging
+import posixpath
+import re
+import shutil
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.template.utils import get_app_template_dirs
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from fontTools import subset
+except ImportError:
+    subset = None
+
+# static paths of the files of each bundle, in order
+BUNDLES = getattr(
+    settings,
+    "ASSET_BUNDLES",
+    {
+        "app.css": [
+            "vendor/fontawesome-6.5.1/css/all.min.css",
+            "vendor/bootstrap-5.3.2/css/bootstrap.min.css",
+            "css/style.min.css",
+        ],
+        "app.js": [
+            "vendor/jquery-3.7.1/jquery-3.7.1.min.js",
+            "vendor/bootstrap-5.3.2/js/bootstrap.bundle.min.js",
+            "js/main.js",
+        ],
+    },
+)
+# classes kept although no source mentions them, e.g. built from data
+ASSET_SAFELIST = getattr(settings, "ASSET_SAFELIST", ())
+# fonts reduced to the code points of the `content` of the remaining rules
+ICON_FONTS = getattr(settings, "ICON_FONTS", ("vendor/fontawesome-6.5.1/webfonts/",))
+# the Latin range of the Google Fonts subsets
+TEXT_FONT_UNICODES = (
+    "U+0000-00FF,U+0131,U+0152-0153,U+02BB-02BC,U+02C6,U+02DA,U+02DC,"
+    "U+0304,U+0308,U+0329,U+2000-206F,U+2074,U+20AC,U+2122,U+2191,U+2193,"
+    "U+2212,U+2215,U+FEFF,U+FFFD"
+)
+ASSETS_DIR = "dist"
+
+TOKEN_RE = re.compile(r"[A-Za-z_][\w-]*")
+# the constant part of a class built in a template: alert-{{ message.tags }}
+PREFIX_RE = re.compile(r"([A-Za-z_][\w-]*-)\{[{%]")
+CLASS_RE = re.compile(r"\.(-?[A-Za-z_][\w-]*)")
+NOT_RE = re.compile(r":not\([^()]*\)")
+ATTRIBUTE_RE = re.compile(r"\[[^\]]*\]")
+URL_RE = re.compile(r"""url\(\s*(["']?)([^"')]+)\1\s*\)""")
+SRC_RE = re.compile(r"src:[^;}]*;?")
+CONTENT_RE = re.compile(r"""content:\s*(["'])((?:\\.|(?!\1).)*)\1""")
+ESCAPE_RE = re.compile(r"\\([0-9A-Fa-f]{1,6})\s?|\\(.)")
+SOURCE_MAP_RE = re.compile(r"^\s*//# sourceMappingURL=.*$", re.MULTILINE)
+# at-rules holding rules, purged like the top level
+NESTED_AT_RULES = ("@media", "@supports", "@container", "@layer")
+
+
+# ########################################################
+# Finding the classes in use
+# ########################################################
+
+
+def content_files():
+    """The files whose words may be class names."""
+    dirs = [Path(path) for path in get_app_template_dirs("templates")]
+    for engine in settings.TEMPLATES:
+        dirs.extend(Path(path) for path in engine.get("DIRS", []))
+    for directory in dirs:
+        yield from directory.rglob("*.html")
+        yield from directory.rglob("*.txt")
+
+    base_dir = Path(settings.BASE_DIR).resolve()
+    for app_config in apps.get_app_configs():
+        path = Path(app_config.path).resolve()
+        if base_dir in path.parents:
+            yield from path.rglob("*.py")
+
+    for static_dir in settings.STATICFILES_DIRS:
+        yield from (Path(static_dir) / "js").rglob("*.js")
+    for sources in BUNDLES.values():
+        for name in sources:
+            if name.endswith(".js"):
+                yield Path(finders.find(name))
+
+
+def used_classes():
+    """The words of the content files, and the prefixes of built classes."""
+    words, prefixes = set(ASSET_SAFELIST), set()
+    for path in content_files():
+        text = path.read_text(errors="ignore")
+        words.update(TOKEN_RE.findall(text))
+        prefixes.update(PREFIX_RE.findall(text))
+    return words, tuple(prefixes)
+
+
+# ########################################################
+# Stylesheets
+# ########################################################
+
+
+def split_rules(css):
+    """
+    Yield the (prelude, block) of the top level rules of a stylesheet, with
+    a None block for statements such as @charset, and the (comment, None)
+    of the /*! ... */ license comments. Other comments are dropped.
+    """
+    start, depth, i, n = 0, 0, 0, len(css)
+    block_start = prelude = None
+    while i < n:
+        char = css[i]
+        if css.startswith("/*", i):
+            end = css.find("*/", i + 2)
+            end = n if end < 0 else end + 2
+            if depth == 0:
+                if css.startswith("/*!", i):
+                    yield css[i:end], None
+                # the comment is no part of the next prelude
+                if not css[start:i].strip():
+                    start = end
+            i = end
+            continue
+        if char in "\"'":
+            i += 1
+            while i < n and css[i] != char:
+                i += 2 if css[i] == "\\" else 1
+        elif char == "{":
+            if depth == 0:
+                prelude, block_start = css[start:i].strip(), i + 1
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                yield prelude, css[block_start:i]
+                start = i + 1
+        elif char == ";" and depth == 0:
+            yield css[start:i].strip(), None
+            start = i + 1
+        i += 1
+
+
+def split_selectors(prelude):
+    selectors, depth, start = [], 0, 0
+    for i, char in enumerate(prelude):
+        if char in "([":
+            depth += 1
+        elif char in ")]":
+            depth -= 1
+        elif char == "," and depth == 0:
+            selectors.append(prelude[start:i].strip())
+            start = i + 1
+    selectors.append(prelude[start:].strip())
+    return selectors
+
+
+def selector_used(selector, words, prefixes):
+    selector = ATTRIBUTE_RE.sub("", selector)
+    while NOT_RE.search(selector):
+        selector = NOT_RE.sub("", selector)
+    return all(
+        name in words or name.startswith(prefixes)
+        for name in CLASS_RE.findall(selector)
+    )
+
+
+def purge(css, words, prefixes):
+    """The stylesheet without the rules matching none of the used classes."""
+    output = []
+    for prelude, block in split_rules(css):
+        if block is None:
+            # @charset has to come first, the bundle is UTF-8 anyway
+            if not prelude.startswith("@charset"):
+                output.append(prelude if prelude.startswith("/*") else prelude + ";")
+        elif prelude.startswith(NESTED_AT_RULES):
+            inner = purge(block, words, prefixes)
+            if inner:
+                output.append(f"{prelude}{{{inner}}}")
+        elif prelude.startswith("@"):
+            output.append(f"{prelude}{{{block}}}")
+        else:
+            selectors = [
+                selector
+                for selector in split_selectors(prelude)
+                if selector_used(selector, words, prefixes)
+            ]
+            if selectors:
+                output.append(f"{','.join(selectors)}{{{block}}}")
+    return "".join(output)
+
+
+def rebase_urls(css, source):
+    """Make the relative urls of a stylesheet at `source` relative to dist/."""
+
+    def rebase(match):
+        url = match.group(2)
+        if url.startswith(("data:", "/", "#")) or "://" in url:
+            return match.group(0)
+        path = posixpath.normpath(posixpath.join(posixpath.dirname(source), url))
+        return f'url("{posixpath.relpath(path, ASSETS_DIR)}")'
+
+    return URL_RE.sub(rebase, css)
+
+
+def font_family(block):
+    match = re.search(r"font-family:\s*([^;}]+)", block)
+    return match.group(1).strip().strip("\"'") if match else None
+
+
+def content_code_points(css):
+    """The characters inserted by the `content` declarations of a stylesheet."""
+
+    def unescape(match):
+        if match.group(1):
+            return chr(int(match.group(1), 16))
+        return match.group(2)
+
+    code_points = set()
+    for _, value in CONTENT_RE.findall(css):
+        code_points.update(ord(char) for char in ESCAPE_RE.sub(unescape, value))
+    return code_points
+
+
+def parse_unicodes(ranges):
+    code_points = set()
+    for item in ranges.split(","):
+        first, _, last = item.strip()[2:].partition("-")
+        code_points.update(range(int(first, 16), int(last or first, 16) + 1))
+    return code_points
+
+
+# ########################################################
+# Fonts
+# ########################################################
+
+
+def subset_font(source, target, code_points):
+    """Write the woff2 font at `source` reduced to `code_points` to `target`."""
+    if subset is None:
+        shutil.copyfile(source, target)
+        return
+    # fontTools reports every table it prunes at INFO level
+    logging.getLogger("fontTools").setLevel(logging.WARNING)
+    options = subset.Options()
+    options.flavor = "woff2"
+    options.hinting = False
+    options.desubroutinize = True
+    font = subset.load_font(source, options)
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(unicodes=code_points)
+    subsetter.subset(font)
+    subset.save_font(font, target, options)
+    font.close()
+
+
+def build_fonts(faces, css, output_dir):
+    """
+    Write the fonts of the @font-face blocks still used by `css` to
+    output_dir/fonts. `faces` are (block, stylesheet) pairs. Returns the
+    blocks pointing at the written fonts and the static paths of the fonts
+    they were made from.
+    """
+    icon_code_points = content_code_points(css)
+    text_code_points = parse_unicodes(TEXT_FONT_UNICODES)
+    fonts_dir = output_dir / "fonts"
+    fonts_dir.mkdir(parents=True, exist_ok=True)
+    blocks, fonts = [], []
+    for block, source in faces:
+        family = font_family(block)
+        if family and family not in css:
+            # e.g. the FontAwesome 4 compatibility font
+            continue
+        urls = [
+            posixpath.normpath(posixpath.join(posixpath.dirname(source), url))
+            for _, url in URL_RE.findall(block)
+        ]
+        woff2 = next((url for url in urls if url.endswith(".woff2")), None)
+        if woff2 is None:
+            blocks.append(rebase_urls(block, source))
+            continue
+        name = posixpath.basename(woff2)
+        if woff2 not in fonts:
+            subset_font(
+                finders.find(woff2),
+                fonts_dir / name,
+                icon_code_points if woff2.startswith(ICON_FONTS) else text_code_points,
+            )
+            fonts.append(woff2)
+        block = SRC_RE.sub("", block).strip().rstrip(";")
+        blocks.append(f'{block};src:url("fonts/{name}") format("woff2")')
+    return blocks, fonts
+
+
+# ########################################################
+# Build
+# ########################################################
+
+
+def read_static(name):
+    path = finders.find(name)
+    if path is None:
+        raise FileNotFoundError(f"Static file not found: {name}")
+    return Path(path).read_text(encoding="utf-8")
+
+
+def build_css(name, output_dir, words, prefixes):
+    """The purged stylesheet of a bundle and the static paths of its fonts."""
+    header, faces, rules = [], [], []
+    for source in BUNDLES[name]:
+        css = purge(read_static(source), words, prefixes)
+        for prelude, block in split_rules(css):
+            if block is None:
+                header.append(prelude if prelude.startswith("/*") else prelude + ";")
+            elif prelude == "@font-face":
+                faces.append((block, source))
+            else:
+                rules.append(rebase_urls(f"{prelude}{{{block}}}", source))
+    css = "".join(rules)
+    blocks, fonts = build_fonts(faces, css, output_dir)
+    css = "".join(f"@font-face{{{block}}}" for block in blocks) + css
+    return "\n".join(header + [css]) + "\n", fonts
+
+
+def build_js(name):
+    scripts = [SOURCE_MAP_RE.sub("", read_static(source)) for source in BUNDLES[name]]
+    # a script without a trailing semicolon would run into the next one
+    return ";\n".join(script.strip() for script in scripts) + "\n"
+
+
+def file_sizes(data):
+    """The raw, gzip and brotli (None without the brotli module) sizes."""
+    return (
+        len(data),
+        len(gzip.compress(data, 9)),
+        len(brotli.compress(data)) if brotli else None,
+    )
+
+
+def build_assets(output_dir=None):
+    """
+    Build the bundles and their fonts. Returns a (path, sizes, sizes of the
+    sources) tuple per written file, with sizes as returned by file_sizes.
+    """
+    output_dir = Path(output_dir or Path(settings.STATICFILES_DIRS[0]) / ASSETS_DIR)
+    if output_dir.exists():
+        shutil.rmtree(output_dir)
+    output_dir.mkdir(parents=True)
+    words, prefixes = used_classes()
+
+    report, fonts = [], []
+    for name, sources in BUNDLES.items():
+        if name.endswith(".css"):
+            content, bundle_fonts = build_css(name, output_dir, words, prefixes)
+            fonts.extend(bundle_fonts)
+        else:
+            content = build_js(name)
+        data = content.encode("utf-8")
+        (output_dir / name).write_bytes(data)
+        source_data = b"".join(
+            Path(finders.find(path)).read_bytes() for path in sources
+        )
+        report.append((bundle_path(name), file_sizes(data), file_sizes(source_data)))
+    for font in fonts:
+        name = f"fonts/{posixpath.basename(font)}"
+        report.append(
+            (
+                bundle_path(name),
+                file_sizes((output_dir / name).read_bytes()),
+                file_sizes(Path(finders.find(font)).read_bytes()),
+            )
+        )
+    return report
+
+
+def bundle_path(name):
+    return f"{ASSETS_DIR}/{name}"
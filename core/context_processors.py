@@ -0,0 +1,10 @@
+from .models import get_academic_period
+
+
+def academic_period(request):
+    """Make the current session and semester available to every template."""
+    period = get_academic_period()
+    return {
+        "current_session": period.session,
+        "current_semester": period.semester,
+    }
@@ -0,0 +1,233 @@
+"""
+Outbox based email delivery.
+
+Emails are rendered and stored as OutboxEmail rows when they are queued and
+delivered afterwards by a single background worker per process, in batches
+sharing one SMTP connection. Failed emails are retried with exponential
+backoff; whatever is left in the outbox when a process stops is picked up by
+the next worker or by the `send_queued_email` management command.
+"""
+
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import close_old_connections, transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from .models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+EMAIL_OUTBOX_BATCH_SIZE = getattr(settings, "EMAIL_OUTBOX_BATCH_SIZE", 50)
+EMAIL_OUTBOX_MAX_ATTEMPTS = getattr(settings, "EMAIL_OUTBOX_MAX_ATTEMPTS", 5)
+# seconds before the first retry, doubled on every further attempt
+EMAIL_OUTBOX_RETRY_DELAY = getattr(settings, "EMAIL_OUTBOX_RETRY_DELAY", 30)
+EMAIL_OUTBOX_MAX_RETRY_DELAY = 60 * 60
+# emails claimed longer ago than this by a worker that died are sent again
+EMAIL_OUTBOX_CLAIM_TIMEOUT = timedelta(minutes=10)
+
+
+def render_html_email(subject, recipient_list, template, context):
+    """Return an unsaved OutboxEmail for the rendered HTML template."""
+    html_message = render_to_string(template, context)
+    return OutboxEmail(
+        subject=subject,
+        body=strip_tags(html_message),
+        html_body=html_message,
+        from_email=settings.EMAIL_FROM_ADDRESS,
+        recipients=list(recipient_list),
+    )
+
+
+def queue_emails(emails):
+    """
+    Store unsaved OutboxEmail instances with a single query and wake up the
+    worker once the current transaction commits.
+    """
+    emails = OutboxEmail.objects.bulk_create(emails)
+    transaction.on_commit(worker.wake)
+    return emails
+
+
+def queue_html_email(subject, recipient_list, template, context):
+    """Queued counterpart of core.utils.send_html_email."""
+    return queue_emails(
+        [render_html_email(subject, recipient_list, template, context)]
+    )[0]
+
+
+def retry_delay(attempts):
+    return timedelta(
+        seconds=min(
+            EMAIL_OUTBOX_RETRY_DELAY * 2 ** (attempts - 1),
+            EMAIL_OUTBOX_MAX_RETRY_DELAY,
+        )
+    )
+
+
+def claim_emails(batch_size):
+    """
+    Mark up to `batch_size` due emails as being sent by this worker and return
+    them. The conditional update makes sure two workers never claim the same
+    email.
+    """
+    now = timezone.now()
+    OutboxEmail.objects.filter(
+        status=OutboxEmail.SENDING, claimed_at__lt=now - EMAIL_OUTBOX_CLAIM_TIMEOUT
+    ).update(status=OutboxEmail.PENDING)
+
+    ids = list(OutboxEmail.objects.due().values_list("pk", flat=True)[:batch_size])
+    OutboxEmail.objects.filter(pk__in=ids, status=OutboxEmail.PENDING).update(
+        status=OutboxEmail.SENDING, claimed_at=now
+    )
+    return list(
+        OutboxEmail.objects.filter(
+            pk__in=ids, status=OutboxEmail.SENDING, claimed_at=now
+        ).order_by("pk")
+    )
+
+
+def build_message(email, connection):
+    message = EmailMultiAlternatives(
+        email.subject,
+        email.body,
+        email.from_email,
+        email.recipients,
+        connection=connection,
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, "text/html")
+    return message
+
+
+def mark_failed(email, error, now):
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= EMAIL_OUTBOX_MAX_ATTEMPTS:
+        email.status = OutboxEmail.FAILED
+        logger.error("Giving up on email %s: %s", email.pk, error)
+    else:
+        email.status = OutboxEmail.PENDING
+        email.next_attempt_at = now + retry_delay(email.attempts)
+        logger.warning(
+            "Email %s failed (attempt %d), retrying at %s: %s",
+            email.pk,
+            email.attempts,
+            email.next_attempt_at,
+            error,
+        )
+
+
+def send_batch(emails):
+    """
+    Send the claimed emails over one connection and record the outcome of
+    each. Returns the number of emails sent.
+    """
+    now = timezone.now()
+    sent = 0
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as error:
+        for email in emails:
+            mark_failed(email, error, now)
+    else:
+        try:
+            for email in emails:
+                # send one by one over the open connection so a rejected
+                # recipient only fails its own email
+                try:
+                    connection.send_messages([build_message(email, connection)])
+                except Exception as error:
+                    mark_failed(email, error, now)
+                else:
+                    email.status = OutboxEmail.SENT
+                    email.attempts += 1
+                    email.sent_at = now
+                    email.last_error = ""
+                    # account emails carry passwords, keep no copy of them
+                    email.body = email.html_body = ""
+                    sent += 1
+        finally:
+            connection.close()
+
+    OutboxEmail.objects.bulk_update(
+        emails,
+        [
+            "status",
+            "attempts",
+            "next_attempt_at",
+            "last_error",
+            "sent_at",
+            "body",
+            "html_body",
+        ],
+    )
+    return sent
+
+
+def send_queued_emails(batch_size=EMAIL_OUTBOX_BATCH_SIZE):
+    """
+    Send every due email in the outbox, `batch_size` emails per connection.
+    Returns the number of emails sent.
+    """
+    sent = 0
+    while True:
+        emails = claim_emails(batch_size)
+        if not emails:
+            return sent
+        sent += send_batch(emails)
+
+
+def seconds_until_next_email():
+    next_attempt_at = (
+        OutboxEmail.objects.filter(status=OutboxEmail.PENDING)
+        .order_by("next_attempt_at")
+        .values_list("next_attempt_at", flat=True)
+        .first()
+    )
+    if next_attempt_at is None:
+        return None
+    return max((next_attempt_at - timezone.now()).total_seconds(), 0)
+
+
+class OutboxWorker:
+    """
+    A single daemon thread per process that drains the outbox whenever it is
+    woken up and sleeps until the next retry is due.
+    """
+
+    def __init__(self):
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def wake(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self.run, name="email-outbox", daemon=True
+                )
+                self._thread.start()
+        self._wakeup.set()
+
+    def run(self):
+        while True:
+            self._wakeup.clear()
+            timeout = EMAIL_OUTBOX_RETRY_DELAY
+            try:
+                send_queued_emails()
+                timeout = seconds_until_next_email()
+            except Exception:
+                logger.exception("Sending queued emails failed")
+            finally:
+                close_old_connections()
+            self._wakeup.wait(timeout)
+
+
+worker = OutboxWorker()
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from scripts.benchmark import SCALES, run
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a test database with fake data and time the key pages against "
+        "the benchmark baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", choices=SCALES, default="small")
+        parser.add_argument(
+            "--update",
+            action="store_true",
+            help="Store the measured figures as the new baseline.",
+        )
+
+    def handle(self, *args, **options):
+        failures = run(options["scale"], options["update"], self.stdout.write)
+        if failures:
+            raise CommandError("Regressions:\n" + "\n".join(failures))
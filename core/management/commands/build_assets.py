@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from core import assets
+
+
+def kilobytes(size):
+    return "-" if size is None else f"{size / 1024:.1f}"
+
+
+class Command(BaseCommand):
+    help = (
+        "Bundle, purge and subset the frontend assets into static/dist/ and "
+        "report their sizes in KiB. Run it before collectstatic."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output", help="Directory to write to instead of static/dist/."
+        )
+
+    def row(self, path, sizes, source_size):
+        self.stdout.write(
+            f"{path:<40}"
+            + "".join(f"{kilobytes(size):>9}" for size in sizes)
+            + f"{kilobytes(source_size):>10}"
+        )
+
+    def handle(self, *args, **options):
+        if assets.subset is None:
+            self.stderr.write(
+                "fontTools is not installed, the fonts are copied without "
+                "subsetting (pip install fonttools[woff])."
+            )
+        report = assets.build_assets(options["output"])
+
+        self.stdout.write(f"{'':<40}{'raw':>9}{'gzip':>9}{'brotli':>9}{'sources':>10}")
+        for path, sizes, source_sizes in report:
+            self.row(path, sizes, source_sizes[0])
+        totals = [
+            None if None in column else sum(column)
+            for column in zip(
+                *(sizes + source_sizes[:1] for _, sizes, source_sizes in report)
+            )
+        ]
+        self.row("total", totals[:3], totals[3])
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from core.activity import ACTIVITY_LOG_RETENTION_DAYS, prune_activity_log
+
+
+class Command(BaseCommand):
+    help = (
+        "Count activity log entries older than the retention period into daily "
+        "rollups and delete them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=ACTIVITY_LOG_RETENTION_DAYS,
+            help="Number of days of activity to keep.",
+        )
+
+    def handle(self, *args, **options):
+        deleted = prune_activity_log(days=options["days"])
+        self.stdout.write(f"Deleted {deleted} activity log entries.")
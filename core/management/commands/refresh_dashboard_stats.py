@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from core.stats import SECTIONS, refresh_section
+
+
+class Command(BaseCommand):
+    help = "Recompute the dashboard statistics snapshots."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--section",
+            action="append",
+            dest="sections",
+            choices=list(SECTIONS),
+            help="Section to recompute, can be repeated. All of them by default.",
+        )
+
+    def handle(self, *args, **options):
+        sections = options["sections"] or list(SECTIONS)
+        for section in sections:
+            refresh_section(section)
+        self.stdout.write(f"Refreshed {', '.join(sections)}.")
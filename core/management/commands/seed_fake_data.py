@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from scripts.bulk_seed import DEFAULT_COUNTS, seed_database
+
+
+class Command(BaseCommand):
+    help = "Fill the database with fake data in bulk, for load testing."
+
+    def add_arguments(self, parser):
+        for name, count in DEFAULT_COUNTS.items():
+            parser.add_argument(
+                f"--{name.replace('_', '-')}",
+                type=int,
+                default=count,
+                help=f"Number of {name.replace('_', ' ')} (default {count}).",
+            )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Random seed; the same seed generates the same data.",
+        )
+
+    def handle(self, *args, **options):
+        counts = {name: options[name] for name in DEFAULT_COUNTS}
+        seed_database(counts, seed=options["seed"], stdout=self.stdout.write)
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from core.mail import EMAIL_OUTBOX_BATCH_SIZE, send_queued_emails
+from core.models import OutboxEmail
+
+
+class Command(BaseCommand):
+    help = "Send every due email waiting in the outbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=EMAIL_OUTBOX_BATCH_SIZE,
+            help="Number of emails sent over each SMTP connection.",
+        )
+
+    def handle(self, *args, **options):
+        sent = send_queued_emails(batch_size=options["batch_size"])
+        pending = OutboxEmail.objects.filter(status=OutboxEmail.PENDING).count()
+        failed = OutboxEmail.objects.filter(status=OutboxEmail.FAILED).count()
+        self.stdout.write(
+            f"Sent {sent} emails, {pending} waiting for a retry, {failed} failed."
+        )
@@ -0,0 +1,173 @@
+"""
+Request instrumentation.
+
+RequestMetricsMiddleware measures every request: total time, number of SQL
+queries and time spent in them, template render time and response size. A
+sample of the requests (REQUEST_METRICS_SAMPLE_RATE) is stored as
+RequestMetric rows, as is every request slower than REQUEST_METRICS_SLOW_MS,
+together with the SQL it ran. The RequestMetric admin summarises them per
+view with p50/p95 figures.
+
+Render time is measured by the DjangoTemplates backend below, which has to
+be set as the template BACKEND.
+"""
+
+import logging
+import math
+import random
+import time
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.conf import settings
+from django.template.backends import django as django_backend
+from django.utils import timezone
+
+from .models import RequestMetric
+from .utils import QueryCounter
+
+logger = logging.getLogger(__name__)
+
+REQUEST_METRICS_SAMPLE_RATE = 0.0
+REQUEST_METRICS_SLOW_MS = 1000
+# number of queries kept for a slow request
+REQUEST_METRICS_CAPTURE_SQL = 100
+REQUEST_METRICS_SUMMARY_DAYS = 7
+
+_render_time = ContextVar("render_time", default=None)
+
+
+class TimedTemplate:
+    """Wraps a backend template to add its render time to the request's."""
+
+    def __init__(self, template):
+        self._wrapped = template
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+    def render(self, context=None, request=None):
+        start = time.monotonic()
+        try:
+            return self._wrapped.render(context, request)
+        finally:
+            render_time = _render_time.get()
+            if render_time is not None:
+                render_time[0] += time.monotonic() - start
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+def view_name(resolver_match):
+    view = resolver_match.func
+    view = getattr(view, "view_class", view)
+    return f"{view.__module__}.{view.__qualname__}"
+
+
+def response_size(response):
+    if response.streaming:
+        return int(response.get("Content-Length") or 0)
+    return len(response.content)
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(
+            settings, "REQUEST_METRICS_SAMPLE_RATE", REQUEST_METRICS_SAMPLE_RATE
+        )
+        self.slow_ms = getattr(
+            settings, "REQUEST_METRICS_SLOW_MS", REQUEST_METRICS_SLOW_MS
+        )
+
+    def __call__(self, request):
+        render_time = [0.0]
+        token = _render_time.set(render_time)
+        start = time.monotonic()
+        try:
+            with QueryCounter(capture=REQUEST_METRICS_CAPTURE_SQL) as counter:
+                response = self.get_response(request)
+        finally:
+            _render_time.reset(token)
+        duration = (time.monotonic() - start) * 1000
+
+        if request.resolver_match is None:
+            # static files and 404s of unknown URLs
+            return response
+        slow = self.slow_ms is not None and duration >= self.slow_ms
+        if slow or random.random() < self.sample_rate:
+            self.record(request, response, duration, counter, render_time[0], slow)
+        return response
+
+    def record(self, request, response, duration, counter, render_time, slow):
+        try:
+            RequestMetric.objects.create(
+                view=view_name(request.resolver_match),
+                method=request.method,
+                path=request.path[:2000],
+                status_code=response.status_code,
+                duration=duration,
+                query_count=counter.count,
+                db_time=counter.duration * 1000,
+                render_time=render_time * 1000,
+                response_size=response_size(response),
+                slow=slow,
+                sql=(
+                    [
+                        {"sql": sql, "time": round(elapsed * 1000, 3)}
+                        for sql, elapsed in counter.queries
+                    ]
+                    if slow
+                    else []
+                ),
+            )
+        except Exception:
+            logger.exception("Could not record the metrics of %s", request.path)
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a sorted list."""
+    if not values:
+        return None
+    return values[max(math.ceil(fraction * len(values)) - 1, 0)]
+
+
+def view_summary(days=REQUEST_METRICS_SUMMARY_DAYS):
+    """
+    Return one dict per view with the number of recorded requests, their
+    p50/p95 duration and query count, average DB and render time and the
+    number of slow requests over the last `days` days, slowest p95 first.
+    """
+    since = timezone.now() - timedelta(days=days)
+    rows = RequestMetric.objects.filter(created_at__gte=since).values_list(
+        "view", "duration", "query_count", "db_time", "render_time", "slow"
+    )
+    views = {}
+    for view, *values in rows.iterator():
+        views.setdefault(view, []).append(values)
+
+    summary = []
+    for view, values in views.items():
+        durations = sorted(value[0] for value in values)
+        queries = sorted(value[1] for value in values)
+        summary.append(
+            {
+                "view": view,
+                "requests": len(values),
+                "p50": percentile(durations, 0.5),
+                "p95": percentile(durations, 0.95),
+                "queries_p50": percentile(queries, 0.5),
+                "queries_p95": percentile(queries, 0.95),
+                "db_time": sum(value[2] for value in values) / len(values),
+                "render_time": sum(value[3] for value in values) / len(values),
+                "slow": sum(value[4] for value in values),
+            }
+        )
+    summary.sort(key=lambda row: row["p95"], reverse=True)
+    return summary
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:32
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0004_outboxemail"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StatisticsSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("section", models.CharField(max_length=50, unique=True)),
+                ("data", models.JSONField(default=dict)),
+                (
+                    "computed_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("stale", models.BooleanField(default=False)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="RoleTraffic",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("role", models.CharField(max_length=20)),
+                ("logins", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "unique_together": {("date", "role")},
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0006_activitylog_created_at_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RequestMetric",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("view", models.CharField(max_length=255)),
+                ("method", models.CharField(max_length=10)),
+                ("path", models.CharField(max_length=2000)),
+                ("status_code", models.PositiveSmallIntegerField()),
+                ("duration", models.FloatField(help_text="Milliseconds")),
+                ("query_count", models.PositiveIntegerField(default=0)),
+                ("db_time", models.FloatField(default=0, help_text="Milliseconds")),
+                ("render_time", models.FloatField(default=0, help_text="Milliseconds")),
+                ("response_size", models.PositiveIntegerField(default=0)),
+                ("slow", models.BooleanField(default=False)),
+                ("sql", models.JSONField(blank=True, default=list)),
+                ("created_at", models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["view", "created_at"],
+                        name="core_reques_view_e88311_idx",
+                    )
+                ],
+            },
+        ),
+    ]
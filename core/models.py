@@ -1,7 +1,12 @@
-from django.db import models
-from django.db.models import Q
-from django.utils.translation import gettext_lazy as _
+from collections import namedtuple
 
+from django.core.cache import cache
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
 
 NEWS = _("News")
 EVENTS = _("Event")
@@ -85,9 +90,202 @@ class Semester(models.Model):
         return f"{self.semester}"
 
 
+ACADEMIC_PERIOD_CACHE_KEY = "core:academic_period"
+# Bounds how long another process may serve a stale period when the cache
+# backend is per-process (locmem); a shared backend is invalidated right away.
+ACADEMIC_PERIOD_TIMEOUT = 60 * 5
+
+
+class AcademicPeriod(namedtuple("AcademicPeriod", ["session", "semester"])):
+    __slots__ = ()
+
+    @property
+    def session_semester(self):
+        """The current semester if it belongs to the current session."""
+        if (
+            self.session
+            and self.semester
+            and self.semester.session_id == self.session.pk
+        ):
+            return self.semester
+        return None
+
+
+def get_academic_period():
+    """
+    Return the current session and the current semester as an AcademicPeriod
+    (either may be None). The pair is cached and cleared by the
+    Session/Semester signal receivers below, so pages listing many courses
+    don't query it again and again.
+    """
+    period = cache.get(ACADEMIC_PERIOD_CACHE_KEY)
+    if period is None:
+        session = Session.objects.filter(is_current_session=True).first()
+        semester = Semester.objects.filter(is_current_semester=True).first()
+        period = AcademicPeriod(session, semester)
+        cache.set(ACADEMIC_PERIOD_CACHE_KEY, period, ACADEMIC_PERIOD_TIMEOUT)
+    return period
+
+
+@receiver(post_save, sender=Session)
+@receiver(post_delete, sender=Session)
+@receiver(post_save, sender=Semester)
+@receiver(post_delete, sender=Semester)
+def clear_academic_period(sender, **kwargs):
+    cache.delete(ACADEMIC_PERIOD_CACHE_KEY)
+
+
+class SequenceManager(models.Manager):
+    def reserve(self, name, count=1, start=0):
+        """
+        Atomically reserve `count` consecutive numbers of the sequence `name`
+        and return them as a range. The increment is a single UPDATE, so
+        concurrent callers always get disjoint blocks. `start` (a number or a
+        callable returning one) is the last number already in use, read only
+        when the sequence is created.
+        """
+        with transaction.atomic():
+            if not self.filter(name=name).update(value=F("value") + count):
+                initial = start() if callable(start) else start
+                try:
+                    with transaction.atomic():
+                        self.create(name=name, value=initial + count)
+                except IntegrityError:
+                    # created concurrently, increment it like everyone else
+                    self.filter(name=name).update(value=F("value") + count)
+            last = self.filter(name=name).values_list("value", flat=True).get()
+        return range(last - count + 1, last + 1)
+
+
+class SlugSequence(models.Model):
+    """The last number appended to a slug, per model and base slug."""
+
+    name = models.CharField(max_length=255, unique=True)
+    value = models.PositiveIntegerField(default=0)
+
+    objects = SequenceManager()
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+
 class ActivityLog(models.Model):
     message = models.TextField()
-    created_at = models.DateTimeField(auto_now=True)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
 
     def __str__(self):
         return f"[{self.created_at}]{self.message}"
+
+
+class ActivityRollup(models.Model):
+    """Number of activity log entries per day, kept once they are pruned."""
+
+    date = models.DateField(unique=True)
+    entries = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.date}: {self.entries}"
+
+
+class OutboxEmailManager(models.Manager):
+    def due(self):
+        return self.filter(
+            status=OutboxEmail.PENDING, next_attempt_at__lte=timezone.now()
+        ).order_by("next_attempt_at", "pk")
+
+
+class OutboxEmail(models.Model):
+    """
+    An email waiting to be sent. Emails are written here first and delivered
+    by core.mail, so they survive a restart of the process that queued them.
+    """
+
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"
+
+    STATUS = (
+        (PENDING, _("Pending")),
+        (SENDING, _("Sending")),
+        (SENT, _("Sent")),
+        (FAILED, _("Failed")),
+    )
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=254)
+    recipients = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    objects = OutboxEmailManager()
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "next_attempt_at"])]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.recipients)} ({self.status})"
+
+
+class StatisticsSnapshot(models.Model):
+    """
+    The last computed value of one section of the dashboard statistics (see
+    core.stats). Model signals flag a section as stale and it is recomputed
+    the next time the dashboard is shown.
+    """
+
+    section = models.CharField(max_length=50, unique=True)
+    data = models.JSONField(default=dict)
+    computed_at = models.DateTimeField(default=timezone.now)
+    stale = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"{self.section} ({self.computed_at})"
+
+
+class RoleTraffic(models.Model):
+    """Number of logins per day and user role."""
+
+    date = models.DateField()
+    role = models.CharField(max_length=20)
+    logins = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("date", "role")
+
+    def __str__(self):
+        return f"{self.date} {self.role}: {self.logins}"
+
+
+class RequestMetric(models.Model):
+    """
+    Timings of one request, recorded by core.metrics.RequestMetricsMiddleware
+    for a sample of the requests and for every slow one. Slow requests keep
+    the SQL they ran.
+    """
+
+    view = models.CharField(max_length=255)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=2000)
+    status_code = models.PositiveSmallIntegerField()
+    duration = models.FloatField(help_text=_("Milliseconds"))
+    query_count = models.PositiveIntegerField(default=0)
+    db_time = models.FloatField(default=0, help_text=_("Milliseconds"))
+    render_time = models.FloatField(default=0, help_text=_("Milliseconds"))
+    response_size = models.PositiveIntegerField(default=0)
+    slow = models.BooleanField(default=False)
+    sql = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["view", "created_at"])]
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration:.0f} ms)"
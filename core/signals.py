@@ -0,0 +1,20 @@
+from .stats import mark_stale, record_login
+
+
+def people_changed_receiver(sender, update_fields=None, **kwargs):
+    # every login saves last_login, which no statistic depends on
+    if update_fields == {"last_login"}:
+        return
+    mark_stale("people")
+
+
+def courses_changed_receiver(sender, **kwargs):
+    mark_stale("courses")
+
+
+def resources_changed_receiver(sender, **kwargs):
+    mark_stale("resources", "courses")
+
+
+def user_logged_in_receiver(sender, request, user, **kwargs):
+    record_login(user)
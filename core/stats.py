@@ -0,0 +1,176 @@
+"""
+Dashboard statistics.
+
+Each section of the dashboard is computed with a few grouped queries and
+stored as a StatisticsSnapshot. The dashboard is served from the snapshots;
+the receivers in core.signals flag the sections a model change affects as
+stale, and only those sections are recomputed on the next visit.
+`refresh_dashboard_stats` recomputes everything, e.g. from cron.
+"""
+
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Avg, Count, F, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from accounts.models import Student, User
+from course.models import Course, Program, Upload, UploadVideo
+from result.models import TakenCourse
+from .models import RoleTraffic, StatisticsSnapshot
+
+# Snapshots older than this are recomputed even if nothing flagged them, to
+# catch changes made without signals (queryset.update(), raw SQL...).
+STATISTICS_MAX_AGE = timedelta(minutes=30)
+# Number of courses shown in the enrollment and grade charts.
+STATISTICS_TOP_COURSES = 10
+TRAFFIC_MONTHS = 6
+
+
+def user_role(user):
+    if user.is_superuser:
+        return "admin"
+    elif user.is_lecturer:
+        return "lecturer"
+    elif user.is_student:
+        return "student"
+    elif user.is_parent:
+        return "parent"
+    return "other"
+
+
+def compute_people():
+    counts = User.objects.aggregate(
+        students=Count("pk", filter=Q(is_student=True)),
+        lecturers=Count("pk", filter=Q(is_lecturer=True)),
+        superusers=Count("pk", filter=Q(is_superuser=True)),
+        parents=Count("pk", filter=Q(is_parent=True)),
+    )
+    counts.update(
+        Student.objects.aggregate(
+            males=Count("pk", filter=Q(student__gender="M")),
+            females=Count("pk", filter=Q(student__gender="F")),
+        )
+    )
+    counts["levels"] = {
+        row["level"]: row["count"]
+        for row in Student.objects.order_by()
+        .values("level")
+        .annotate(count=Count("pk"))
+        if row["level"]
+    }
+    return counts
+
+
+def compute_courses():
+    rows = (
+        TakenCourse.objects.order_by()
+        .values("course__code")
+        .annotate(enrollments=Count("pk"), average=Avg("total"))
+        .order_by("-enrollments", "course__code")[:STATISTICS_TOP_COURSES]
+    )
+    return {
+        "courses": [
+            {
+                "code": row["course__code"],
+                "enrollments": row["enrollments"],
+                "average": round(float(row["average"] or 0), 2),
+            }
+            for row in rows
+        ]
+    }
+
+
+def compute_resources():
+    return {
+        "programs": Program.objects.count(),
+        "courses": Course.objects.count(),
+        "documents": Upload.objects.count(),
+        "videos": UploadVideo.objects.count(),
+    }
+
+
+def compute_traffic():
+    today = timezone.localdate()
+    start = (today.replace(day=1) - timedelta(days=31 * (TRAFFIC_MONTHS - 1))).replace(
+        day=1
+    )
+    rows = (
+        RoleTraffic.objects.filter(date__gte=start)
+        .annotate(month=TruncMonth("date"))
+        .values("month", "role")
+        .annotate(logins=Sum("logins"))
+        .order_by("month")
+    )
+    months = []
+    logins = {}
+    for row in rows:
+        month = row["month"].strftime("%Y-%m")
+        if month not in months:
+            months.append(month)
+        logins.setdefault(row["role"], {})[month] = row["logins"]
+    return {
+        "months": months,
+        "roles": {
+            role: [values.get(month, 0) for month in months]
+            for role, values in logins.items()
+        },
+    }
+
+
+SECTIONS = {
+    "people": compute_people,
+    "courses": compute_courses,
+    "resources": compute_resources,
+    "traffic": compute_traffic,
+}
+
+
+def refresh_section(section):
+    # clear the flag before computing so changes made meanwhile flag it again
+    StatisticsSnapshot.objects.filter(section=section).update(stale=False)
+    data = SECTIONS[section]()
+    StatisticsSnapshot.objects.update_or_create(
+        section=section, defaults={"data": data, "computed_at": timezone.now()}
+    )
+    return data
+
+
+def get_dashboard_stats():
+    """
+    Return {section: data} for every dashboard section, recomputing only the
+    stale or outdated ones.
+    """
+    snapshots = {
+        snapshot.section: snapshot
+        for snapshot in StatisticsSnapshot.objects.filter(section__in=SECTIONS)
+    }
+    outdated = timezone.now() - STATISTICS_MAX_AGE
+    stats = {}
+    for section in SECTIONS:
+        snapshot = snapshots.get(section)
+        if snapshot is None or snapshot.stale or snapshot.computed_at < outdated:
+            stats[section] = refresh_section(section)
+        else:
+            stats[section] = snapshot.data
+    return stats
+
+
+def mark_stale(*sections):
+    StatisticsSnapshot.objects.filter(section__in=sections, stale=False).update(
+        stale=True
+    )
+
+
+def record_login(user):
+    role = user_role(user)
+    today = timezone.localdate()
+    traffic = RoleTraffic.objects.filter(date=today, role=role)
+    if not traffic.update(logins=F("logins") + 1):
+        try:
+            with transaction.atomic():
+                RoleTraffic.objects.create(date=today, role=role, logins=1)
+        except IntegrityError:
+            traffic.update(logins=F("logins") + 1)
+    mark_stale("traffic")
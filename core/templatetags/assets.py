@@ -0,0 +1,29 @@
+from functools import lru_cache
+
+from django import template
+from django.contrib.staticfiles import finders
+from django.templatetags.static import static
+from django.utils.html import format_html_join
+
+from core.assets import BUNDLES, bundle_path
+
+register = template.Library()
+
+
+@lru_cache(maxsize=None)
+def bundle_built(name):
+    return finders.find(bundle_path(name)) is not None
+
+
+@register.simple_tag
+def asset_bundle(name):
+    """
+    Link the bundle built by `build_assets`, or the files it is made of
+    when it was not built.
+    """
+    paths = [bundle_path(name)] if bundle_built(name) else BUNDLES[name]
+    if name.endswith(".css"):
+        tag = '<link rel="stylesheet" type="text/css" href="{}">'
+    else:
+        tag = '<script type="text/javascript" src="{}"></script>'
+    return format_html_join("\n", tag, ((static(path),) for path in paths))
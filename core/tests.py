@@ -1,3 +1,603 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.db import transaction
+from django.template import Context, Template
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import Student, User
+from course.models import Course, Program
+from quiz.models import Quiz
+from result.models import TakenCourse
+from .activity import batched_activity, log_activity, prune_activity_log
+from .assets import build_assets, purge
+from .context_processors import academic_period
+from .mail import (
+    EMAIL_OUTBOX_MAX_ATTEMPTS,
+    queue_emails,
+    queue_html_email,
+    render_html_email,
+    send_queued_emails,
+    worker,
+)
+from .metrics import view_summary
+from .models import (
+    ActivityLog,
+    ActivityRollup,
+    OutboxEmail,
+    RequestMetric,
+    Semester,
+    Session,
+    StatisticsSnapshot,
+    get_academic_period,
+)
+from .stats import get_dashboard_stats
+from .utils import QueryCounter, unique_slug_generator
+
+
+class CountingBackend(EmailBackend):
+    opened = 0
+
+    def open(self):
+        CountingBackend.opened += 1
+        return super().open()
+
+
+class FailingBackend(EmailBackend):
+    def send_messages(self, messages):
+        raise ConnectionError("SMTP server unavailable")
+
+
+class OutboxTestCase(TestCase):
+    def queue(self, count):
+        return queue_emails(
+            [
+                OutboxEmail(
+                    subject=f"Welcome {i}",
+                    body="Hello",
+                    from_email="admin@example.com",
+                    recipients=[f"student{i}@example.com"],
+                )
+                for i in range(count)
+            ]
+        )
+
+    def test_queued_email_waits_in_the_outbox(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            queue_html_email(
+                "Your account",
+                ["student@example.com"],
+                "accounts/email/new_student_account_confirmation.html",
+                {"user": None, "password": "secret"},
+            )
+        self.assertEqual(callbacks, [worker.wake])
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.status, OutboxEmail.PENDING)
+        self.assertIn("secret", email.html_body)
+        self.assertEqual(mail.outbox, [])
+
+    def test_batch_shares_one_connection(self):
+        self.queue(12)
+        CountingBackend.opened = 0
+        with self.settings(EMAIL_BACKEND="core.tests.CountingBackend"):
+            self.assertEqual(send_queued_emails(batch_size=5), 12)
+
+        self.assertEqual(CountingBackend.opened, 3)
+        self.assertEqual(len(mail.outbox), 12)
+        self.assertFalse(OutboxEmail.objects.exclude(status=OutboxEmail.SENT).exists())
+        self.assertEqual(send_queued_emails(), 0)
+
+    def test_html_alternative_is_sent(self):
+        queue_emails(
+            [
+                render_html_email(
+                    "Your account",
+                    ["lecturer@example.com"],
+                    "accounts/email/new_lecturer_account_confirmation.html",
+                    {"user": None, "password": "secret"},
+                )
+            ]
+        )
+        send_queued_emails()
+        message = mail.outbox[0]
+        self.assertEqual(message.to, ["lecturer@example.com"])
+        self.assertEqual(message.alternatives[0][1], "text/html")
+        self.assertIn("secret", message.alternatives[0][0])
+
+    def test_sent_emails_keep_no_body(self):
+        [email] = self.queue(1)
+        send_queued_emails()
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboxEmail.SENT)
+        self.assertEqual((email.body, email.html_body), ("", ""))
+
+        admin = User.objects.create_superuser(username="admin", password="pw")
+        self.client.force_login(admin)
+        with self.settings(
+            LANGUAGE_CODE="en",
+            STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage",
+        ):
+            response = self.client.get(
+                reverse("admin:core_outboxemail_change", args=[email.pk])
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("html_body", response.context["adminform"].form.fields)
+
+    def test_failed_email_is_retried_with_backoff(self):
+        [email] = self.queue(1)
+        with self.settings(EMAIL_BACKEND="core.tests.FailingBackend"):
+            self.assertEqual(send_queued_emails(), 0)
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboxEmail.PENDING)
+        self.assertEqual(email.attempts, 1)
+        self.assertIn("unavailable", email.last_error)
+        first_retry = email.next_attempt_at
+        self.assertGreater(first_retry, timezone.now())
+
+        # not due yet
+        self.assertEqual(send_queued_emails(), 0)
+
+        OutboxEmail.objects.update(next_attempt_at=timezone.now())
+        with self.settings(EMAIL_BACKEND="core.tests.FailingBackend"):
+            send_queued_emails()
+        email.refresh_from_db()
+        self.assertGreater(
+            email.next_attempt_at - timezone.now(), first_retry - email.created_at
+        )
+
+        OutboxEmail.objects.update(next_attempt_at=timezone.now())
+        send_queued_emails()
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboxEmail.SENT)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_email_fails_after_max_attempts(self):
+        [email] = self.queue(1)
+        with self.settings(EMAIL_BACKEND="core.tests.FailingBackend"):
+            for _ in range(EMAIL_OUTBOX_MAX_ATTEMPTS):
+                OutboxEmail.objects.update(next_attempt_at=timezone.now())
+                send_queued_emails()
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboxEmail.FAILED)
+        self.assertEqual(email.attempts, EMAIL_OUTBOX_MAX_ATTEMPTS)
+
+    def test_stale_claims_are_sent_again(self):
+        [email] = self.queue(1)
+        OutboxEmail.objects.update(
+            status=OutboxEmail.SENDING,
+            claimed_at=timezone.now() - timedelta(hours=1),
+        )
+        self.assertEqual(send_queued_emails(), 1)
+
+
+class AcademicPeriodTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.session = Session.objects.create(
+            session="2024/2025", is_current_session=True
+        )
+        self.semester = Semester.objects.create(
+            semester="First", is_current_semester=True, session=self.session
+        )
+
+    def test_period_is_cached(self):
+        with self.assertNumQueries(2):
+            period = get_academic_period()
+        self.assertEqual(period, (self.session, self.semester))
+        with self.assertNumQueries(0):
+            get_academic_period()
+
+    def test_period_is_invalidated_by_signals(self):
+        get_academic_period()
+        self.semester.is_current_semester = False
+        self.semester.save()
+        self.assertIsNone(get_academic_period().semester)
+
+        second = Semester.objects.create(
+            semester="Second", is_current_semester=True, session=self.session
+        )
+        self.assertEqual(get_academic_period().semester, second)
+
+        self.session.delete()
+        self.assertEqual(get_academic_period(), (None, None))
+
+    def test_semester_of_another_session(self):
+        # the current semester is looked up on its own, as before caching
+        self.session.is_current_session = False
+        self.session.save()
+        session = Session.objects.create(session="2025/2026", is_current_session=True)
+        period = get_academic_period()
+        self.assertEqual(period, (session, self.semester))
+        self.assertIsNone(period.session_semester)
+        self.assertEqual(
+            Semester.objects.filter(is_current_semester=True).first(), period.semester
+        )
+
+    def test_course_list_does_not_query_the_semester(self):
+        program = Program.objects.create(title="Computer Science")
+        courses = [
+            Course.objects.create(
+                title=f"Course {i}",
+                code=f"CS{i}",
+                credit=3,
+                program=program,
+                level="Bachelor",
+                semester="First" if i % 2 else "Second",
+            )
+            for i in range(10)
+        ]
+        get_academic_period()
+        with self.assertNumQueries(0):
+            current = [course.is_current_semester for course in courses]
+        self.assertEqual(current, [bool(i % 2) for i in range(10)])
+
+    def test_context_processor(self):
+        context = academic_period(RequestFactory().get("/"))
+        self.assertEqual(context["current_session"], self.session)
+        self.assertEqual(context["current_semester"], self.semester)
+
+
+@override_settings(
+    LANGUAGE_CODE="en",
+    STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage",
+)
+class DashboardStatsTestCase(TestCase):
+    def setUp(self):
+        program = Program.objects.create(title="Computer Science")
+        self.course = Course.objects.create(
+            title="Algorithms",
+            code="CS301",
+            credit=3,
+            program=program,
+            level="Bachelor",
+            semester="First",
+        )
+        for i, gender in enumerate("MMF"):
+            user = User.objects.create(username=f"s{i}", gender=gender)
+            student = Student.objects.create(
+                student=user, level="Bachelor", program=program
+            )
+            TakenCourse.objects.create(
+                student=student, course=self.course, final_exam=50 + i * 10
+            )
+        self.admin = User.objects.create_superuser(username="admin", password="pw")
+
+    def test_sections(self):
+        stats = get_dashboard_stats()
+        self.assertEqual(stats["people"]["superusers"], 1)
+        self.assertEqual(stats["people"]["males"], 2)
+        self.assertEqual(stats["people"]["females"], 1)
+        self.assertEqual(stats["people"]["levels"], {"Bachelor": 3})
+        self.assertEqual(
+            stats["courses"]["courses"],
+            [{"code": "CS301", "enrollments": 3, "average": 60.0}],
+        )
+        self.assertEqual(stats["resources"]["courses"], 1)
+
+    def test_served_from_snapshots(self):
+        get_dashboard_stats()
+        with self.assertNumQueries(1):
+            get_dashboard_stats()
+
+    def test_only_stale_sections_are_recomputed(self):
+        get_dashboard_stats()
+        Program.objects.create(title="History")
+        snapshots = StatisticsSnapshot.objects.filter(stale=True)
+        self.assertEqual(
+            set(snapshots.values_list("section", flat=True)),
+            {"resources", "courses"},
+        )
+        stats = get_dashboard_stats()
+        self.assertEqual(stats["resources"]["programs"], 2)
+        self.assertFalse(StatisticsSnapshot.objects.filter(stale=True).exists())
+
+    def test_logins_are_counted_per_role(self):
+        self.client.login(username="admin", password="pw")
+        self.client.logout()
+        self.client.login(username="admin", password="pw")
+        traffic = get_dashboard_stats()["traffic"]
+        self.assertEqual(list(traffic["roles"]), ["admin"])
+        self.assertEqual(traffic["roles"]["admin"], [2])
+
+    def test_logins_do_not_flag_people(self):
+        get_dashboard_stats()
+        self.client.login(username="admin", password="pw")
+        self.assertEqual(
+            list(
+                StatisticsSnapshot.objects.filter(stale=True).values_list(
+                    "section", flat=True
+                )
+            ),
+            ["traffic"],
+        )
+
+    def test_refresh_command(self):
+        get_dashboard_stats()
+        Program.objects.create(title="History")
+        out = io.StringIO()
+        call_command("refresh_dashboard_stats", "--section=resources", stdout=out)
+        self.assertEqual(out.getvalue(), "Refreshed resources.\n")
+        self.assertEqual(
+            StatisticsSnapshot.objects.get(section="resources").data["programs"], 2
+        )
+        self.assertTrue(StatisticsSnapshot.objects.get(section="courses").stale)
+
+        call_command("refresh_dashboard_stats", stdout=out)
+        self.assertFalse(StatisticsSnapshot.objects.filter(stale=True).exists())
+
+    def test_dashboard_view(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse("dashboard"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["student_count"], 0)
+        self.assertContains(response, 'id="dashboard-data"')
+
+
+class ActivityLogTestCase(TestCase):
+    def test_entries_are_written_together_on_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            program = Program.objects.create(title="Computer Science")
+            for i in range(5):
+                Course.objects.create(
+                    title=f"Course {i}",
+                    code=f"CS{i}",
+                    credit=3,
+                    program=program,
+                    level="Bachelor",
+                    semester="First",
+                )
+        with self.assertNumQueries(1):
+            with batched_activity():
+                for callback in callbacks:
+                    callback()
+        self.assertEqual(ActivityLog.objects.count(), 6)
+
+    def test_entries_are_stamped_when_logged(self):
+        before = timezone.now()
+        with self.captureOnCommitCallbacks() as callbacks:
+            log_activity("logged earlier")
+        after = timezone.now()
+        later = after + timedelta(minutes=5)
+        with mock.patch("django.utils.timezone.now", return_value=later):
+            for callback in callbacks:
+                callback()
+        created_at = ActivityLog.objects.get().created_at
+        self.assertTrue(before <= created_at <= after)
+
+    def test_rolled_back_entries_are_dropped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    log_activity("rolled back")
+                    raise ValueError
+            except ValueError:
+                pass
+            log_activity("kept")
+            try:
+                with transaction.atomic():
+                    log_activity("rolled back too")
+                    raise ValueError
+            except ValueError:
+                pass
+            with transaction.atomic():
+                log_activity("released")
+        self.assertEqual(
+            list(ActivityLog.objects.values_list("message", flat=True)),
+            ["kept", "released"],
+        )
+
+    def test_old_entries_are_pruned(self):
+        ActivityLog.objects.bulk_create([ActivityLog(message=str(i)) for i in range(3)])
+        ActivityLog.objects.filter(message__in=["0", "1"]).update(
+            created_at=timezone.now() - timedelta(days=100)
+        )
+        out = io.StringIO()
+        call_command("prune_activity_log", "--days=90", stdout=out)
+        self.assertIn("Deleted 2", out.getvalue())
+        self.assertEqual(
+            list(ActivityLog.objects.values_list("message", flat=True)), ["2"]
+        )
+
+    def test_pruned_entries_are_rolled_up_per_day(self):
+        old = timezone.now() - timedelta(days=100)
+        ActivityLog.objects.bulk_create([ActivityLog(message=str(i)) for i in range(5)])
+        ActivityLog.objects.filter(message__in=["0", "1"]).update(created_at=old)
+        ActivityLog.objects.filter(message="2").update(
+            created_at=old - timedelta(days=1)
+        )
+        with mock.patch("core.activity.ACTIVITY_LOG_PRUNE_BATCH_SIZE", 2):
+            self.assertEqual(prune_activity_log(days=90), 3)
+        ActivityLog.objects.filter(message="3").update(created_at=old)
+        self.assertEqual(prune_activity_log(days=90), 1)
+        self.assertEqual(
+            dict(ActivityRollup.objects.values_list("date", "entries")),
+            {
+                timezone.localdate(old): 3,
+                timezone.localdate(old - timedelta(days=1)): 1,
+            },
+        )
+
+
+class SlugTestCase(TestCase):
+    def setUp(self):
+        self.program = Program.objects.create(title="Computer Science")
+        self.codes = iter(range(1000))
+
+    def course(self, title, **kwargs):
+        return Course(
+            title=title,
+            code=f"CS{next(self.codes)}",
+            credit=3,
+            program=self.program,
+            level="Bachelor",
+            semester="First",
+            **kwargs,
+        )
+
+    def create_course(self, title):
+        course = self.course(title)
+        course.save()
+        return course.slug
+
+    def test_colliding_titles_are_numbered(self):
+        slugs = [self.create_course("Intro to CS") for _ in range(3)]
+        self.assertEqual(slugs, ["intro-to-cs", "intro-to-cs-2", "intro-to-cs-3"])
+
+    def test_bases_ending_with_a_digit(self):
+        slugs = [self.create_course(title) for title in ("Week 1", "Week 1", "Week")]
+        self.assertEqual(slugs, ["week-1", "week-1-2", "week"])
+        self.assertEqual(self.create_course("Physics 101"), "physics-101")
+        # "week-2" is free until the second "Week" takes it, and the other
+        # way around
+        self.assertEqual(self.create_course("Week 2"), "week-2")
+        self.assertEqual(self.create_course("Week"), "week-3")
+        self.assertEqual(self.create_course("Week 3"), "week-3-2")
+
+    def test_existing_slugs_are_skipped(self):
+        Course.objects.bulk_create(
+            [
+                self.course(slug, slug=slug)
+                for slug in ("intro", "intro-7", "intro-abcd", "introduction")
+            ]
+        )
+        self.assertEqual(self.create_course("Intro"), "intro-8")
+        self.assertEqual(self.create_course("Intro"), "intro-9")
+
+    def test_query_count_does_not_grow_with_the_collisions(self):
+        self.create_course("Intro")
+        with QueryCounter() as first:
+            unique_slug_generator(self.course("Intro"))
+        for _ in range(10):
+            self.create_course("Intro")
+        with QueryCounter() as last:
+            unique_slug_generator(self.course("Intro"))
+        self.assertEqual(first.count, last.count)
+
+    def test_long_titles_keep_room_for_the_number(self):
+        slugs = [self.create_course("x" * 60) for _ in range(2)]
+        self.assertEqual(slugs, ["x" * 44, "x" * 44 + "-2"])
+
+    def test_quiz_slugs(self):
+        course = self.course("Intro")
+        course.save()
+        quizzes = [Quiz.objects.create(course=course, title="Quiz") for _ in range(2)]
+        self.assertEqual([quiz.slug for quiz in quizzes], ["quiz", "quiz-2"])
+
+
+@override_settings(
+    LANGUAGE_CODE="en",
+    STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage",
+)
+class RequestMetricsTestCase(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username="admin", password="pw")
+        self.client.force_login(self.admin)
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=1, REQUEST_METRICS_SLOW_MS=None)
+    def test_sampled_request_is_recorded(self):
+        response = self.client.get(reverse("dashboard"))
+        metric = RequestMetric.objects.get()
+        self.assertEqual(metric.view, "core.views.dashboard_view")
+        self.assertEqual(metric.status_code, 200)
+        self.assertGreater(metric.query_count, 0)
+        self.assertGreater(metric.render_time, 0)
+        self.assertGreaterEqual(metric.duration, metric.db_time)
+        self.assertEqual(metric.response_size, len(response.content))
+        self.assertFalse(metric.slow)
+        self.assertEqual(metric.sql, [])
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=0, REQUEST_METRICS_SLOW_MS=0)
+    def test_slow_request_keeps_its_sql(self):
+        self.client.get(reverse("dashboard"))
+        metric = RequestMetric.objects.get()
+        self.assertTrue(metric.slow)
+        self.assertEqual(len(metric.sql), metric.query_count)
+        self.assertIn("SELECT", metric.sql[0]["sql"])
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=0, REQUEST_METRICS_SLOW_MS=None)
+    def test_unsampled_request_is_not_recorded(self):
+        self.client.get(reverse("dashboard"))
+        self.assertFalse(RequestMetric.objects.exists())
+
+    def test_summary(self):
+        RequestMetric.objects.bulk_create(
+            [
+                RequestMetric(
+                    view="quiz.views.QuizTake",
+                    method="GET",
+                    path="/quiz/",
+                    status_code=200,
+                    duration=duration,
+                    query_count=duration // 10,
+                    slow=duration >= 100,
+                )
+                for duration in range(1, 101)
+            ]
+        )
+        [row] = view_summary()
+        self.assertEqual(row["requests"], 100)
+        self.assertEqual(row["p50"], 50)
+        self.assertEqual(row["p95"], 95)
+        self.assertEqual(row["queries_p95"], 9)
+        self.assertEqual(row["slow"], 1)
+
+        response = self.client.get(reverse("admin:core_requestmetric_summary"))
+        self.assertContains(response, "quiz.views.QuizTake")
+
+
+class AssetsTestCase(SimpleTestCase):
+    def test_purge(self):
+        css = (
+            '@charset "UTF-8";/*! license */:root{--x:1}'
+            ".btn,.btn-unused{color:red}/* dropped */.card .unused{margin:0}"
+            ".btn:not(.unused)>a[href='a.b']{padding:0}"
+            "@media (min-width:1px){.unused{top:0}.btn{top:1px}}"
+            '@font-face{font-family:"X";src:url(x.woff2)}'
+        )
+        self.assertEqual(
+            purge(css, {"btn", "card"}, ("alert-",)),
+            "/*! license */:root{--x:1}.btn{color:red}"
+            ".btn:not(.unused)>a[href='a.b']{padding:0}"
+            "@media (min-width:1px){.btn{top:1px}}"
+            '@font-face{font-family:"X";src:url(x.woff2)}',
+        )
+        self.assertEqual(
+            purge(".alert-success{color:green}", set(), ("alert-",)),
+            ".alert-success{color:green}",
+        )
+
+    def test_build_assets(self):
+        output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output_dir)
+        report = build_assets(output_dir)
+        self.assertEqual(report[0][0], "dist/app.css")
+        with open(f"{output_dir}/app.css") as file:
+            css = file.read()
+        self.assertIn(".fa-trash-alt:before", css)
+        # spelled out here, this file would count as a use
+        self.assertNotIn(".fa-" + "dragon:before", css)
+        self.assertIn('src:url("fonts/fa-solid-900.woff2") format("woff2")', css)
+        self.assertNotIn(".ttf", css)
+        with open(f"{output_dir}/app.js") as file:
+            self.assertNotIn("sourceMappingURL", file.read())
+        for path, sizes, source_sizes in report:
+            self.assertLess(sizes[0], source_sizes[0] + 100, path)
+
+    @override_settings(
+        STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage"
+    )
+    def test_sources_are_linked_until_the_bundle_is_built(self):
+        html = Template('{% load assets %}{% asset_bundle "app.js" %}').render(
+            Context()
+        )
+        self.assertIn("vendor/jquery-3.7.1/jquery-3.7.1.min.js", html)
+        self.assertIn("js/main.js", html)
@@ -3,9 +3,9 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 
 from accounts.decorators import admin_required, lecturer_required
-from accounts.models import User, Student
 from .forms import SessionForm, SemesterForm, NewsAndEventsForm
 from .models import NewsAndEvents, ActivityLog, Session, Semester
+from .stats import get_dashboard_stats
 
 
 # ########################################################
@@ -25,13 +25,21 @@ def home_view(request):
 @admin_required
 def dashboard_view(request):
     logs = ActivityLog.objects.all().order_by("-created_at")[:10]
-    gender_count = Student.get_gender_count()
+    stats = get_dashboard_stats()
+    people = stats["people"]
     context = {
-        "student_count": User.objects.get_student_count(),
-        "lecturer_count": User.objects.get_lecturer_count(),
-        "superuser_count": User.objects.get_superuser_count(),
-        "males_count": gender_count["M"],
-        "females_count": gender_count["F"],
+        "student_count": people["students"],
+        "lecturer_count": people["lecturers"],
+        "superuser_count": people["superusers"],
+        "parent_count": people["parents"],
+        "males_count": people["males"],
+        "females_count": people["females"],
+        "resources": stats["resources"],
+        "chart_data": {
+            "levels": people["levels"],
+            "courses": stats["courses"]["courses"],
+            "traffic": stats["traffic"],
+        },
         "logs": logs,
     }
     return render(request, "core/dashboard.html", context)
@@ -0,0 +1,257 @@
+"""
+Chunked, resumable uploads of course files and videos.
+
+A multi-gigabyte recording sent in one multipart POST ties up a worker for
+minutes and has to start over after any interruption. Instead the browser
+(static/js/chunked_upload.js) sends the file in pieces:
+
+    POST   .../uploads/                   title, kind, filename and size,
+                                          returns the upload's state
+    PUT    .../uploads/<id>/?offset=N     the next chunk as the raw request
+                                          body, with its SHA-256 in the
+                                          X-Chunk-SHA256 header
+    GET    .../uploads/<id>/              the state, to resume from `offset`
+    POST   .../uploads/<id>/finalize/     creates the Upload or UploadVideo,
+                                          with the SHA-256 of the chunks'
+                                          hex digests in chunks_sha256
+    DELETE .../uploads/<id>/              abandons the upload
+
+Each chunk is streamed from the request to storage while its checksum is
+computed, and only counted once it matched. A chunk must start where the
+previous one ended, so a client that lost its connection asks for the state
+and sends again from `offset`. Finalizing streams the chunks in order into
+the model's file field, so no step holds a whole chunk, let alone the file,
+in memory. The browser cannot hash a large file without reading all of it
+into memory, so the file's checksum is combined from the chunks' digests
+(see combined_checksum) rather than computed over its bytes. Uploads left
+unfinished for CHUNKED_UPLOAD_EXPIRATION are removed
+by the `prune_chunked_uploads` management command.
+"""
+
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ChunkedUpload
+
+# largest chunk accepted, the client sends chunks of this size
+CHUNKED_UPLOAD_CHUNK_SIZE = getattr(
+    settings, "CHUNKED_UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024
+)
+CHUNKED_UPLOAD_MAX_SIZE = getattr(
+    settings, "CHUNKED_UPLOAD_MAX_SIZE", 8 * 1024 * 1024 * 1024
+)
+CHUNKED_UPLOAD_EXPIRATION = timedelta(days=1)
+CHUNKS_DIR = "chunked_uploads"
+READ_SIZE = 64 * 1024
+
+
+class ChunkedUploadError(Exception):
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+class HashingReader:
+    """Read-only file over the first `limit` bytes of `stream`, hashing them."""
+
+    def __init__(self, stream, limit):
+        self.stream = stream
+        self.limit = limit
+        # read by File.size
+        self.size = limit
+        self.count = 0
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = READ_SIZE
+        data = self.stream.read(min(size, self.limit - self.count))
+        self.count += len(data)
+        self.sha256.update(data)
+        return data
+
+
+class ChunksReader:
+    """
+    Read-only file over the stored chunks of an upload, in order. The hex
+    SHA-256 of each chunk read to its end is added to `digests`.
+    """
+
+    def __init__(self, storage, names):
+        self.storage = storage
+        self.names = list(names)
+        self.current = None
+        self.sha256 = None
+        self.digests = []
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = READ_SIZE
+        while True:
+            if self.current is None:
+                if not self.names:
+                    return b""
+                self.current = self.storage.open(self.names.pop(0), "rb")
+                self.sha256 = hashlib.sha256()
+            data = self.current.read(size)
+            if data:
+                self.sha256.update(data)
+                return data
+            self.current.close()
+            self.current = None
+            self.digests.append(self.sha256.hexdigest())
+
+    def close(self):
+        if self.current is not None:
+            self.current.close()
+
+
+def combined_checksum(digests):
+    """The checksum of a file sent in chunks, from their hex SHA-256s."""
+    return hashlib.sha256("".join(digests).encode()).hexdigest()
+
+
+def chunks_dir(upload_id):
+    return f"{CHUNKS_DIR}/{upload_id}"
+
+
+def chunk_name(upload, offset):
+    return f"{chunks_dir(upload.pk)}/{offset:015d}"
+
+
+def start_upload(user, course, kind, title, filename, size):
+    """Validate the announced file and create its ChunkedUpload."""
+    if kind not in dict(ChunkedUpload.KINDS):
+        raise ChunkedUploadError("Unknown upload kind.")
+    title = (title or "").strip()
+    if not title or len(title) > 100:
+        raise ChunkedUploadError("A title of at most 100 characters is required.")
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise ChunkedUploadError("The file size is required.")
+    if not 0 < size <= CHUNKED_UPLOAD_MAX_SIZE:
+        raise ChunkedUploadError("The file is empty or too large.", 413)
+
+    upload = ChunkedUpload(
+        user=user,
+        course=course,
+        kind=kind,
+        title=title,
+        filename=(filename or "").rsplit("/", 1)[-1].rsplit("\\", 1)[-1][:255],
+        size=size,
+    )
+    try:
+        # the extension validators of Upload.file / UploadVideo.video
+        upload.file_field.run_validators(File(None, name=upload.filename))
+    except ValidationError as error:
+        raise ChunkedUploadError(" ".join(error.messages))
+    upload.save()
+    return upload
+
+
+def append_chunk(upload, stream, offset, length, checksum=None):
+    """
+    Store `length` bytes read from `stream` as the chunk at `offset` and
+    return the new offset. `checksum` is the hex SHA-256 of the chunk.
+    """
+    if offset != upload.offset:
+        raise ChunkedUploadError(
+            "The chunk does not start at the current offset.", 409, upload.offset
+        )
+    if not 0 < length <= CHUNKED_UPLOAD_CHUNK_SIZE:
+        raise ChunkedUploadError("The chunk is empty or too large.", 413)
+    if offset + length > upload.size:
+        raise ChunkedUploadError("The chunk goes past the end of the file.")
+
+    reader = HashingReader(stream, length)
+    name = default_storage.save(chunk_name(upload, offset), File(reader))
+    error = None
+    if reader.count != length:
+        error = ChunkedUploadError("The chunk is incomplete.", offset=offset)
+    elif checksum and reader.sha256.hexdigest() != checksum.lower():
+        error = ChunkedUploadError("The chunk checksum does not match.", offset=offset)
+    # the conditional update loses against a concurrent copy of the chunk
+    elif not ChunkedUpload.objects.filter(pk=upload.pk, offset=offset).update(
+        offset=offset + length,
+        chunks=upload.chunks + [name],
+        updated_at=timezone.now(),
+    ):
+        upload.refresh_from_db(fields=["offset", "chunks"])
+        error = ChunkedUploadError(
+            "The chunk was already received.", 409, upload.offset
+        )
+    if error:
+        default_storage.delete(name)
+        raise error
+
+    upload.offset = offset + length
+    upload.chunks.append(name)
+    return upload.offset
+
+
+def delete_chunks(upload_id, names):
+    # every file of the directory, including the partial chunks of dropped
+    # connections that were never recorded
+    directory = chunks_dir(upload_id)
+    try:
+        files = default_storage.listdir(directory)[1]
+    except (FileNotFoundError, NotImplementedError):
+        files = [name.rsplit("/", 1)[1] for name in names]
+    for name in files:
+        default_storage.delete(f"{directory}/{name}")
+
+
+def discard_upload(upload):
+    delete_chunks(upload.pk, upload.chunks)
+    upload.delete()
+
+
+def finalize_upload(upload, checksum=None):
+    """
+    Assemble the chunks into the file of a new Upload or UploadVideo of the
+    course and return it. `checksum` is the combined_checksum of the chunks.
+    """
+    if upload.offset != upload.size:
+        raise ChunkedUploadError(
+            "The upload is not complete.", 409, offset=upload.offset
+        )
+    instance = upload.model(title=upload.title, course=upload.course)
+    field_file = getattr(instance, upload.file_field.name)
+    chunks = ChunksReader(default_storage, upload.chunks)
+    reader = HashingReader(chunks, upload.size)
+    try:
+        field_file.save(upload.filename, File(reader), save=False)
+    finally:
+        chunks.close()
+    if reader.count != upload.size or (
+        checksum and combined_checksum(chunks.digests) != checksum.lower()
+    ):
+        field_file.delete(save=False)
+        discard_upload(upload)
+        raise ChunkedUploadError("The file checksum does not match.")
+
+    upload_id = upload.pk
+    with transaction.atomic():
+        instance.save()
+        upload.delete()
+    delete_chunks(upload_id, upload.chunks)
+    return instance
+
+
+def prune_chunked_uploads(expiration=CHUNKED_UPLOAD_EXPIRATION):
+    """Discard the uploads untouched for `expiration`, return their number."""
+    stale = ChunkedUpload.objects.filter(updated_at__lt=timezone.now() - expiration)
+    count = 0
+    for upload in stale.iterator():
+        discard_upload(upload)
+        count += 1
+    return count
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from course.chunked import prune_chunked_uploads
+
+
+class Command(BaseCommand):
+    help = "Delete the chunked uploads abandoned before being finalized."
+
+    def handle(self, *args, **options):
+        pruned = prune_chunked_uploads()
+        self.stdout.write(f"Deleted {pruned} abandoned uploads.")
@@ -0,0 +1,38 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from course.models import VideoTranscode
+from course.transcoding import VIDEO_TRANSCODE_WORKERS, transcode_pending
+
+
+class Command(BaseCommand):
+    help = "Transcode the uploaded videos waiting for their renditions."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=VIDEO_TRANSCODE_WORKERS,
+            help="Number of videos transcoded in parallel.",
+        )
+        parser.add_argument(
+            "--retry-failed",
+            action="store_true",
+            help="Queue the failed jobs again first.",
+        )
+
+    def handle(self, *args, **options):
+        start = timezone.now()
+        if options["retry_failed"]:
+            VideoTranscode.objects.filter(status=VideoTranscode.FAILED).update(
+                status=VideoTranscode.PENDING, error=""
+            )
+        with ProcessPoolExecutor(max_workers=options["workers"]) as executor:
+            while transcode_pending(executor, options["workers"]):
+                pass
+        finished = VideoTranscode.objects.filter(finished_at__gte=start)
+        done = finished.filter(status=VideoTranscode.DONE).count()
+        failed = finished.filter(status=VideoTranscode.FAILED).count()
+        self.stdout.write(f"Transcoded {done} videos, {failed} failed.")
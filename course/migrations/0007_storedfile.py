@@ -0,0 +1,82 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:16
+
+import course.storage
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("course", "0006_chunkedupload"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StoredFile",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=255, unique=True)),
+                ("size", models.PositiveBigIntegerField()),
+                ("references", models.PositiveIntegerField(default=1)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name="upload",
+            name="file",
+            field=models.FileField(
+                help_text="Valid Files: pdf, docx, doc, xls, xlsx, ppt, pptx, zip, rar, 7zip",
+                storage=course.storage.ContentAddressedStorage(),
+                upload_to="course_files/",
+                validators=[
+                    django.core.validators.FileExtensionValidator(
+                        [
+                            "pdf",
+                            "docx",
+                            "doc",
+                            "xls",
+                            "xlsx",
+                            "ppt",
+                            "pptx",
+                            "zip",
+                            "rar",
+                            "7zip",
+                        ]
+                    )
+                ],
+            ),
+        ),
+        migrations.AlterField(
+            model_name="uploadvideo",
+            name="poster",
+            field=models.ImageField(
+                blank=True,
+                editable=False,
+                storage=course.storage.ContentAddressedStorage(),
+                upload_to="course_videos/posters/",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="uploadvideo",
+            name="video",
+            field=models.FileField(
+                help_text="Valid video formats: mp4, mkv, wmv, 3gp, f4v, avi, mp3",
+                storage=course.storage.ContentAddressedStorage(),
+                upload_to="course_videos/",
+                validators=[
+                    django.core.validators.FileExtensionValidator(
+                        ["mp4", "mkv", "wmv", "3gp", "f4v", "avi", "mp3"]
+                    )
+                ],
+            ),
+        ),
+    ]
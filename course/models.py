@@ -1,15 +1,20 @@
+import uuid
+
 from django.conf import settings
 from django.core.validators import FileExtensionValidator
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Q
 from django.db.models.signals import pre_save, post_delete, post_save
 from django.dispatch import receiver
 from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
 
-from core.models import ActivityLog, Semester
+from core.activity import log_activity
+from core.models import get_academic_period
 from core.utils import unique_slug_generator
 
+from .storage import content_storage
+
 
 class ProgramManager(models.Manager):
     def search(self, query=None):
@@ -36,12 +41,12 @@ class Program(models.Model):
 @receiver(post_save, sender=Program)
 def log_program_save(sender, instance, created, **kwargs):
     verb = "created" if created else "updated"
-    ActivityLog.objects.create(message=_(f"The program '{instance}' has been {verb}."))
+    log_activity(_(f"The program '{instance}' has been {verb}."))
 
 
 @receiver(post_delete, sender=Program)
 def log_program_delete(sender, instance, **kwargs):
-    ActivityLog.objects.create(message=_(f"The program '{instance}' has been deleted."))
+    log_activity(_(f"The program '{instance}' has been deleted."))
 
 
 class CourseManager(models.Manager):
@@ -80,8 +85,7 @@ class Course(models.Model):
 
     @property
     def is_current_semester(self):
-
-        current_semester = Semester.objects.filter(is_current_semester=True).first()
+        current_semester = get_academic_period().semester
         return self.semester == current_semester.semester if current_semester else False
 
 
@@ -94,12 +98,12 @@ def course_pre_save_receiver(sender, instance, **kwargs):
 @receiver(post_save, sender=Course)
 def log_course_save(sender, instance, created, **kwargs):
     verb = "created" if created else "updated"
-    ActivityLog.objects.create(message=_(f"The course '{instance}' has been {verb}."))
+    log_activity(_(f"The course '{instance}' has been {verb}."))
 
 
 @receiver(post_delete, sender=Course)
 def log_course_delete(sender, instance, **kwargs):
-    ActivityLog.objects.create(message=_(f"The course '{instance}' has been deleted."))
+    log_activity(_(f"The course '{instance}' has been deleted."))
 
 
 class CourseAllocation(models.Model):
@@ -120,11 +124,24 @@ class CourseAllocation(models.Model):
         return reverse("edit_allocated_course", kwargs={"pk": self.pk})
 
 
+class StoredFile(models.Model):
+    """A file of course.storage.ContentAddressedStorage and its references."""
+
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField()
+    references = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.references})"
+
+
 class Upload(models.Model):
     title = models.CharField(max_length=100)
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     file = models.FileField(
         upload_to="course_files/",
+        storage=content_storage,
         help_text=_(
             "Valid Files: pdf, docx, doc, xls, xlsx, ppt, pptx, zip, rar, 7zip"
         ),
@@ -151,6 +168,13 @@ class Upload(models.Model):
     def __str__(self):
         return f"{self.title}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # to release the replaced file in post_save
+        instance._loaded_file = instance.__dict__.get("file")
+        return instance
+
     def get_extension_short(self):
         ext = self.file.name.split(".")[-1].lower()
         if ext in ("doc", "docx"):
@@ -170,6 +194,21 @@ class Upload(models.Model):
         super().delete(*args, **kwargs)
 
 
+def release_replaced_file(field_file, loaded_name):
+    """Drop the reference to the file a save replaced, once committed."""
+    if loaded_name and loaded_name != field_file.name:
+        storage = field_file.storage
+        transaction.on_commit(lambda: storage.delete(loaded_name))
+
+
+@receiver(post_save, sender=Upload)
+def release_replaced_upload_file(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    release_replaced_file(instance.file, getattr(instance, "_loaded_file", None))
+    instance._loaded_file = instance.file.name
+
+
 @receiver(post_save, sender=Upload)
 def log_upload_save(sender, instance, created, **kwargs):
     if created:
@@ -180,13 +219,13 @@ def log_upload_save(sender, instance, created, **kwargs):
         message = _(
             f"The file '{instance.title}' of the course '{instance.course}' has been updated."
         )
-    ActivityLog.objects.create(message=message)
+    log_activity(message)
 
 
 @receiver(post_delete, sender=Upload)
 def log_upload_delete(sender, instance, **kwargs):
-    ActivityLog.objects.create(
-        message=_(
+    log_activity(
+        _(
             f"The file '{instance.title}' of the course '{instance.course}' has been deleted."
         )
     )
@@ -198,6 +237,7 @@ class UploadVideo(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     video = models.FileField(
         upload_to="course_videos/",
+        storage=content_storage,
         help_text=_("Valid video formats: mp4, mkv, wmv, 3gp, f4v, avi, mp3"),
         validators=[
             FileExtensionValidator(["mp4", "mkv", "wmv", "3gp", "f4v", "avi", "mp3"])
@@ -205,26 +245,169 @@ class UploadVideo(models.Model):
     )
     summary = models.TextField(blank=True)
     timestamp = models.DateTimeField(auto_now_add=True)
+    # filled in by course.transcoding
+    duration = models.FloatField(null=True, blank=True, editable=False)
+    poster = models.ImageField(
+        upload_to="course_videos/posters/",
+        storage=content_storage,
+        blank=True,
+        editable=False,
+    )
+    renditions = models.JSONField(default=list, blank=True, editable=False)
 
     def __str__(self):
         return f"{self.title}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # to tell in post_save whether the file changed
+        instance._loaded_video = instance.__dict__.get("video")
+        return instance
+
     def get_absolute_url(self):
         return reverse(
             "video_single", kwargs={"slug": self.course.slug, "video_slug": self.slug}
         )
 
+    def get_duration(self):
+        """The duration as h:mm:ss or m:ss, empty until known."""
+        if not self.duration:
+            return ""
+        minutes, seconds = divmod(round(self.duration), 60)
+        hours, minutes = divmod(minutes, 60)
+        if hours:
+            return f"{hours}:{minutes:02}:{seconds:02}"
+        return f"{minutes}:{seconds:02}"
+
+    def get_renditions(self):
+        """
+        The transcoded renditions of the current file, lightest first. Each
+        is a dict with the name, file, height, bitrate (bits/s) and size.
+        """
+        return sorted(
+            (
+                rendition
+                for rendition in self.renditions
+                if rendition.get("source") == self.video.name
+            ),
+            key=lambda rendition: rendition["bitrate"],
+        )
+
     def delete(self, *args, **kwargs):
+        storage = self.video.storage
+        for rendition in self.renditions:
+            storage.delete(rendition["file"])
+        if self.poster:
+            self.poster.delete(save=False)
         self.video.delete(save=False)
         super().delete(*args, **kwargs)
 
 
+class VideoTranscode(models.Model):
+    """
+    A transcoding job of an uploaded video, run by course.transcoding in a
+    pool of processes.
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    STATUS = (
+        (PENDING, _("Pending")),
+        (RUNNING, _("Running")),
+        (DONE, _("Done")),
+        (FAILED, _("Failed")),
+    )
+
+    video = models.ForeignKey(
+        UploadVideo, on_delete=models.CASCADE, related_name="transcodes"
+    )
+    # the file being transcoded, the video may be replaced in the meantime
+    source = models.CharField(max_length=255)
+    status = models.CharField(max_length=10, choices=STATUS, default=PENDING)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "created_at"])]
+
+    def __str__(self):
+        return f"{self.source} ({self.status})"
+
+
+class ChunkedUpload(models.Model):
+    """
+    A course file or video being uploaded in chunks by course.chunked. The
+    chunks are stored as they arrive and assembled into an Upload or
+    UploadVideo when the upload is finalized.
+    """
+
+    FILE = "file"
+    VIDEO = "video"
+
+    KINDS = (
+        (FILE, _("File")),
+        (VIDEO, _("Video")),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=5, choices=KINDS)
+    title = models.CharField(max_length=100)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    # bytes received so far, the offset the next chunk must start at
+    offset = models.PositiveBigIntegerField(default=0)
+    # storage names of the chunks received, in order
+    chunks = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
+
+    @property
+    def model(self):
+        return UploadVideo if self.kind == self.VIDEO else Upload
+
+    @property
+    def file_field(self):
+        return self.model._meta.get_field(
+            "video" if self.kind == self.VIDEO else "file"
+        )
+
+
 @receiver(pre_save, sender=UploadVideo)
 def video_pre_save_receiver(sender, instance, **kwargs):
     if not instance.slug:
         instance.slug = unique_slug_generator(instance)
 
 
+@receiver(post_save, sender=UploadVideo)
+def release_replaced_video_file(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    # queue_video_transcode updates _loaded_video
+    release_replaced_file(instance.video, getattr(instance, "_loaded_video", None))
+
+
+@receiver(post_save, sender=UploadVideo)
+def queue_video_transcode(sender, instance, created, raw=False, **kwargs):
+    if raw or not instance.video:
+        return
+    if created or instance.video.name != getattr(instance, "_loaded_video", None):
+        from .transcoding import queue_transcode
+
+        queue_transcode(instance)
+    instance._loaded_video = instance.video.name
+
+
 @receiver(post_save, sender=UploadVideo)
 def log_uploadvideo_save(sender, instance, created, **kwargs):
     if created:
@@ -235,13 +418,13 @@ def log_uploadvideo_save(sender, instance, created, **kwargs):
         message = _(
             f"The video '{instance.title}' of the course '{instance.course}' has been updated."
         )
-    ActivityLog.objects.create(message=message)
+    log_activity(message)
 
 
 @receiver(post_delete, sender=UploadVideo)
 def log_uploadvideo_delete(sender, instance, **kwargs):
-    ActivityLog.objects.create(
-        message=_(
+    log_activity(
+        _(
             f"The video '{instance.title}' of the course '{instance.course}' has been deleted."
         )
     )
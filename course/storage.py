@@ -0,0 +1,121 @@
+"""
+Content-addressed storage for course uploads.
+
+Lecturers upload the same handout to several courses and re-upload files
+they did not change, so course files and videos are stored under the
+SHA-256 of their content instead of their upload name:
+
+    course_files/9f/9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08.pdf
+
+The hash is computed while the upload is streamed to a temporary file next
+to its destination, and an identical file already stored is reused rather
+than written again. A StoredFile row counts the fields referencing each
+file, `delete` only removes the file with its last reference.
+
+References are counted in the transaction saving or deleting the model, so
+they roll back with it, and the file of the last reference is only removed
+once that transaction commits. Until then its row stays with no references:
+an upload of the same content in the meantime takes the row's lock, revives
+it and keeps the file.
+
+A stored file never changes, which lets the views serving it send
+long-lived cache headers (see course.streaming).
+"""
+
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+from functools import partial
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+INCOMING_DIR = ".incoming"
+CONTENT_NAME_RE = re.compile(r"(?:^|/)([0-9a-f]{2})/(\1[0-9a-f]{62})(?:\.[^/]*)?$")
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # the name only gives the directory and extension, see _save
+        return name
+
+    def content_hash(self, name):
+        """The SHA-256 a name was stored under, None for other files."""
+        match = CONTENT_NAME_RE.search(name or "")
+        return match.group(2) if match else None
+
+    def _save(self, name, content):
+        directory, filename = posixpath.split(name)
+        extension = posixpath.splitext(filename)[1].lower()
+        incoming = self.path(INCOMING_DIR)
+        os.makedirs(incoming, exist_ok=True)
+
+        sha256 = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=incoming)
+        try:
+            with os.fdopen(fd, "wb") as temp:
+                if hasattr(content, "seek"):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    sha256.update(chunk)
+                    size += len(chunk)
+                    temp.write(chunk)
+            digest = sha256.hexdigest()
+            name = posixpath.join(directory, digest[:2], digest + extension)
+            self._add_reference(name, size, temp_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return name
+
+    def _add_reference(self, name, size, temp_path):
+        StoredFile = apps.get_model("course", "StoredFile")
+        with transaction.atomic():
+            while not StoredFile.objects.filter(name=name).update(
+                references=F("references") + 1
+            ):
+                try:
+                    with transaction.atomic():
+                        StoredFile.objects.create(name=name, size=size)
+                    break
+                except IntegrityError:
+                    # stored concurrently, increment it like everyone else
+                    # (or create it again if it was deleted meanwhile)
+                    pass
+            path = self.path(name)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(temp_path, path)
+                if self.file_permissions_mode is not None:
+                    os.chmod(path, self.file_permissions_mode)
+
+    def delete(self, name):
+        if not name:
+            raise ValueError("The name must be given to delete().")
+        StoredFile = apps.get_model("course", "StoredFile")
+        if not StoredFile.objects.filter(name=name).exists():
+            # a file stored before deduplication
+            transaction.on_commit(partial(super().delete, name))
+            return
+        StoredFile.objects.filter(name=name, references__gt=0).update(
+            references=F("references") - 1
+        )
+        transaction.on_commit(partial(self._delete_unreferenced, name))
+
+    def _delete_unreferenced(self, name):
+        StoredFile = apps.get_model("course", "StoredFile")
+        with transaction.atomic():
+            stored = StoredFile.objects.select_for_update().filter(name=name).first()
+            if stored is not None and stored.references == 0:
+                stored.delete()
+                super().delete(name)
+
+
+content_storage = ContentAddressedStorage()
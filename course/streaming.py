@@ -0,0 +1,171 @@
+"""
+Byte-range responses for media files.
+
+Video players seek by requesting byte ranges. `ranged_file_response`
+answers a single `Range: bytes=...` request with 206 Partial Content read in
+chunks from storage, a missing or unusable range with the whole file as a
+FileResponse (which the WSGI server can hand to sendfile) and an
+unsatisfiable one with 416. ETag and Last-Modified make If-None-Match,
+If-Modified-Since and If-Range work.
+
+When the files sit behind a front-end server that can serve them itself,
+set MEDIA_ACCEL_REDIRECT_PREFIX (e.g. "/protected-media/", an internal
+nginx location aliasing MEDIA_ROOT): the view still checks access but only
+returns an X-Accel-Redirect header, and the front-end server handles ranges
+and copies the file without going through Python.
+
+Files of a content-addressed storage (see course.storage) never change
+under their name: they get their hash as ETag and may be cached for a year.
+"""
+
+import mimetypes
+import re
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import (
+    content_disposition_header,
+    http_date,
+    parse_http_date_safe,
+    quote_etag,
+)
+
+MEDIA_ACCEL_REDIRECT_PREFIX = getattr(settings, "MEDIA_ACCEL_REDIRECT_PREFIX", None)
+STREAM_CHUNK_SIZE = 64 * 1024
+STREAM_MAX_AGE = 60 * 60
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header, size):
+    """
+    Return the (first, last) byte positions, both included, asked for by a
+    Range header, or None when the whole file should be sent: no header, an
+    invalid one or several ranges. Raise RangeNotSatisfiable when the range
+    starts past the end of the file.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        # suffix range: the last `last` bytes
+        if int(last) == 0 or size == 0:
+            raise RangeNotSatisfiable
+        return max(size - int(last), 0), size - 1
+    first = int(first)
+    last = int(last) if last else None
+    if last is not None and last < first:
+        return None
+    if first >= size:
+        raise RangeNotSatisfiable
+    if last is None or last >= size:
+        last = size - 1
+    return first, last
+
+
+def if_range_matches(request, etag, last_modified):
+    """Whether a Range header still applies to the current file (If-Range)."""
+    validator = request.headers.get("If-Range")
+    if not validator:
+        return True
+    if validator.startswith(('"', "W/")):
+        return validator == etag
+    return (
+        last_modified is not None and parse_http_date_safe(validator) == last_modified
+    )
+
+
+def read_chunks(file, start, length, chunk_size=STREAM_CHUNK_SIZE):
+    try:
+        file.seek(start)
+        while length > 0:
+            data = file.read(min(chunk_size, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        file.close()
+
+
+def stored_hash(storage, name):
+    """The content hash of a file of a content-addressed storage, or None."""
+    content_hash = getattr(storage, "content_hash", None)
+    return content_hash(name) if content_hash else None
+
+
+def cache_headers(response, storage, name):
+    # authenticated content, browsers only
+    if stored_hash(storage, name):
+        response["Cache-Control"] = f"private, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    else:
+        response["Cache-Control"] = f"private, max-age={STREAM_MAX_AGE}"
+
+
+def file_response(request, storage, name, content_type):
+    """The whole file, the asked range of it, 304 or 416."""
+    size = storage.size(name)
+    try:
+        last_modified = int(storage.get_modified_time(name).timestamp())
+    except NotImplementedError:
+        last_modified = None
+    etag = quote_etag(stored_hash(storage, name) or f"{size:x}-{last_modified or 0:x}")
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        try:
+            byte_range = parse_range(request.headers.get("Range"), size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+        if byte_range and not if_range_matches(request, etag, last_modified):
+            byte_range = None
+
+        if byte_range is None:
+            response = FileResponse(storage.open(name, "rb"), content_type=content_type)
+        else:
+            first, last = byte_range
+            response = StreamingHttpResponse(
+                read_chunks(storage.open(name, "rb"), first, last - first + 1),
+                status=206,
+                content_type=content_type,
+            )
+            response["Content-Length"] = last - first + 1
+            response["Content-Range"] = f"bytes {first}-{last}/{size}"
+
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+def ranged_file_response(request, storage, name, content_type=None, filename=None):
+    """
+    Serve a stored file honouring Range and conditional request headers.
+    `filename` is the name a browser saving the file should give it.
+    """
+    content_type = content_type or (
+        mimetypes.guess_type(name)[0] or "application/octet-stream"
+    )
+    if MEDIA_ACCEL_REDIRECT_PREFIX:
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = MEDIA_ACCEL_REDIRECT_PREFIX + name
+    else:
+        response = file_response(request, storage, name, content_type)
+        if response.status_code == 416:
+            return response
+    if filename:
+        response["Content-Disposition"] = content_disposition_header(False, filename)
+    cache_headers(response, storage, name)
+    return response
@@ -1,3 +1,658 @@
-from django.test import TestCase
+import hashlib
+import io
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, IntegrityError, transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import Student, User
+from core.models import Semester, Session
+from core.utils import QueryCounter
+from result.models import GradeLedger, TakenCourse
+from result.utils import register_courses
+from . import transcoding
+from .chunked import CHUNKS_DIR, combined_checksum
+from .models import (
+    ChunkedUpload,
+    Course,
+    Program,
+    StoredFile,
+    Upload,
+    UploadVideo,
+    VideoTranscode,
+)
+from .streaming import RangeNotSatisfiable, parse_range
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(
+    LANGUAGE_CODE="en",
+    STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage",
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+)
+class CourseRegistrationTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        session = Session.objects.create(session="2024/2025", is_current_session=True)
+        Semester.objects.create(
+            semester="First", is_current_semester=True, session=session
+        )
+        program = Program.objects.create(title="Computer Science")
+        self.courses = [
+            Course.objects.create(
+                title=f"Course {i}",
+                code=f"CS{i}",
+                credit=i + 1,
+                program=program,
+                level="Bachelor",
+                semester="First",
+                year=1,
+            )
+            for i in range(6)
+        ]
+        user = User.objects.create(username="student", is_student=True)
+        self.student = Student.objects.create(
+            student=user, level="Bachelor", program=program
+        )
+        self.client.force_login(user)
+        self.url = reverse("course_registration")
+
+    def register(self, *courses):
+        return self.client.post(
+            self.url, {str(course.pk): course.credit for course in courses}
+        )
+
+    def test_registration_page(self):
+        TakenCourse.objects.create(student=self.student, course=self.courses[0])
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["courses"]), 5)
+        self.assertEqual(response.context["registered_courses"], [self.courses[0]])
+        self.assertEqual(response.context["total_first_semester_credit"], 20)
+        self.assertEqual(response.context["total_registered_credit"], 1)
+        self.assertFalse(response.context["no_course_is_registered"])
+        self.assertFalse(response.context["all_courses_are_registered"])
+
+    def test_query_count_does_not_grow_with_the_courses(self):
+        self.register(self.courses[0])
+        self.client.get(self.url)
+        with self.assertNumQueries(6):
+            self.client.get(self.url)
+        self.register(*self.courses[1:])
+        with self.assertNumQueries(6):
+            self.client.get(self.url)
+
+    def test_courses_are_registered_in_bulk(self):
+        self.register(self.courses[0])
+        with self.assertNumQueries(12):
+            response = self.register(*self.courses)
+        self.assertRedirects(response, self.url, fetch_redirect_response=False)
+        self.assertEqual(TakenCourse.objects.filter(student=self.student).count(), 6)
+        ledger = GradeLedger.objects.get(student=self.student)
+        self.assertEqual(ledger.credits, sum(course.credit for course in self.courses))
+
+        messages = [str(m) for m in response.wsgi_request._messages]
+        self.assertIn("Already registered: CS0", messages)
+
+    def drop(self, *courses):
+        return self.client.post(
+            reverse("course_drop"),
+            {"course_ids": [course.pk for course in courses] + ["x"]},
+        )
+
+    def test_query_count_does_not_grow_with_the_dropped_courses(self):
+        self.register(*self.courses)
+        with QueryCounter() as one:
+            self.drop(self.courses[0])
+        with QueryCounter() as several:
+            self.drop(*self.courses[1:])
+        self.assertEqual(one.count, several.count)
+        self.assertFalse(TakenCourse.objects.filter(student=self.student).exists())
+
+    def test_selected_courses_are_dropped(self):
+        self.register(*self.courses)
+        with self.assertNumQueries(10):
+            response = self.drop(self.courses[0], self.courses[1])
+        self.assertRedirects(response, self.url, fetch_redirect_response=False)
+        self.assertEqual(TakenCourse.objects.filter(student=self.student).count(), 4)
+        ledger = GradeLedger.objects.get(student=self.student)
+        self.assertEqual(ledger.credits, 21 - 1 - 2)
+
+        messages = [str(m) for m in response.wsgi_request._messages]
+        self.assertIn("2 course(s) dropped successfully!", messages)
+
+
+@override_settings(
+    LANGUAGE_CODE="en",
+    STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage",
+    MEDIA_ROOT=MEDIA_ROOT,
+)
+class VideoStreamTestCase(TestCase):
+    content = bytes(range(256)) * 4
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        program = Program.objects.create(title="Computer Science")
+        other_program = Program.objects.create(title="Physics")
+        self.course = Course.objects.create(
+            title="Physics 101",
+            code="PHY101",
+            credit=3,
+            program=other_program,
+            level="Bachelor",
+            semester="First",
+        )
+        self.video = UploadVideo.objects.create(
+            title="Lecture 1",
+            course=self.course,
+            video=SimpleUploadedFile("lecture.mp4", self.content),
+        )
+        user = User.objects.create(username="student", is_student=True)
+        self.student = Student.objects.create(
+            student=user, level="Bachelor", program=program
+        )
+        self.client.force_login(user)
+        self.url = reverse(
+            "video_stream",
+            kwargs={"slug": self.course.slug, "video_slug": self.video.slug},
+        )
+
+    def get(self, **headers):
+        response = self.client.get(self.url, headers=headers)
+        if response.streaming:
+            response.body = b"".join(response.streaming_content)
+        return response
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range("bytes=0-99", 1000), (0, 99))
+        self.assertEqual(parse_range("bytes=900-", 1000), (900, 999))
+        self.assertEqual(parse_range("bytes=-100", 1000), (900, 999))
+        self.assertEqual(parse_range("bytes=0-5000", 1000), (0, 999))
+        self.assertIsNone(parse_range(None, 1000))
+        self.assertIsNone(parse_range("bytes=0-1,5-6", 1000))
+        self.assertIsNone(parse_range("bytes=9-1", 1000))
+        with self.assertRaises(RangeNotSatisfiable):
+            parse_range("bytes=1000-", 1000)
+
+    def test_students_of_other_programs_are_denied_until_they_register(self):
+        self.assertEqual(self.get().status_code, 403)
+        register_courses(self.student, [self.course.pk])
+        self.assertEqual(self.get().status_code, 200)
+
+    def test_whole_file(self):
+        register_courses(self.student, [self.course.pk])
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.body, self.content)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(response["Content-Type"], "video/mp4")
+        self.assertEqual(response["Content-Length"], "1024")
+
+    def test_ranges(self):
+        register_courses(self.student, [self.course.pk])
+        response = self.get(range="bytes=100-199")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.body, self.content[100:200])
+        self.assertEqual(response["Content-Range"], "bytes 100-199/1024")
+        self.assertEqual(response["Content-Length"], "100")
+
+        response = self.get(range="bytes=-24")
+        self.assertEqual(response.body, self.content[1000:])
+
+        response = self.get(range="bytes=2000-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */1024")
+
+    def test_conditional_requests(self):
+        register_courses(self.student, [self.course.pk])
+        etag = self.get()["ETag"]
+        self.assertEqual(self.get(if_none_match=etag).status_code, 304)
+        response = self.get(range="bytes=0-9", if_range=etag)
+        self.assertEqual(response.status_code, 206)
+        response = self.get(range="bytes=0-9", if_range='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.body, self.content)
+
+    def test_access_is_cached_between_chunks(self):
+        register_courses(self.student, [self.course.pk])
+        self.get(range="bytes=0-9")
+        # session, user and video
+        with self.assertNumQueries(3):
+            self.get(range="bytes=10-19")
+
+
+@override_settings(
+    LANGUAGE_CODE="en",
+    STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage",
+    MEDIA_ROOT=MEDIA_ROOT,
+)
+class VideoTranscodeTestCase(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.course = Course.objects.create(
+            title="Physics 101",
+            code="PHY101",
+            credit=3,
+            program=Program.objects.create(title="Physics"),
+            level="Bachelor",
+            semester="First",
+        )
+        self.client.force_login(
+            User.objects.create(username="lecturer", is_lecturer=True)
+        )
+
+    def upload(self, content=b"not a video", name="lecture.avi"):
+        with self.captureOnCommitCallbacks() as callbacks:
+            video = UploadVideo.objects.create(
+                title="Lecture 1",
+                course=self.course,
+                video=SimpleUploadedFile(name, content),
+            )
+        self.assertIn(transcoding.worker.wake, callbacks)
+        return video
+
+    def transcode(self):
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            return transcoding.transcode_pending(executor)
+
+    def test_a_job_is_queued_when_the_file_changes(self):
+        video = self.upload()
+        job = VideoTranscode.objects.get()
+        self.assertEqual(job.status, VideoTranscode.PENDING)
+        self.assertEqual(job.source, video.video.name)
+
+        video = UploadVideo.objects.get(pk=video.pk)
+        video.title = "Renamed"
+        video.save()
+        self.assertEqual(VideoTranscode.objects.count(), 1)
+
+        video.video = SimpleUploadedFile("other.avi", b"still not a video")
+        video.save()
+        self.assertEqual(VideoTranscode.objects.count(), 2)
+        # only the job of the current file runs
+        self.assertEqual(len(transcoding.claim_jobs()), 1)
+        self.assertEqual(
+            VideoTranscode.objects.get(pk=job.pk).status, VideoTranscode.DONE
+        )
+
+    def test_unreadable_videos_fail(self):
+        video = self.upload()
+        with self.assertLogs("course.transcoding", "WARNING"):
+            self.assertEqual(self.transcode(), 1)
+        job = VideoTranscode.objects.get()
+        self.assertEqual(job.status, VideoTranscode.FAILED)
+        self.assertTrue(job.error)
+        self.assertIsNotNone(job.finished_at)
+        video.refresh_from_db()
+        self.assertEqual(video.renditions, [])
+        self.assertEqual(self.transcode(), 0)
+
+    def test_lightest_rendition_first(self):
+        video = self.upload()
+        storage = video.video.storage
+        video.renditions = [
+            {
+                "name": name,
+                "file": storage.save(
+                    f"renditions/{name}.mp4", SimpleUploadedFile(name, name.encode())
+                ),
+                "height": height,
+                "bitrate": bitrate,
+                "size": len(name),
+                "source": source,
+            }
+            for name, height, bitrate, source in (
+                ("720p", 720, 2_628_000, video.video.name),
+                ("360p", 360, 796_000, video.video.name),
+                ("old", 360, 100, "course_videos/old.avi"),
+            )
+        ]
+        video.duration = 3725.4
+        video.save()
+
+        response = self.client.get(video.get_absolute_url())
+        self.assertEqual(
+            [rendition["name"] for rendition in response.context["renditions"]],
+            ["360p", "720p"],
+        )
+        self.assertContains(response, "1:02:05")
+        url = reverse(
+            "video_rendition_stream",
+            kwargs={
+                "slug": self.course.slug,
+                "video_slug": video.slug,
+                "rendition": "360p",
+            },
+        )
+        self.assertContains(response, url)
+        response = self.client.get(url)
+        self.assertEqual(b"".join(response.streaming_content), b"360p")
+        self.assertEqual(response["Content-Type"], "video/mp4")
+
+    @skipUnless(shutil.which("ffmpeg") and shutil.which("ffprobe"), "needs ffmpeg")
+    def test_transcode(self):
+        source = f"{MEDIA_ROOT}/source.avi"
+        subprocess.run(
+            [
+                "ffmpeg",
+                "-v",
+                "error",
+                "-y",
+                "-f",
+                "lavfi",
+                "-i",
+                "testsrc=duration=2:size=320x240:rate=25",
+                source,
+            ],
+            check=True,
+        )
+        with open(source, "rb") as file:
+            video = self.upload(file.read())
+        self.assertEqual(self.transcode(), 1)
+        self.assertEqual(VideoTranscode.objects.get().status, VideoTranscode.DONE)
+
+        video.refresh_from_db()
+        self.assertAlmostEqual(video.duration, 2, places=0)
+        self.assertTrue(video.poster)
+        # not upscaled past the source
+        renditions = video.get_renditions()
+        self.assertEqual([rendition["height"] for rendition in renditions], [240])
+        self.assertTrue(video.video.storage.exists(renditions[0]["file"]))
+
+
+@override_settings(
+    LANGUAGE_CODE="en",
+    STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage",
+    MEDIA_ROOT=MEDIA_ROOT,
+)
+class ChunkedUploadTestCase(TestCase):
+    content = bytes(range(256)) * 40
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.course = Course.objects.create(
+            title="Physics 101",
+            code="PHY101",
+            credit=3,
+            program=Program.objects.create(title="Physics"),
+            level="Bachelor",
+            semester="First",
+        )
+        self.lecturer = User.objects.create(username="lecturer", is_lecturer=True)
+        self.client.force_login(self.lecturer)
+
+    def start(self, filename="slides.pdf", kind="file", size=None):
+        return self.client.post(
+            reverse("chunked_upload_start", kwargs={"slug": self.course.slug}),
+            {
+                "kind": kind,
+                "title": "Slides",
+                "filename": filename,
+                "size": len(self.content) if size is None else size,
+            },
+        )
+
+    def put(self, state, offset, chunk, checksum=None):
+        return self.client.put(
+            f"{state['url']}?offset={offset}",
+            chunk,
+            content_type="application/octet-stream",
+            headers={"X-Chunk-SHA256": checksum or hashlib.sha256(chunk).hexdigest()},
+        )
+
+    def upload_chunks(self, state, chunk_size=4000):
+        for offset in range(0, len(self.content), chunk_size):
+            response = self.put(
+                state, offset, self.content[offset : offset + chunk_size]
+            )
+            self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def finalize(self, state, checksum=None, chunk_size=4000):
+        if checksum is None:
+            checksum = combined_checksum(
+                hashlib.sha256(self.content[offset : offset + chunk_size]).hexdigest()
+                for offset in range(0, len(self.content), chunk_size)
+            )
+        return self.client.post(state["finalize_url"], {"chunks_sha256": checksum})
+
+    def chunk_files(self, state):
+        directory = f"{CHUNKS_DIR}/{state['id']}"
+        if not default_storage.exists(directory):
+            return []
+        return default_storage.listdir(directory)[1]
+
+    def test_upload_in_chunks(self):
+        response = self.start()
+        self.assertEqual(response.status_code, 201)
+        state = response.json()
+        self.assertEqual(state["offset"], 0)
+
+        self.assertEqual(self.upload_chunks(state)["offset"], len(self.content))
+        self.assertEqual(len(self.chunk_files(state)), 3)
+        response = self.finalize(state)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            response.json()["redirect"],
+            reverse("course_detail", kwargs={"slug": self.course.slug}),
+        )
+
+        upload = Upload.objects.get()
+        self.assertEqual(upload.course, self.course)
+        self.assertEqual(upload.title, "Slides")
+        self.assertTrue(upload.file.name.endswith(".pdf"))
+        with upload.file.open("rb") as file:
+            self.assertEqual(file.read(), self.content)
+        self.assertFalse(ChunkedUpload.objects.exists())
+        self.assertEqual(self.chunk_files(state), [])
+
+    def test_resume_from_the_server_offset(self):
+        state = self.start().json()
+        self.assertEqual(self.put(state, 0, self.content[:4000]).status_code, 200)
+        # the same chunk again, as after a lost response
+        response = self.put(state, 0, self.content[:4000])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["offset"], 4000)
+
+        state = self.client.get(state["url"]).json()
+        self.assertEqual(state["offset"], 4000)
+        self.put(state, 4000, self.content[4000:8000])
+        self.put(state, 8000, self.content[8000:])
+        self.assertEqual(self.finalize(state).status_code, 201)
+        with Upload.objects.get().file.open("rb") as file:
+            self.assertEqual(file.read(), self.content)
+
+    def test_corrupted_chunks_are_rejected(self):
+        state = self.start().json()
+        response = self.put(state, 0, self.content[:4000], checksum="0" * 64)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(ChunkedUpload.objects.get().offset, 0)
+        self.assertEqual(self.chunk_files(state), [])
+
+        self.upload_chunks(state)
+        response = self.finalize(
+            state, checksum=hashlib.sha256(self.content).hexdigest()
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Upload.objects.exists())
+        self.assertFalse(ChunkedUpload.objects.exists())
+
+    def test_incomplete_uploads_cannot_be_finalized(self):
+        state = self.start().json()
+        self.put(state, 0, self.content[:4000])
+        response = self.finalize(state)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["offset"], 4000)
+
+    def test_invalid_uploads_are_refused(self):
+        self.assertEqual(self.start("script.exe").status_code, 400)
+        self.assertEqual(self.start("lecture.pdf", kind="video").status_code, 400)
+        self.assertEqual(self.start(size=0).status_code, 413)
+        self.assertFalse(ChunkedUpload.objects.exists())
+
+    def test_video_upload(self):
+        state = self.start("lecture.mp4", kind="video").json()
+        self.upload_chunks(state)
+        with self.captureOnCommitCallbacks():
+            self.assertEqual(self.finalize(state).status_code, 201)
+        video = UploadVideo.objects.get()
+        self.assertEqual(VideoTranscode.objects.get().source, video.video.name)
+
+    def test_abandoned_uploads_are_pruned(self):
+        state = self.start().json()
+        self.put(state, 0, self.content[:4000])
+        self.start()
+        ChunkedUpload.objects.filter(pk=state["id"]).update(
+            updated_at=timezone.now() - timedelta(days=2)
+        )
+        out = io.StringIO()
+        call_command("prune_chunked_uploads", stdout=out)
+        self.assertIn("Deleted 1 abandoned uploads.", out.getvalue())
+        self.assertEqual(ChunkedUpload.objects.count(), 1)
+        self.assertEqual(self.chunk_files(state), [])
+
+
+@override_settings(
+    LANGUAGE_CODE="en",
+    STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage",
+    MEDIA_ROOT=MEDIA_ROOT,
+)
+class ContentAddressedStorageTestCase(TestCase):
+    content = b"%PDF-1.4 lecture notes"
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.course = Course.objects.create(
+            title="Physics 101",
+            code="PHY101",
+            credit=3,
+            program=Program.objects.create(title="Physics"),
+            level="Bachelor",
+            semester="First",
+        )
+
+    def upload(self, content=None, name="notes.PDF"):
+        return Upload.objects.create(
+            title="Lecture notes",
+            course=self.course,
+            file=SimpleUploadedFile(name, content or self.content),
+        )
+
+    def test_identical_files_are_stored_once(self):
+        first = self.upload()
+        second = self.upload(name="copy.pdf")
+        digest = hashlib.sha256(self.content).hexdigest()
+        self.assertEqual(first.file.name, f"course_files/{digest[:2]}/{digest}.pdf")
+        self.assertEqual(second.file.name, first.file.name)
+        stored = StoredFile.objects.get()
+        self.assertEqual((stored.references, stored.size), (2, len(self.content)))
+
+        storage, name = first.file.storage, first.file.name
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(storage.exists(name))
+        self.assertEqual(StoredFile.objects.get().references, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(storage.exists(name))
+        self.assertFalse(StoredFile.objects.exists())
+
+    def test_files_are_removed_once_the_delete_commits(self):
+        upload = self.upload()
+        storage, name = upload.file.storage, upload.file.name
+        try:
+            with transaction.atomic():
+                upload.delete()
+                raise DatabaseError
+        except DatabaseError:
+            pass
+        self.assertTrue(storage.exists(name))
+        self.assertEqual(StoredFile.objects.get().references, 1)
+
+        # the file is stored again before the delete committed
+        with self.captureOnCommitCallbacks() as callbacks:
+            Upload.objects.get().delete()
+        self.assertEqual(StoredFile.objects.get().references, 0)
+        self.upload()
+        for callback in callbacks:
+            callback()
+        self.assertTrue(storage.exists(name))
+        self.assertEqual(StoredFile.objects.get().references, 1)
+
+    def test_rows_deleted_concurrently_are_created_again(self):
+        create = StoredFile.objects.create
+
+        def create_concurrently(**kwargs):
+            # another upload created the row first, then it was deleted
+            if not calls:
+                calls.append(kwargs)
+                raise IntegrityError
+            return create(**kwargs)
+
+        calls = []
+        with mock.patch.object(
+            StoredFile.objects, "create", side_effect=create_concurrently
+        ):
+            upload = self.upload()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(StoredFile.objects.get().name, upload.file.name)
+        self.assertTrue(upload.file.storage.exists(upload.file.name))
+
+    def test_replaced_files_are_released(self):
+        upload = Upload.objects.get(pk=self.upload().pk)
+        old_name = upload.file.name
+        upload.file = SimpleUploadedFile("notes.pdf", b"%PDF-1.4 second edition")
+        with self.captureOnCommitCallbacks(execute=True):
+            upload.save()
+        self.assertFalse(upload.file.storage.exists(old_name))
+        self.assertEqual(StoredFile.objects.get().name, upload.file.name)
+
+    def test_download(self):
+        upload = self.upload()
+        self.client.force_login(
+            User.objects.create(username="lecturer", is_lecturer=True)
+        )
+        response = self.client.get(
+            reverse(
+                "upload_file_download",
+                kwargs={"slug": self.course.slug, "file_id": upload.pk},
+            )
+        )
+        self.assertEqual(b"".join(response.streaming_content), self.content)
+        self.assertEqual(
+            response["Content-Disposition"], 'inline; filename="lecture-notes.pdf"'
+        )
+        self.assertEqual(
+            response["ETag"], f'"{hashlib.sha256(self.content).hexdigest()}"'
+        )
+        self.assertIn("immutable", response["Cache-Control"])
@@ -0,0 +1,366 @@
+"""
+Video transcoding.
+
+Lecturers upload whatever their camera or screen recorder produced (wmv,
+avi, 3gp, mkv...), often at a bitrate far above what students need. When an
+UploadVideo is created or its file replaced, a VideoTranscode job is queued
+and a background worker runs it in a pool of processes with the local
+ffmpeg: one H.264/AAC MP4 per VIDEO_RENDITIONS entry no taller than the
+source, a poster frame and the duration. The results are stored next to
+the video and recorded on the UploadVideo; the video page offers the
+lightest rendition first.
+
+The pool processes only run ffmpeg on local files and return what they
+produced, every database access stays in the worker thread. Jobs left
+pending or running when a process stopped are picked up by the next worker
+or by the `transcode_videos` management command.
+"""
+
+import json
+import logging
+import os
+import posixpath
+import shutil
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import UploadVideo, VideoTranscode
+
+logger = logging.getLogger(__name__)
+
+FFMPEG_BINARY = getattr(settings, "FFMPEG_BINARY", "ffmpeg")
+FFPROBE_BINARY = getattr(settings, "FFPROBE_BINARY", "ffprobe")
+# (name, height, video bitrate, audio bitrate), in bits per second
+VIDEO_RENDITIONS = getattr(
+    settings,
+    "VIDEO_RENDITIONS",
+    (
+        ("360p", 360, 700_000, 96_000),
+        ("720p", 720, 2_500_000, 128_000),
+    ),
+)
+VIDEO_TRANSCODE_WORKERS = getattr(settings, "VIDEO_TRANSCODE_WORKERS", 2)
+# seconds an ffmpeg run may take
+VIDEO_TRANSCODE_TIMEOUT = getattr(settings, "VIDEO_TRANSCODE_TIMEOUT", 60 * 60)
+# jobs running longer than this were lost with their process and run again
+VIDEO_TRANSCODE_CLAIM_TIMEOUT = timedelta(hours=3)
+RENDITIONS_DIR = "course_videos/renditions"
+POSTER_HEIGHT = 360
+
+
+def queue_transcode(video):
+    """Queue a job for the current file of the video."""
+    VideoTranscode.objects.create(video=video, source=video.video.name)
+    transaction.on_commit(worker.wake)
+
+
+# ########################################################
+# Run in the pool processes, no database access
+# ########################################################
+
+
+def run(command):
+    try:
+        return subprocess.run(
+            command,
+            check=True,
+            capture_output=True,
+            timeout=VIDEO_TRANSCODE_TIMEOUT,
+        ).stdout
+    except subprocess.CalledProcessError as error:
+        message = error.stderr.decode(errors="replace").strip()[-2000:]
+        raise RuntimeError(f"{command[0]} failed: {message}") from error
+
+
+def probe(path):
+    """Return the duration (seconds) and the video height of a media file."""
+    output = run(
+        [
+            FFPROBE_BINARY,
+            "-v",
+            "error",
+            "-print_format",
+            "json",
+            "-show_format",
+            "-show_streams",
+            path,
+        ]
+    )
+    info = json.loads(output)
+    duration = float(info.get("format", {}).get("duration") or 0) or None
+    heights = [
+        int(stream["height"])
+        for stream in info.get("streams", [])
+        if stream.get("codec_type") == "video" and stream.get("height")
+    ]
+    return duration, max(heights, default=None)
+
+
+def rendition_command(source, output, height, video_bitrate, audio_bitrate):
+    return [
+        FFMPEG_BINARY,
+        "-v",
+        "error",
+        "-y",
+        "-i",
+        source,
+        "-map",
+        "0:v:0",
+        "-map",
+        "0:a:0?",
+        "-vf",
+        f"scale=-2:{height}",
+        "-c:v",
+        "libx264",
+        "-preset",
+        "veryfast",
+        "-profile:v",
+        "main",
+        "-pix_fmt",
+        "yuv420p",
+        "-b:v",
+        str(video_bitrate),
+        "-maxrate",
+        str(video_bitrate * 3 // 2),
+        "-bufsize",
+        str(video_bitrate * 2),
+        "-c:a",
+        "aac",
+        "-b:a",
+        str(audio_bitrate),
+        "-ac",
+        "2",
+        # moov atom first, so playback starts before the download ends
+        "-movflags",
+        "+faststart",
+        output,
+    ]
+
+
+def poster_command(source, output, position):
+    return [
+        FFMPEG_BINARY,
+        "-v",
+        "error",
+        "-y",
+        "-ss",
+        f"{position:.2f}",
+        "-i",
+        source,
+        "-frames:v",
+        "1",
+        "-vf",
+        f"scale=-2:{POSTER_HEIGHT}",
+        output,
+    ]
+
+
+def transcode(source, output_dir, renditions=VIDEO_RENDITIONS):
+    """
+    Transcode the file at `source` into `output_dir` and return the duration,
+    the poster path (None for audio files) and the produced renditions.
+    Renditions taller than the source are skipped, except the smallest one.
+    """
+    duration, source_height = probe(source)
+    result = {"duration": duration, "poster": None, "renditions": []}
+    if source_height is None:
+        return result
+
+    renditions = sorted(renditions, key=lambda rendition: rendition[1])
+    for i, (name, height, video_bitrate, audio_bitrate) in enumerate(renditions):
+        if i and height > source_height:
+            break
+        height = min(height, source_height)
+        output = os.path.join(output_dir, f"{name}.mp4")
+        run(rendition_command(source, output, height, video_bitrate, audio_bitrate))
+        result["renditions"].append(
+            {
+                "name": name,
+                "path": output,
+                "height": height,
+                "bitrate": video_bitrate + audio_bitrate,
+                "size": os.path.getsize(output),
+            }
+        )
+
+    poster = os.path.join(output_dir, "poster.jpg")
+    run(poster_command(source, poster, min((duration or 0) / 10, 5)))
+    result["poster"] = poster
+    return result
+
+
+# ########################################################
+# Job handling, in the worker thread
+# ########################################################
+
+
+def claim_jobs(limit=None):
+    """
+    Mark up to `limit` pending jobs as running and return them, oldest
+    first. Jobs of a file that was replaced since are skipped.
+    """
+    now = timezone.now()
+    VideoTranscode.objects.filter(status=VideoTranscode.PENDING).exclude(
+        video__video=F("source")
+    ).update(
+        status=VideoTranscode.DONE,
+        error="The video file was replaced.",
+        finished_at=now,
+    )
+    VideoTranscode.objects.filter(
+        status=VideoTranscode.RUNNING,
+        started_at__lt=now - VIDEO_TRANSCODE_CLAIM_TIMEOUT,
+    ).update(status=VideoTranscode.PENDING)
+
+    pending = VideoTranscode.objects.filter(status=VideoTranscode.PENDING)
+    ids = list(pending.order_by("created_at", "pk").values_list("pk", flat=True))
+    ids = ids[:limit] if limit else ids
+    VideoTranscode.objects.filter(pk__in=ids, status=VideoTranscode.PENDING).update(
+        status=VideoTranscode.RUNNING, started_at=now
+    )
+    return list(
+        VideoTranscode.objects.filter(
+            pk__in=ids, status=VideoTranscode.RUNNING, started_at=now
+        ).order_by("created_at", "pk")
+    )
+
+
+def finish_job(job, status, error=""):
+    job.status = status
+    job.error = error
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "error", "finished_at"])
+
+
+def local_source(storage, name, workdir):
+    """Path of the stored file on this machine, downloading it if needed."""
+    try:
+        return storage.path(name)
+    except NotImplementedError:
+        path = os.path.join(workdir, "source" + posixpath.splitext(name)[1])
+        with storage.open(name, "rb") as source, open(path, "wb") as target:
+            shutil.copyfileobj(source, target)
+        return path
+
+
+def store_result(job, result):
+    """
+    Save the produced files next to the video and record them, unless the
+    video was replaced or deleted while it was being transcoded.
+    """
+    storage = UploadVideo._meta.get_field("video").storage
+    root = posixpath.splitext(posixpath.basename(job.source))[0]
+    renditions = []
+    for rendition in result["renditions"]:
+        with open(rendition.pop("path"), "rb") as file:
+            name = storage.save(
+                f"{RENDITIONS_DIR}/{root}_{rendition['name']}.mp4", File(file)
+            )
+        renditions.append({**rendition, "file": name, "source": job.source})
+    poster = ""
+    if result["poster"]:
+        with open(result["poster"], "rb") as file:
+            poster = storage.save(
+                UploadVideo._meta.get_field("poster").generate_filename(
+                    None, f"{root}.jpg"
+                ),
+                File(file),
+            )
+
+    with transaction.atomic():
+        video = (
+            UploadVideo.objects.select_for_update()
+            .filter(pk=job.video_id, video=job.source)
+            .only("renditions", "poster")
+            .first()
+        )
+        if video is not None:
+            UploadVideo.objects.filter(pk=video.pk).update(
+                renditions=renditions, poster=poster, duration=result["duration"]
+            )
+    if video is None:
+        # the new files are not referenced
+        obsolete = renditions, poster
+    else:
+        obsolete = video.renditions, video.poster.name
+    for name in [rendition["file"] for rendition in obsolete[0]] + [obsolete[1]]:
+        if name:
+            storage.delete(name)
+
+
+def transcode_pending(executor, limit=None):
+    """
+    Run the pending jobs in `executor` (a process pool) and record their
+    outcome. Returns the number of jobs run, done or failed.
+    """
+    jobs = claim_jobs(limit)
+    storage = UploadVideo._meta.get_field("video").storage
+    futures = {}
+    for job in jobs:
+        workdir = tempfile.mkdtemp(prefix="transcode-")
+        try:
+            source = local_source(storage, job.source, workdir)
+        except OSError as error:
+            shutil.rmtree(workdir, ignore_errors=True)
+            finish_job(job, VideoTranscode.FAILED, f"Cannot read the video: {error}")
+            continue
+        futures[executor.submit(transcode, source, workdir)] = (job, workdir)
+
+    for future in as_completed(futures):
+        job, workdir = futures[future]
+        try:
+            store_result(job, future.result())
+        except Exception as error:
+            logger.warning("Transcoding %s failed: %s", job.source, error)
+            finish_job(job, VideoTranscode.FAILED, str(error))
+        else:
+            finish_job(job, VideoTranscode.DONE)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return len(jobs)
+
+
+class TranscodeWorker:
+    """
+    A daemon thread per process feeding the pending jobs to a process pool
+    whenever it is woken up.
+    """
+
+    def __init__(self):
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def wake(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self.run, name="video-transcode", daemon=True
+                )
+                self._thread.start()
+        self._wakeup.set()
+
+    def run(self):
+        with ProcessPoolExecutor(max_workers=VIDEO_TRANSCODE_WORKERS) as executor:
+            while True:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                try:
+                    while transcode_pending(executor, VIDEO_TRANSCODE_WORKERS):
+                        pass
+                except Exception:
+                    logger.exception("Transcoding the queued videos failed")
+                finally:
+                    close_old_connections()
+
+
+worker = TranscodeWorker()
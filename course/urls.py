@@ -33,6 +33,22 @@ urlpatterns = [
     path(
         "course/<int:pk>/deallocate/", views.deallocate_course, name="course_deallocate"
     ),
+    # Chunked uploads urls
+    path(
+        "course/<slug>/uploads/",
+        views.chunked_upload_start,
+        name="chunked_upload_start",
+    ),
+    path(
+        "course/<slug>/uploads/<uuid:pk>/",
+        views.chunked_upload,
+        name="chunked_upload",
+    ),
+    path(
+        "course/<slug>/uploads/<uuid:pk>/finalize/",
+        views.chunked_upload_finalize,
+        name="chunked_upload_finalize",
+    ),
     # File uploads urls
     path(
         "course/<slug>/documentations/upload/",
@@ -49,6 +65,11 @@ urlpatterns = [
         views.handle_file_delete,
         name="upload_file_delete",
     ),
+    path(
+        "course/<slug>/documentations/<int:file_id>/download/",
+        views.handle_file_download,
+        name="upload_file_download",
+    ),
     # Video uploads urls
     path(
         "course/<slug>/video_tutorials/upload/",
@@ -60,6 +81,16 @@ urlpatterns = [
         views.handle_video_single,
         name="video_single",
     ),
+    path(
+        "course/<slug>/video_tutorials/<video_slug>/stream/",
+        views.handle_video_stream,
+        name="video_stream",
+    ),
+    path(
+        "course/<slug>/video_tutorials/<video_slug>/stream/<rendition>/",
+        views.handle_video_stream,
+        name="video_rendition_stream",
+    ),
     path(
         "course/<slug>/video_tutorials/<video_slug>/edit/",
         views.handle_video_edit,
@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+COURSE_ACCESS_TIMEOUT = getattr(settings, "COURSE_ACCESS_TIMEOUT", 60 * 5)
+
+
+def course_access_key(user_id):
+    return f"course:access:{user_id}"
+
+
+def accessible_course_ids(user):
+    """
+    Ids of the courses a student (or the parent of one) may follow: those
+    of their program and those they registered for. Cached per user, so
+    the requests of a video player cost no permission query.
+    """
+    from .models import Course
+
+    key = course_access_key(user.pk)
+    course_ids = cache.get(key)
+    if course_ids is None:
+        if user.is_parent:
+            student = Q(program__student__parent__user=user) | Q(
+                taken_courses__student__parent__user=user
+            )
+        else:
+            student = Q(program__student__student=user) | Q(
+                taken_courses__student__student=user
+            )
+        course_ids = frozenset(
+            Course.objects.filter(student).values_list("pk", flat=True).distinct()
+        )
+        cache.set(key, course_ids, COURSE_ACCESS_TIMEOUT)
+    return course_ids
+
+
+def can_access_course(user, course_id):
+    if not user.is_authenticated:
+        return False
+    if user.is_superuser or user.is_staff or user.is_lecturer or user.is_dep_head:
+        return True
+    if not (user.is_student or user.is_parent):
+        return False
+    return course_id in accessible_course_ids(user)
+
+
+def clear_course_access(*user_ids):
+    """
+    Forget the cached courses of the given users after their registrations
+    changed. Parents pick up the change when their entry expires.
+    """
+    cache.delete_many([course_access_key(user_id) for user_id in user_ids])
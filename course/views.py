@@ -1,16 +1,35 @@
+import posixpath
+
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied
 from django.core.paginator import Paginator
 from django.db.models import Sum
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
 from django.utils.decorators import method_decorator
+from django.utils.text import slugify
+from django.views.decorators.http import (
+    require_http_methods,
+    require_POST,
+    require_safe,
+)
 from django.views.generic import CreateView
 from django_filters.views import FilterView
 
 from accounts.decorators import lecturer_required, student_required
 from accounts.models import Student
-from core.models import Semester
+from core.models import get_academic_period
+from course.chunked import (
+    CHUNKED_UPLOAD_CHUNK_SIZE,
+    ChunkedUploadError,
+    append_chunk,
+    discard_upload,
+    finalize_upload,
+    start_upload,
+)
 from course.filters import CourseAllocationFilter, ProgramFilter
 from course.forms import (
     CourseAddForm,
@@ -21,14 +40,17 @@ from course.forms import (
     UploadFormVideo,
 )
 from course.models import (
+    ChunkedUpload,
     Course,
     CourseAllocation,
     Program,
     Upload,
     UploadVideo,
 )
+from course.streaming import ranged_file_response
+from course.utils import can_access_course
 from result.models import TakenCourse
-
+from result.utils import drop_courses, register_courses
 
 # ########################################################
 # Program Views
@@ -313,6 +335,26 @@ def handle_file_delete(request, slug, file_id):
     return redirect("course_detail", slug=slug)
 
 
+@login_required
+@require_safe
+def handle_file_download(request, slug, file_id):
+    """A course file, under its title rather than its stored name."""
+    upload = get_object_or_404(
+        Upload.objects.only("title", "file", "course_id"),
+        pk=file_id,
+        course__slug=slug,
+    )
+    if not can_access_course(request.user, upload.course_id):
+        raise PermissionDenied
+    extension = posixpath.splitext(upload.file.name)[1].lower()
+    return ranged_file_response(
+        request,
+        upload.file.storage,
+        upload.file.name,
+        filename=(slugify(upload.title) or "file") + extension,
+    )
+
+
 # ########################################################
 # Video Upload Views
 # ########################################################
@@ -343,12 +385,39 @@ def handle_video_upload(request, slug):
 @login_required
 def handle_video_single(request, slug, video_slug):
     course = get_object_or_404(Course, slug=slug)
+    if not can_access_course(request.user, course.pk):
+        raise PermissionDenied
     video = get_object_or_404(UploadVideo, slug=video_slug)
     return render(
         request,
         "upload/video_single.html",
-        {"video": video, "course": course},
+        {"video": video, "course": course, "renditions": video.get_renditions()},
+    )
+
+
+@login_required
+@require_safe
+def handle_video_stream(request, slug, video_slug, rendition=None):
+    """
+    The uploaded video file, or one of its transcoded renditions, seekable
+    by the player through Range requests.
+    """
+    video = get_object_or_404(
+        UploadVideo.objects.only("video", "course_id", "renditions"),
+        slug=video_slug,
+        course__slug=slug,
     )
+    if not can_access_course(request.user, video.course_id):
+        raise PermissionDenied
+    storage = video.video.storage
+    if rendition is None:
+        return ranged_file_response(request, storage, video.video.name)
+    for candidate in video.get_renditions():
+        if candidate["name"] == rendition:
+            return ranged_file_response(
+                request, storage, candidate["file"], "video/mp4"
+            )
+    raise Http404
 
 
 @login_required
@@ -391,70 +460,55 @@ def handle_video_delete(request, slug, video_slug):
 @student_required
 def course_registration(request):
     if request.method == "POST":
-        student = Student.objects.get(student__pk=request.user.id)
-        ids = ()
-        data = request.POST.copy()
-        data.pop("csrfmiddlewaretoken", None)  # remove csrf_token
-        for key in data.keys():
-            ids = ids + (str(key),)
-        for s in range(0, len(ids)):
-            course = Course.objects.get(pk=ids[s])
-            obj = TakenCourse.objects.create(student=student, course=course)
-            obj.save()
-        messages.success(request, "Courses registered successfully!")
+        student = get_object_or_404(Student, student__pk=request.user.id)
+        # the checkbox names are the ids of the selected courses
+        course_ids = [key for key in request.POST if key.isdigit()]
+        registered, duplicates = register_courses(student, course_ids)
+        if duplicates:
+            messages.warning(
+                request,
+                "Already registered: "
+                + ", ".join(course.code for course in duplicates),
+            )
+        if registered:
+            messages.success(request, "Courses registered successfully!")
         return redirect("course_registration")
     else:
-        current_semester = Semester.objects.filter(is_current_semester=True).first()
+        current_semester = get_academic_period().semester
         if not current_semester:
             messages.error(request, "No active semester found.")
             return render(request, "course/course_registration.html")
 
-        # student = Student.objects.get(student__pk=request.user.id)
         student = get_object_or_404(Student, student__id=request.user.id)
-        taken_courses = TakenCourse.objects.filter(student__student__id=request.user.id)
-        t = ()
-        for i in taken_courses:
-            t += (i.course.pk,)
-
-        courses = (
+        courses = list(
             Course.objects.filter(
-                program__pk=student.program.id,
+                program__pk=student.program_id,
                 level=student.level,
                 semester=current_semester,
             )
-            .exclude(id__in=t)
+            .exclude(taken_courses__student=student)
             .order_by("year")
         )
-        all_courses = Course.objects.filter(
-            level=student.level, program__pk=student.program.id
+        registered_courses = list(
+            Course.objects.filter(
+                level=student.level, taken_courses__student=student
+            ).distinct()
         )
+        all_courses_count = Course.objects.filter(
+            level=student.level, program__pk=student.program_id
+        ).count()
 
-        no_course_is_registered = False  # Check if no course is registered
-        all_courses_are_registered = False
-
-        registered_courses = Course.objects.filter(level=student.level).filter(id__in=t)
-        if (
-            registered_courses.count() == 0
-        ):  # Check if number of registered courses is 0
-            no_course_is_registered = True
-
-        if registered_courses.count() == all_courses.count():
-            all_courses_are_registered = True
-
-        total_first_semester_credit = 0
-        total_sec_semester_credit = 0
-        total_registered_credit = 0
-        for i in courses:
-            if i.semester == "First":
-                total_first_semester_credit += int(i.credit)
-            if i.semester == "Second":
-                total_sec_semester_credit += int(i.credit)
-        for i in registered_courses:
-            total_registered_credit += int(i.credit)
+        total_first_semester_credit = sum(
+            course.credit for course in courses if course.semester == "First"
+        )
+        total_sec_semester_credit = sum(
+            course.credit for course in courses if course.semester == "Second"
+        )
+        total_registered_credit = sum(course.credit for course in registered_courses)
         context = {
             "is_calender_on": True,
-            "all_courses_are_registered": all_courses_are_registered,
-            "no_course_is_registered": no_course_is_registered,
+            "all_courses_are_registered": len(registered_courses) == all_courses_count,
+            "no_course_is_registered": not registered_courses,
             "current_semester": current_semester,
             "courses": courses,
             "total_first_semester_credit": total_first_semester_credit,
@@ -471,13 +525,10 @@ def course_registration(request):
 def course_drop(request):
     if request.method == "POST":
         student = get_object_or_404(Student, student__pk=request.user.id)
-        course_ids = request.POST.getlist("course_ids")
-        print("course_ids", course_ids)
-        for course_id in course_ids:
-            course = get_object_or_404(Course, pk=course_id)
-            TakenCourse.objects.filter(student=student, course=course).delete()
-        messages.success(request, "Courses dropped successfully!")
-        return redirect("course_registration")
+        course_ids = [pk for pk in request.POST.getlist("course_ids") if pk.isdigit()]
+        dropped = drop_courses(student, course_ids)
+        messages.success(request, f"{dropped} course(s) dropped successfully!")
+    return redirect("course_registration")
 
 
 # ########################################################
@@ -502,3 +553,99 @@ def user_course_list(request):
 
     # For other users
     return render(request, "course/user_course_list.html")
+
+
+# ########################################################
+# Chunked Upload Views, see course.chunked
+# ########################################################
+
+
+def chunked_upload_state(upload):
+    return {
+        "id": str(upload.pk),
+        "offset": upload.offset,
+        "size": upload.size,
+        "chunk_size": CHUNKED_UPLOAD_CHUNK_SIZE,
+        "url": reverse(
+            "chunked_upload", kwargs={"slug": upload.course.slug, "pk": upload.pk}
+        ),
+        "finalize_url": reverse(
+            "chunked_upload_finalize",
+            kwargs={"slug": upload.course.slug, "pk": upload.pk},
+        ),
+    }
+
+
+def chunked_upload_error(error):
+    data = {"error": str(error)}
+    if error.offset is not None:
+        data["offset"] = error.offset
+    return JsonResponse(data, status=error.status)
+
+
+@login_required
+@lecturer_required
+@require_POST
+def chunked_upload_start(request, slug):
+    course = get_object_or_404(Course, slug=slug)
+    try:
+        upload = start_upload(
+            request.user,
+            course,
+            request.POST.get("kind"),
+            request.POST.get("title"),
+            request.POST.get("filename"),
+            request.POST.get("size"),
+        )
+    except ChunkedUploadError as error:
+        return chunked_upload_error(error)
+    return JsonResponse(chunked_upload_state(upload), status=201)
+
+
+@login_required
+@lecturer_required
+@require_http_methods(["GET", "PUT", "DELETE"])
+def chunked_upload(request, slug, pk):
+    upload = get_object_or_404(
+        ChunkedUpload.objects.select_related("course"),
+        pk=pk,
+        course__slug=slug,
+        user=request.user,
+    )
+    if request.method == "DELETE":
+        discard_upload(upload)
+        return HttpResponse(status=204)
+    if request.method == "PUT":
+        try:
+            append_chunk(
+                upload,
+                request,
+                int(request.GET.get("offset", -1)),
+                int(request.headers.get("Content-Length") or 0),
+                request.headers.get("X-Chunk-SHA256"),
+            )
+        except ValueError:
+            return JsonResponse({"error": "Invalid offset."}, status=400)
+        except ChunkedUploadError as error:
+            return chunked_upload_error(error)
+    return JsonResponse(chunked_upload_state(upload))
+
+
+@login_required
+@lecturer_required
+@require_POST
+def chunked_upload_finalize(request, slug, pk):
+    upload = get_object_or_404(
+        ChunkedUpload.objects.select_related("course"),
+        pk=pk,
+        course__slug=slug,
+        user=request.user,
+    )
+    try:
+        instance = finalize_upload(upload, request.POST.get("chunks_sha256"))
+    except ChunkedUploadError as error:
+        return chunked_upload_error(error)
+    messages.success(request, f"{instance.title} has been uploaded.")
+    return JsonResponse(
+        {"redirect": reverse("course_detail", kwargs={"slug": slug})}, status=201
+    )
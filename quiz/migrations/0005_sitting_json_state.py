@@ -0,0 +1,151 @@
+import json
+
+from django.db import migrations, models
+
+
+def _ids(value):
+    return [int(part) for part in (value or "").split(",") if part.strip()]
+
+
+def pack_sitting_state(apps, schema_editor):
+    Sitting = apps.get_model("quiz", "Sitting")
+    sittings = Sitting.objects.only(
+        "question_order", "question_list", "incorrect_questions", "user_answers"
+    )
+    batch = []
+    for sitting in sittings.iterator(chunk_size=500):
+        order = _ids(sitting.question_order)
+        remaining = _ids(sitting.question_list)
+        sitting.question_order_json = order
+        sitting.current_position = len(order) - len(remaining)
+        sitting.incorrect_questions_json = _ids(sitting.incorrect_questions)
+        try:
+            sitting.user_answers_json = json.loads(sitting.user_answers or "{}")
+        except ValueError:
+            sitting.user_answers_json = {}
+        batch.append(sitting)
+        if len(batch) >= 500:
+            Sitting.objects.bulk_update(batch, FIELDS)
+            batch = []
+    Sitting.objects.bulk_update(batch, FIELDS)
+
+
+def unpack_sitting_state(apps, schema_editor):
+    Sitting = apps.get_model("quiz", "Sitting")
+    batch = []
+    for sitting in Sitting.objects.iterator(chunk_size=500):
+        order = sitting.question_order_json or []
+        sitting.question_order = "".join(f"{pk}," for pk in order)
+        sitting.question_list = "".join(
+            f"{pk}," for pk in order[sitting.current_position :]
+        )
+        sitting.incorrect_questions = "".join(
+            f"{pk}," for pk in sitting.incorrect_questions_json or []
+        )
+        sitting.user_answers = json.dumps(sitting.user_answers_json or {})
+        batch.append(sitting)
+    Sitting.objects.bulk_update(
+        batch,
+        ["question_order", "question_list", "incorrect_questions", "user_answers"],
+        batch_size=500,
+    )
+
+
+FIELDS = [
+    "question_order_json",
+    "current_position",
+    "incorrect_questions_json",
+    "user_answers_json",
+]
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("quiz", "0004_alter_essayquestion_options_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="sitting",
+            name="question_order_json",
+            field=models.JSONField(default=list),
+        ),
+        migrations.AddField(
+            model_name="sitting",
+            name="current_position",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="Index in the question order of the next question to ask.",
+                verbose_name="Current Position",
+            ),
+        ),
+        migrations.AddField(
+            model_name="sitting",
+            name="incorrect_questions_json",
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name="sitting",
+            name="user_answers_json",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.RunPython(pack_sitting_state, unpack_sitting_state),
+        # give the old columns a default so the migration can be reversed
+        migrations.AlterField(
+            model_name="sitting",
+            name="question_order",
+            field=models.CharField(blank=True, default="", max_length=1024),
+        ),
+        migrations.AlterField(
+            model_name="sitting",
+            name="question_list",
+            field=models.CharField(blank=True, default="", max_length=1024),
+        ),
+        migrations.AlterField(
+            model_name="sitting",
+            name="incorrect_questions",
+            field=models.CharField(blank=True, default="", max_length=1024),
+        ),
+        migrations.RemoveField(model_name="sitting", name="question_order"),
+        migrations.RemoveField(model_name="sitting", name="question_list"),
+        migrations.RemoveField(model_name="sitting", name="incorrect_questions"),
+        migrations.RemoveField(model_name="sitting", name="user_answers"),
+        migrations.RenameField(
+            model_name="sitting",
+            old_name="question_order_json",
+            new_name="question_order",
+        ),
+        migrations.RenameField(
+            model_name="sitting",
+            old_name="incorrect_questions_json",
+            new_name="incorrect_questions",
+        ),
+        migrations.RenameField(
+            model_name="sitting",
+            old_name="user_answers_json",
+            new_name="user_answers",
+        ),
+        migrations.AlterField(
+            model_name="sitting",
+            name="question_order",
+            field=models.JSONField(
+                default=list,
+                help_text="Ids of the questions in the order they are asked.",
+                verbose_name="Question Order",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="sitting",
+            name="incorrect_questions",
+            field=models.JSONField(
+                blank=True, default=list, verbose_name="Incorrect questions"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="sitting",
+            name="user_answers",
+            field=models.JSONField(
+                blank=True, default=dict, verbose_name="User Answers"
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("quiz", "0005_sitting_json_state"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="quiz",
+            name="question_version",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
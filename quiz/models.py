@@ -1,15 +1,22 @@
-import json
+import random
 import re
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ImproperlyConfigured, ValidationError
 from django.core.validators import (
     MaxValueValidator,
     validate_comma_separated_integer_list,
 )
 from django.db import models
-from django.db.models import Q
-from django.db.models.signals import pre_save
+from django.db.models import F, Q
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
 from django.urls import reverse
 from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
@@ -31,6 +38,23 @@ CATEGORY_OPTIONS = (
     ("practice", _("Practice Quiz")),
 )
 
+QUESTION_BUNDLE_TIMEOUT = 60 * 60 * 24
+
+
+def question_bundle_key(quiz_id, version):
+    return f"quiz:{quiz_id}:questions:{version}"
+
+
+def invalidate_question_bundles(quiz_ids):
+    """
+    Bump the question version of the quizzes. The version is part of the
+    bundle key, so every process stops using its cached bundle, whatever
+    cache backend it uses.
+    """
+    Quiz.objects.filter(pk__in=list(quiz_ids)).update(
+        question_version=F("question_version") + 1
+    )
+
 
 class QuizManager(models.Manager):
     def search(self, query=None):
@@ -94,6 +118,8 @@ class Quiz(models.Model):
         ),
     )
     timestamp = models.DateTimeField(auto_now=True)
+    # bumped whenever a question or choice of the quiz changes
+    question_version = models.PositiveIntegerField(default=0, editable=False)
 
     objects = QuizManager()
 
@@ -111,11 +137,48 @@ class Quiz(models.Model):
         if not (0 <= self.pass_mark <= 100):
             raise ValidationError(_("Pass mark must be between 0 and 100."))
 
+        if not self._state.adding and not kwargs.get("force_insert"):
+            # only invalidate_question_bundles writes the version: saving an
+            # instance loaded before a question changed must not roll it back
+            update_fields = kwargs.get("update_fields")
+            if update_fields is None:
+                update_fields = [
+                    field.name
+                    for field in self._meta.concrete_fields
+                    if not field.primary_key
+                ]
+            kwargs["update_fields"] = [
+                name for name in update_fields if name != "question_version"
+            ]
         super().save(*args, **kwargs)
 
     def get_questions(self):
         return self.question_set.all().select_subclasses()
 
+    def get_question_bundle(self):
+        """
+        Return {question id: question} with every question of the quiz as its
+        subclass and, for multiple choice questions, their choices attached.
+        The bundle is built with two queries and cached under the question
+        version the quiz was loaded with, so a quiz read from the database
+        after a change of its questions or choices never gets a stale bundle.
+        """
+        key = question_bundle_key(self.pk, self.question_version)
+        bundle = cache.get(key)
+        if bundle is None:
+            bundle = {
+                question.id: question
+                for question in self.question_set.order_by("id").select_subclasses()
+            }
+            choices = {}
+            for choice in Choice.objects.filter(question__quiz=self).order_by("id"):
+                choices.setdefault(choice.question_id, []).append(choice)
+            for question in bundle.values():
+                if isinstance(question, MCQuestion):
+                    question.bundled_choices = choices.get(question.id, [])
+            cache.set(key, bundle, QUESTION_BUNDLE_TIMEOUT)
+        return bundle
+
     @property
     def get_max_score(self):
         return self.get_questions().count()
@@ -155,7 +218,7 @@ class Progress(models.Model):
     def list_all_cat_scores(self):
         return {}  # Implement as needed
 
-    def update_score(self, question, score_to_add=0, possible_to_add=0):
+    def update_score(self, question, score_to_add=0, possible_to_add=0, commit=True):
         if not isinstance(score_to_add, int) or not isinstance(possible_to_add, int):
             return _("Error"), _("Invalid score values.")
 
@@ -169,11 +232,11 @@ class Progress(models.Model):
                 [str(question.quiz), str(updated_score), str(updated_possible), ""]
             )
             self.score = self.score.replace(match.group(), new_score)
-            self.save()
         else:
             self.score += ",".join(
                 [str(question.quiz), str(score_to_add), str(possible_to_add), ""]
             )
+        if commit:
             self.save()
 
     def show_exams(self):
@@ -187,12 +250,10 @@ class Progress(models.Model):
 
 class SittingManager(models.Manager):
     def new_sitting(self, user, quiz, course):
+        question_ids = list(quiz.get_question_bundle())
         if quiz.random_order:
-            question_set = quiz.question_set.all().select_subclasses().order_by("?")
-        else:
-            question_set = quiz.question_set.all().select_subclasses()
+            random.shuffle(question_ids)
 
-        question_ids = [item.id for item in question_set]
         if not question_ids:
             raise ImproperlyConfigured(
                 _(
@@ -200,18 +261,16 @@ class SittingManager(models.Manager):
                 )
             )
 
-        questions = ",".join(map(str, question_ids)) + ","
-
         new_sitting = self.create(
             user=user,
             quiz=quiz,
             course=course,
-            question_order=questions,
-            question_list=questions,
-            incorrect_questions="",
+            question_order=question_ids,
+            current_position=0,
+            incorrect_questions=[],
             current_score=0,
             complete=False,
-            user_answers="{}",
+            user_answers={},
         )
         return new_sitting
 
@@ -229,6 +288,7 @@ class SittingManager(models.Manager):
             sitting = self.filter(
                 user=user, quiz=quiz, course=course, complete=False
             ).first()
+        sitting.quiz = quiz
         return sitting
 
 
@@ -240,26 +300,23 @@ class Sitting(models.Model):
     course = models.ForeignKey(
         Course, verbose_name=_("Course"), on_delete=models.CASCADE
     )
-    question_order = models.CharField(
-        max_length=1024,
+    question_order = models.JSONField(
+        default=list,
         verbose_name=_("Question Order"),
-        validators=[validate_comma_separated_integer_list],
+        help_text=_("Ids of the questions in the order they are asked."),
     )
-    question_list = models.CharField(
-        max_length=1024,
-        verbose_name=_("Question List"),
-        validators=[validate_comma_separated_integer_list],
+    current_position = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_("Current Position"),
+        help_text=_("Index in the question order of the next question to ask."),
     )
-    incorrect_questions = models.CharField(
-        max_length=1024,
-        blank=True,
-        verbose_name=_("Incorrect questions"),
-        validators=[validate_comma_separated_integer_list],
+    incorrect_questions = models.JSONField(
+        default=list, blank=True, verbose_name=_("Incorrect questions")
     )
     current_score = models.IntegerField(verbose_name=_("Current Score"))
     complete = models.BooleanField(default=False, verbose_name=_("Complete"))
-    user_answers = models.TextField(
-        blank=True, default="{}", verbose_name=_("User Answers")
+    user_answers = models.JSONField(
+        default=dict, blank=True, verbose_name=_("User Answers")
     )
     start = models.DateTimeField(auto_now_add=True, verbose_name=_("Start"))
     end = models.DateTimeField(null=True, blank=True, verbose_name=_("End"))
@@ -269,19 +326,46 @@ class Sitting(models.Model):
     class Meta:
         permissions = (("view_sittings", _("Can see completed exams.")),)
 
+    @property
+    def remaining_question_ids(self):
+        return self.question_order[self.current_position :]
+
+    def get_question_bundle(self):
+        if not hasattr(self, "_question_bundle"):
+            self._question_bundle = self.quiz.get_question_bundle()
+        return self._question_bundle
+
+    def get_question(self, question_id):
+        question = self.get_question_bundle().get(question_id)
+        if question is None:
+            # the question was removed from the quiz after the sitting began
+            question = Question.objects.get_subclass(id=question_id)
+        return question
+
     def get_first_question(self):
-        if not self.question_list:
+        if self.current_position >= len(self.question_order):
             return False
-        first_question_id = int(self.question_list.split(",", 1)[0])
-        return Question.objects.get_subclass(id=first_question_id)
+        return self.get_question(self.question_order[self.current_position])
 
     def remove_first_question(self):
-        if not self.question_list:
+        if self.current_position >= len(self.question_order):
             return
-        _, remaining_questions = self.question_list.split(",", 1)
-        self.question_list = remaining_questions
+        self.current_position += 1
         self.save()
 
+    def record_answer(self, question, guess, is_correct):
+        """
+        Apply everything answering the current question changes to the sitting
+        (score or incorrect questions, the stored answer and the position) in
+        memory only. The caller persists it with a single save.
+        """
+        if is_correct:
+            self.current_score += 1
+        else:
+            self.incorrect_questions.append(question.id)
+        self.user_answers[str(question.id)] = guess
+        self.current_position += 1
+
     def add_to_score(self, points):
         self.current_score += int(points)
         self.save()
@@ -290,12 +374,9 @@ class Sitting(models.Model):
     def get_current_score(self):
         return self.current_score
 
-    def _question_ids(self):
-        return [int(q) for q in self.question_order.split(",") if q]
-
     @property
     def get_percent_correct(self):
-        total_questions = len(self._question_ids())
+        total_questions = len(self.question_order)
         if total_questions == 0:
             return 0
         percent = (self.current_score / total_questions) * 100
@@ -307,22 +388,18 @@ class Sitting(models.Model):
         self.save()
 
     def add_incorrect_question(self, question):
-        incorrect_ids = self.get_incorrect_questions
-        incorrect_ids.append(question.id)
-        self.incorrect_questions = ",".join(map(str, incorrect_ids)) + ","
+        self.incorrect_questions.append(question.id)
         if self.complete:
             self.add_to_score(-1)
         self.save()
 
     @property
     def get_incorrect_questions(self):
-        return [int(q) for q in self.incorrect_questions.split(",") if q]
+        return list(self.incorrect_questions)
 
     def remove_incorrect_question(self, question):
-        incorrect_ids = self.get_incorrect_questions
-        if question.id in incorrect_ids:
-            incorrect_ids.remove(question.id)
-            self.incorrect_questions = ",".join(map(str, incorrect_ids)) + ","
+        if question.id in self.incorrect_questions:
+            self.incorrect_questions.remove(question.id)
             self.add_to_score(1)
             self.save()
 
@@ -338,21 +415,19 @@ class Sitting(models.Model):
             return _("You failed this quiz, try again.")
 
     def add_user_answer(self, question, guess):
-        user_answers = json.loads(self.user_answers)
-        user_answers[str(question.id)] = guess
-        self.user_answers = json.dumps(user_answers)
+        self.user_answers[str(question.id)] = guess
         self.save()
 
     def get_questions(self, with_answers=False):
-        question_ids = self._question_ids()
-        questions = sorted(
-            self.quiz.question_set.filter(id__in=question_ids).select_subclasses(),
-            key=lambda q: question_ids.index(q.id),
-        )
+        bundle = self.get_question_bundle()
+        questions = [
+            bundle[question_id]
+            for question_id in self.question_order
+            if question_id in bundle
+        ]
         if with_answers:
-            user_answers = json.loads(self.user_answers)
             for question in questions:
-                question.user_answer = user_answers.get(str(question.id))
+                question.user_answer = self.user_answers.get(str(question.id))
         return questions
 
     @property
@@ -361,10 +436,10 @@ class Sitting(models.Model):
 
     @property
     def get_max_score(self):
-        return len(self._question_ids())
+        return len(self.question_order)
 
     def progress(self):
-        answered = len(json.loads(self.user_answers))
+        answered = len(self.user_answers)
         total = self.get_max_score
         return answered, total
 
@@ -415,11 +490,8 @@ class MCQuestion(Question):
         verbose_name_plural = _("Multiple Choice Questions")
 
     def check_if_correct(self, guess):
-        try:
-            answer = Choice.objects.get(id=int(guess))
-            return answer.correct
-        except (Choice.DoesNotExist, ValueError):
-            return False
+        choice = self.get_choice(guess)
+        return choice is not None and choice.correct
 
     def order_choices(self, queryset):
         if self.choice_order == "content":
@@ -430,16 +502,32 @@ class MCQuestion(Question):
             return queryset
 
     def get_choices(self):
-        return self.order_choices(Choice.objects.filter(question=self))
+        choices = getattr(self, "bundled_choices", None)
+        if choices is None:
+            return self.order_choices(Choice.objects.filter(question=self))
+        if self.choice_order == "content":
+            return sorted(choices, key=lambda choice: choice.choice_text)
+        elif self.choice_order == "random":
+            return random.sample(choices, len(choices))
+        else:
+            return list(choices)
 
     def get_choices_list(self):
         return [(choice.id, choice.choice_text) for choice in self.get_choices()]
 
-    def answer_choice_to_string(self, guess):
+    def get_choice(self, guess):
         try:
-            return Choice.objects.get(id=int(guess)).choice_text
-        except (Choice.DoesNotExist, ValueError):
-            return ""
+            choice_id = int(guess)
+        except (TypeError, ValueError):
+            return None
+        choices = getattr(self, "bundled_choices", None)
+        if choices is None:
+            return Choice.objects.filter(id=choice_id, question=self).first()
+        return next((choice for choice in choices if choice.id == choice_id), None)
+
+    def answer_choice_to_string(self, guess):
+        choice = self.get_choice(guess)
+        return choice.choice_text if choice else ""
 
 
 class Choice(models.Model):
@@ -481,3 +569,33 @@ class EssayQuestion(Question):
 
     def answer_choice_to_string(self, guess):
         return str(guess)
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_save, sender=MCQuestion)
+@receiver(post_save, sender=EssayQuestion)
+@receiver(pre_delete, sender=Question)
+@receiver(pre_delete, sender=MCQuestion)
+@receiver(pre_delete, sender=EssayQuestion)
+def question_bundle_receiver(sender, instance, **kwargs):
+    invalidate_question_bundles(instance.quiz.values_list("pk", flat=True))
+
+
+@receiver(post_save, sender=Choice)
+@receiver(post_delete, sender=Choice)
+def choice_question_bundle_receiver(sender, instance, **kwargs):
+    invalidate_question_bundles(
+        Quiz.objects.filter(question=instance.question_id).values_list("pk", flat=True)
+    )
+
+
+@receiver(m2m_changed, sender=Question.quiz.through)
+def question_quiz_bundle_receiver(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if reverse:
+        invalidate_question_bundles([instance.pk])
+    elif pk_set:
+        invalidate_question_bundles(pk_set)
+    else:
+        invalidate_question_bundles(instance.quiz.values_list("pk", flat=True))
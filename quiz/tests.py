@@ -1,3 +1,239 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-# Create your tests here.
+from accounts.models import User
+from course.models import Program, Course
+from .models import Quiz, MCQuestion, Choice, Progress, Sitting
+
+
+class SittingTestCase(TestCase):
+    def setUp(self):
+        program = Program.objects.create(title="Computer Science")
+        self.course = Course.objects.create(
+            title="Algorithms",
+            code="CS301",
+            credit=3,
+            program=program,
+            level="Bachelor",
+            semester="First",
+        )
+        self.quiz = Quiz.objects.create(course=self.course, title="Sorting")
+        self.questions = []
+        for i in range(300):
+            question = MCQuestion.objects.create(content=f"Question {i}")
+            self.questions.append(question)
+        self.quiz.question_set.add(*self.questions)
+        self.user = User.objects.create(username="student")
+
+    def test_question_order_is_not_capped(self):
+        sitting = Sitting.objects.new_sitting(self.user, self.quiz, self.course)
+        sitting.refresh_from_db()
+        self.assertEqual(sitting.question_order, [q.id for q in self.questions])
+        self.assertEqual(sitting.get_max_score, 300)
+
+    def test_walk_through_questions(self):
+        sitting = Sitting.objects.new_sitting(self.user, self.quiz, self.course)
+        first, second = self.questions[:2]
+        self.assertEqual(sitting.get_first_question(), first)
+
+        sitting.add_user_answer(first, "1")
+        sitting.add_incorrect_question(first)
+        sitting.remove_first_question()
+        sitting.refresh_from_db()
+
+        self.assertEqual(sitting.current_position, 1)
+        self.assertEqual(sitting.get_first_question(), second)
+        self.assertEqual(sitting.get_incorrect_questions, [first.id])
+        self.assertEqual(sitting.user_answers, {str(first.id): "1"})
+        self.assertEqual(sitting.progress(), (1, 300))
+
+        sitting.remove_incorrect_question(first)
+        self.assertEqual(sitting.get_incorrect_questions, [])
+
+    def test_get_questions_keeps_sitting_order(self):
+        sitting = Sitting.objects.new_sitting(self.user, self.quiz, self.course)
+        sitting.question_order.reverse()
+        sitting.save()
+        # the questions come from the quiz's cached bundle
+        with self.assertNumQueries(0):
+            questions = sitting.get_questions(with_answers=True)
+        self.assertEqual([q.id for q in questions], sitting.question_order)
+        self.assertIsNone(questions[0].user_answer)
+
+    def test_finished_sitting_has_no_next_question(self):
+        sitting = Sitting.objects.new_sitting(self.user, self.quiz, self.course)
+        sitting.current_position = len(sitting.question_order)
+        self.assertFalse(sitting.get_first_question())
+        sitting.remove_first_question()
+        self.assertEqual(sitting.current_position, 300)
+
+
+@override_settings(
+    LANGUAGE_CODE="en",
+    STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage",
+)
+class QuizTakeTestCase(TestCase):
+    def setUp(self):
+        program = Program.objects.create(title="Computer Science")
+        self.course = Course.objects.create(
+            title="Algorithms",
+            code="CS301",
+            credit=3,
+            program=program,
+            level="Bachelor",
+            semester="First",
+        )
+        self.quiz = Quiz.objects.create(course=self.course, title="Sorting")
+        self.correct_choices = []
+        for i in range(5):
+            question = MCQuestion.objects.create(content=f"Question {i}")
+            question.quiz.add(self.quiz)
+            self.correct_choices.append(
+                Choice.objects.create(
+                    question=question, choice_text="Yes", correct=True
+                )
+            )
+            Choice.objects.create(question=question, choice_text="No", correct=False)
+        self.user = User.objects.create_user(
+            username="student", password="password", is_lecturer=True
+        )
+        self.client.force_login(self.user)
+        self.url = reverse(
+            "quiz_take", kwargs={"pk": self.course.pk, "slug": self.quiz.slug}
+        )
+
+    def answer(self, position):
+        choice = self.correct_choices[position]
+        return self.client.post(self.url, {"answers": choice.pk})
+
+    def test_each_answer_writes_sitting_and_progress_once(self):
+        self.client.get(self.url)
+        self.answer(0)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.answer(1)
+        writes = [
+            q["sql"]
+            for q in queries.captured_queries
+            if q["sql"].startswith(("UPDATE", "INSERT", "DELETE"))
+        ]
+        self.assertEqual(len(writes), 2)
+        self.assertTrue(any('"quiz_sitting"' in sql for sql in writes))
+        self.assertTrue(any('"quiz_progress"' in sql for sql in writes))
+
+        # answering does not get more expensive as the sitting goes on
+        with self.assertNumQueries(len(queries)):
+            self.answer(2)
+
+    def test_answers_are_recorded(self):
+        self.client.get(self.url)
+        self.answer(0)
+        self.client.post(
+            self.url, {"answers": self.correct_choices[1].pk + 1}
+        )  # the wrong choice
+
+        sitting = Sitting.objects.get(user=self.user)
+        self.assertEqual(sitting.current_position, 2)
+        self.assertEqual(sitting.current_score, 1)
+        self.assertEqual(
+            sitting.incorrect_questions, [self.correct_choices[1].question_id]
+        )
+        self.assertEqual(len(sitting.user_answers), 2)
+        self.assertIn(",1,2,", Progress.objects.get(user=self.user).score)
+
+
+class QuestionBundleTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        program = Program.objects.create(title="Computer Science")
+        course = Course.objects.create(
+            title="Algorithms",
+            code="CS301",
+            credit=3,
+            program=program,
+            level="Bachelor",
+            semester="First",
+        )
+        self.quiz = Quiz.objects.create(course=course, title="Sorting")
+        self.question = MCQuestion.objects.create(content="Question")
+        self.question.quiz.add(self.quiz)
+        self.right = Choice.objects.create(
+            question=self.question, choice_text="Yes", correct=True
+        )
+        self.wrong = Choice.objects.create(
+            question=self.question, choice_text="No", correct=False
+        )
+
+    def test_bundle_is_loaded_once(self):
+        for i in range(20):
+            question = MCQuestion.objects.create(content=f"Question {i}")
+            question.quiz.add(self.quiz)
+            Choice.objects.create(question=question, choice_text="Yes", correct=True)
+
+        with self.assertNumQueries(2):
+            bundle = self.quiz.get_question_bundle()
+        with self.assertNumQueries(0):
+            self.quiz.get_question_bundle()
+            for question in bundle.values():
+                question.get_choices_list()
+        self.assertEqual(len(bundle), 21)
+
+    def test_bundled_choices_are_checked_without_queries(self):
+        question = self.quiz.get_question_bundle()[self.question.pk]
+        with self.assertNumQueries(0):
+            self.assertTrue(question.check_if_correct(str(self.right.pk)))
+            self.assertFalse(question.check_if_correct(str(self.wrong.pk)))
+            self.assertFalse(question.check_if_correct("not a number"))
+            self.assertEqual(question.answer_choice_to_string(self.wrong.pk), "No")
+
+    def bundle(self):
+        # as loaded by the next request
+        return Quiz.objects.get(pk=self.quiz.pk).get_question_bundle()
+
+    def test_bundle_is_invalidated(self):
+        self.bundle()
+        self.right.choice_text = "Of course"
+        self.right.save()
+        question = self.bundle()[self.question.pk]
+        self.assertIn("Of course", [c.choice_text for c in question.get_choices()])
+
+        other = MCQuestion.objects.create(content="Another question")
+        other.quiz.add(self.quiz)
+        self.assertIn(other.pk, self.bundle())
+
+        self.question.quiz.remove(self.quiz)
+        self.assertNotIn(self.question.pk, self.bundle())
+
+        other.delete()
+        self.assertEqual(self.bundle(), {})
+
+    def test_bundles_are_keyed_by_the_question_version(self):
+        self.bundle()
+        # an edit handled by another process, whose cache this one cannot see
+        Choice.objects.filter(pk=self.right.pk).update(choice_text="Of course")
+        Quiz.objects.filter(pk=self.quiz.pk).update(question_version=7)
+        question = self.bundle()[self.question.pk]
+        self.assertIn("Of course", [c.choice_text for c in question.get_choices()])
+
+    def test_saving_a_stale_quiz_keeps_the_version(self):
+        quiz = Quiz.objects.get(pk=self.quiz.pk)
+        self.bundle()
+        self.right.choice_text = "Of course"
+        self.right.save()
+        # e.g. the quiz form, opened before the choice was edited
+        quiz.title = "Renamed"
+        quiz.save()
+        question = self.bundle()[self.question.pk]
+        self.assertIn("Of course", [c.choice_text for c in question.get_choices()])
+        self.assertEqual(Quiz.objects.get(pk=quiz.pk).title, "Renamed")
+
+    def test_choices_of_other_questions_are_ignored(self):
+        other = MCQuestion.objects.create(content="Another question")
+        foreign = Choice.objects.create(question=other, choice_text="Yes", correct=True)
+        question = MCQuestion.objects.get(pk=self.question.pk)
+        self.assertIsNone(question.get_choice(foreign.pk))
+        self.assertFalse(question.check_if_correct(str(foreign.pk)))
+        self.assertEqual(question.get_choice(self.right.pk), self.right)
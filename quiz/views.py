@@ -206,7 +206,7 @@ class QuizMarkingDetail(DetailView):
         sitting = self.get_object()
         question_id = request.POST.get("qid")
         if question_id:
-            question = Question.objects.get_subclass(id=int(question_id))
+            question = sitting.get_question(int(question_id))
             if int(question_id) in sitting.get_incorrect_questions:
                 sitting.remove_incorrect_question(question)
             else:
@@ -233,7 +233,7 @@ class QuizTake(FormView):
     def dispatch(self, request, *args, **kwargs):
         self.quiz = get_object_or_404(Quiz, slug=self.kwargs["slug"])
         self.course = get_object_or_404(Course, pk=self.kwargs["pk"])
-        if not Question.objects.filter(quiz=self.quiz).exists():
+        if not self.quiz.get_question_bundle():
             messages.warning(request, "This quiz has no questions available.")
             return redirect("quiz_index", slug=self.course.slug)
 
@@ -265,21 +265,29 @@ class QuizTake(FormView):
 
     def form_valid(self, form):
         self.form_valid_user(form)
-        if not self.sitting.get_first_question():
+        if not self.question:
             return self.final_result_user()
         return super().get(self.request)
 
     def form_valid_user(self, form):
-        progress, _ = Progress.objects.get_or_create(user=self.request.user)
         guess = form.cleaned_data["answers"]
         is_correct = self.question.check_if_correct(guess)
 
-        if is_correct:
-            self.sitting.add_to_score(1)
-            progress.update_score(self.question, 1, 1)
-        else:
-            self.sitting.add_incorrect_question(self.question)
-            progress.update_score(self.question, 0, 1)
+        # apply the answer in memory and write the sitting and the progress
+        # once each, so a class sitting an exam doesn't queue up on locks
+        with transaction.atomic():
+            progress, _ = Progress.objects.get_or_create(user=self.request.user)
+            progress.update_score(self.question, int(is_correct), 1, commit=False)
+            progress.save(update_fields=["score"])
+            self.sitting.record_answer(self.question, guess, is_correct)
+            self.sitting.save(
+                update_fields=[
+                    "current_score",
+                    "incorrect_questions",
+                    "user_answers",
+                    "current_position",
+                ]
+            )
 
         if not self.quiz.answers_at_end:
             self.previous = {
@@ -292,9 +300,6 @@ class QuizTake(FormView):
         else:
             self.previous = {}
 
-        self.sitting.add_user_answer(self.question, guess)
-        self.sitting.remove_first_question()
-
         # Update self.question and self.progress for the next question
         self.question = self.sitting.get_first_question()
         self.progress = self.sitting.progress()
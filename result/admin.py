@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.models import Group
 
-from .models import TakenCourse, Result
+from .models import TakenCourse, Result, GradeLedger
 
 
 class ScoreAdmin(admin.ModelAdmin):
@@ -19,5 +19,11 @@ class ScoreAdmin(admin.ModelAdmin):
     ]
 
 
+class GradeLedgerAdmin(admin.ModelAdmin):
+    list_display = ["student", "level", "semester", "credits", "points", "gpa"]
+    list_filter = ["level", "semester"]
+
+
 admin.site.register(TakenCourse, ScoreAdmin)
 admin.site.register(Result)
+admin.site.register(GradeLedger, GradeLedgerAdmin)
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from result.models import GradeLedger
+
+
+class Command(BaseCommand):
+    help = "Rebuild the GradeLedger from TakenCourse rows and verify it."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check-only",
+            action="store_true",
+            help="Only compare the ledger with the live totals, do not rebuild.",
+        )
+
+    def handle(self, *args, **options):
+        if not options["check_only"]:
+            with transaction.atomic():
+                GradeLedger.objects.rebuild()
+            self.stdout.write(
+                f"Rebuilt {GradeLedger.objects.count()} grade ledger rows."
+            )
+
+        mismatches = GradeLedger.objects.mismatches()
+        for student_id, level, semester, stored, live in mismatches:
+            self.stderr.write(
+                f"Student {student_id} ({level}, {semester}): "
+                f"ledger {stored} != live {live}"
+            )
+        if mismatches:
+            raise CommandError(f"{len(mismatches)} grade ledger rows are out of date.")
+        self.stdout.write(self.style.SUCCESS("Grade ledger matches TakenCourse."))
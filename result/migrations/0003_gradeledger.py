@@ -0,0 +1,94 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:11
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Sum
+
+
+def populate_grade_ledger(apps, schema_editor):
+    TakenCourse = apps.get_model("result", "TakenCourse")
+    GradeLedger = apps.get_model("result", "GradeLedger")
+    totals = (
+        TakenCourse.objects.values("student_id", "course__level", "course__semester")
+        .annotate(credits=Sum("course__credit"), points=Sum("point"))
+        .order_by()
+    )
+    GradeLedger.objects.bulk_create(
+        [
+            GradeLedger(
+                student_id=row["student_id"],
+                level=row["course__level"],
+                semester=row["course__semester"],
+                credits=row["credits"] or 0,
+                points=row["points"] or Decimal("0.00"),
+            )
+            for row in totals
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0007_alter_user_email"),
+        ("result", "0002_alter_result_level_alter_takencourse_comment_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GradeLedger",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "level",
+                    models.CharField(
+                        choices=[
+                            ("Bachelor", "Bachelor Degree"),
+                            ("Master", "Master Degree"),
+                        ],
+                        max_length=25,
+                    ),
+                ),
+                (
+                    "semester",
+                    models.CharField(
+                        choices=[
+                            ("First", "First"),
+                            ("Second", "Second"),
+                            ("Third", "Third"),
+                        ],
+                        max_length=200,
+                    ),
+                ),
+                ("credits", models.PositiveIntegerField(default=0)),
+                (
+                    "points",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=9
+                    ),
+                ),
+                (
+                    "student",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="grade_ledger",
+                        to="accounts.student",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("student", "level", "semester")},
+            },
+        ),
+        migrations.RunPython(populate_grade_ledger, migrations.RunPython.noop),
+    ]
@@ -2,11 +2,15 @@ from decimal import Decimal
 from django.conf import settings
 
 from django.db import models
+from django.db.models import Sum
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.urls import reverse
 
 from accounts.models import Student
-from core.models import Semester
+from core.models import get_academic_period
 from course.models import Course
+from course.utils import clear_course_access
 
 A_PLUS = "A+"
 A = "A"
@@ -139,42 +143,204 @@ class TakenCourse(models.Model):
         grade_point = GRADE_POINT_MAPPING.get(self.grade, 0.0)
         return Decimal(credit) * Decimal(grade_point)
 
-    def save(self, *args, **kwargs):
+    def calculate_grade(self):
         self.total = self.get_total()
         self.grade = self.get_grade()
         self.point = self.get_point()
         self.comment = self.get_comment()
+
+    def save(self, *args, **kwargs):
+        self.calculate_grade()
         super().save(*args, **kwargs)
 
     def calculate_gpa(self):
-        current_semester = Semester.objects.filter(is_current_semester=True).first()
+        current_semester = get_academic_period().semester
         if not current_semester:
             return Decimal("0.00")
+        return GradeLedger.objects.gpa(
+            self.student, self.student.level, current_semester.semester
+        )
+
+    def calculate_cgpa(self):
+        return GradeLedger.objects.cgpa(self.student)
+
+
+def average_point(points, credits):
+    if credits:
+        return round(Decimal(points) / Decimal(credits), 2)
+    return Decimal("0.00")
 
-        taken_courses = TakenCourse.objects.filter(
-            student=self.student,
-            course__level=self.student.level,
-            course__semester=current_semester.semester,
+
+class GradeLedgerManager(models.Manager):
+    def _live_totals(self, **filters):
+        """Grouped credit/point totals straight from the TakenCourse table."""
+        return (
+            TakenCourse.objects.filter(**filters)
+            .values("student_id", "course__level", "course__semester")
+            .annotate(credits=Sum("course__credit"), points=Sum("point"))
+            .order_by()
         )
 
-        total_points = sum(tc.point for tc in taken_courses)
-        total_credits = sum(tc.course.credit for tc in taken_courses)
+    def refresh(self, student_ids):
+        """
+        Bring the ledger rows of the given students in line with their
+        TakenCourse rows: one grouped query to read the totals, then a bulk
+        update/insert of the changed buckets and a delete of emptied ones.
+        """
+        student_ids = set(student_ids)
+        if not student_ids:
+            return
+        existing = {
+            (row.student_id, row.level, row.semester): row
+            for row in self.filter(student_id__in=student_ids)
+        }
+        to_update = []
+        to_create = []
+        for totals in self._live_totals(student_id__in=student_ids):
+            key = (
+                totals["student_id"],
+                totals["course__level"],
+                totals["course__semester"],
+            )
+            credits = totals["credits"] or 0
+            points = totals["points"] or Decimal("0.00")
+            row = existing.pop(key, None)
+            if row is None:
+                to_create.append(
+                    self.model(
+                        student_id=key[0],
+                        level=key[1],
+                        semester=key[2],
+                        credits=credits,
+                        points=points,
+                    )
+                )
+            elif row.credits != credits or row.points != points:
+                row.credits = credits
+                row.points = points
+                to_update.append(row)
 
-        if total_credits > 0:
-            gpa = total_points / Decimal(total_credits)
-            return round(gpa, 2)
-        return Decimal("0.00")
+        self.bulk_update(to_update, ["credits", "points"])
+        self.bulk_create(to_create)
+        if existing:
+            self.filter(pk__in=[row.pk for row in existing.values()]).delete()
 
-    def calculate_cgpa(self):
-        taken_courses = TakenCourse.objects.filter(student=self.student)
+    def rebuild(self, batch_size=1000):
+        """Drop every ledger row and recompute the whole ledger."""
+        self.all().delete()
+        batch = []
+        for totals in self._live_totals().iterator():
+            batch.append(
+                self.model(
+                    student_id=totals["student_id"],
+                    level=totals["course__level"],
+                    semester=totals["course__semester"],
+                    credits=totals["credits"] or 0,
+                    points=totals["points"] or Decimal("0.00"),
+                )
+            )
+            if len(batch) >= batch_size:
+                self.bulk_create(batch)
+                batch = []
+        self.bulk_create(batch)
+
+    def mismatches(self):
+        """
+        Compare the ledger against the live TakenCourse totals and return a
+        list of (student_id, level, semester, ledger, live) tuples that differ.
+        """
+        ledger = {
+            (row["student_id"], row["level"], row["semester"]): (
+                row["credits"],
+                row["points"],
+            )
+            for row in self.values(
+                "student_id", "level", "semester", "credits", "points"
+            )
+        }
+        differences = []
+        for totals in self._live_totals():
+            key = (
+                totals["student_id"],
+                totals["course__level"],
+                totals["course__semester"],
+            )
+            live = (totals["credits"] or 0, totals["points"] or Decimal("0.00"))
+            stored = ledger.pop(key, None)
+            if stored != live:
+                differences.append(key + (stored, live))
+        differences.extend(key + (stored, None) for key, stored in ledger.items())
+        return differences
+
+    def gpa(self, student, level, semester):
+        row = (
+            self.filter(student=student, level=level, semester=semester)
+            .values("credits", "points")
+            .first()
+        )
+        if row is None:
+            return Decimal("0.00")
+        return average_point(row["points"], row["credits"])
+
+    def cgpa(self, student):
+        totals = self.filter(student=student).aggregate(
+            credits=Sum("credits"), points=Sum("points")
+        )
+        return average_point(totals["points"] or 0, totals["credits"])
 
-        total_points = sum(tc.point for tc in taken_courses)
-        total_credits = sum(tc.course.credit for tc in taken_courses)
 
-        if total_credits > 0:
-            cgpa = total_points / Decimal(total_credits)
-            return round(cgpa, 2)
-        return Decimal("0.00")
+class GradeLedger(models.Model):
+    """
+    Materialized credit and grade point totals of a student for the courses
+    of one level and semester. GPA and CGPA are read from here instead of
+    being summed over every TakenCourse; the rows are kept up to date by the
+    TakenCourse/Course signals below and can be rebuilt with the
+    rebuild_grade_ledger management command.
+    """
+
+    student = models.ForeignKey(
+        Student, on_delete=models.CASCADE, related_name="grade_ledger"
+    )
+    level = models.CharField(max_length=25, choices=settings.LEVEL_CHOICES)
+    semester = models.CharField(max_length=200, choices=settings.SEMESTER_CHOICES)
+    credits = models.PositiveIntegerField(default=0)
+    points = models.DecimalField(
+        max_digits=9, decimal_places=2, default=Decimal("0.00")
+    )
+
+    objects = GradeLedgerManager()
+
+    class Meta:
+        unique_together = ("student", "level", "semester")
+
+    def __str__(self):
+        return f"{self.student} - {self.level} {self.semester}: {self.gpa}"
+
+    @property
+    def gpa(self):
+        return average_point(self.points, self.credits)
+
+
+@receiver(post_save, sender=TakenCourse)
+@receiver(post_delete, sender=TakenCourse)
+def refresh_grade_ledger(sender, instance, **kwargs):
+    GradeLedger.objects.refresh([instance.student_id])
+
+
+@receiver(post_save, sender=TakenCourse)
+@receiver(post_delete, sender=TakenCourse)
+def clear_taken_course_access(sender, instance, created=True, **kwargs):
+    if created:
+        clear_course_access(instance.student.student_id)
+
+
+@receiver(post_save, sender=Course)
+def refresh_course_grade_ledger(sender, instance, created, **kwargs):
+    # credit, level or semester of the course may have changed
+    if not created:
+        GradeLedger.objects.refresh(
+            instance.taken_courses.values_list("student_id", flat=True)
+        )
 
 
 class Result(models.Model):
@@ -1,3 +1,241 @@
-from django.test import TestCase
+from decimal import Decimal
+from unittest import mock
+from io import StringIO
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from accounts.models import User, Student
+from core.models import Session, Semester
+from course.models import Program, Course
+from .models import GradeLedger, TakenCourse, Result
+from . import utils
+from .utils import record_scores
+
+
+class RecordScoresTestCase(TestCase):
+    def setUp(self):
+        self.session = Session.objects.create(
+            session="2024/2025", is_current_session=True
+        )
+        self.semester = Semester.objects.create(
+            semester="First", is_current_semester=True, session=self.session
+        )
+        program = Program.objects.create(title="Computer Science")
+        self.course = Course.objects.create(
+            title="Algorithms",
+            code="CS301",
+            credit=3,
+            program=program,
+            level="Bachelor",
+            semester="First",
+        )
+        self.other_course = Course.objects.create(
+            title="Databases",
+            code="CS302",
+            credit=2,
+            program=program,
+            level="Bachelor",
+            semester="First",
+        )
+        self.taken_courses = []
+        for i in range(5):
+            user = User.objects.create(username=f"student{i}")
+            student = Student.objects.create(
+                student=user, level="Bachelor", program=program
+            )
+            TakenCourse.objects.create(student=student, course=self.other_course)
+            self.taken_courses.append(
+                TakenCourse.objects.create(student=student, course=self.course)
+            )
+
+    def test_scores_are_graded(self):
+        tc = self.taken_courses[0]
+        record_scores(
+            self.course,
+            {str(tc.pk): ["10", "20", "10", "5", "45"]},
+            self.session,
+            self.semester,
+        )
+        tc.refresh_from_db()
+        self.assertEqual(tc.total, Decimal("90"))
+        self.assertEqual(tc.grade, "A+")
+        self.assertEqual(tc.point, Decimal("12"))
+        self.assertEqual(tc.comment, "PASS")
+
+        result = Result.objects.get(student=tc.student)
+        self.assertEqual(result.semester, "First")
+        self.assertEqual(result.session, "2024/2025")
+        self.assertAlmostEqual(result.gpa, 2.4)
+        self.assertAlmostEqual(result.cgpa, 2.4)
+
+    def test_existing_result_is_updated(self):
+        tc = self.taken_courses[0]
+        scores = {str(tc.pk): ["0", "0", "0", "0", "40"]}
+        record_scores(self.course, scores, self.session, self.semester)
+        record_scores(self.course, scores, self.session, self.semester)
+        self.assertEqual(Result.objects.filter(student=tc.student).count(), 1)
+
+    def test_rows_of_other_courses_are_ignored(self):
+        tc = TakenCourse.objects.filter(course=self.other_course).first()
+        summary = record_scores(
+            self.course,
+            {str(tc.pk): ["10", "20", "10", "5", "45"]},
+            self.session,
+            self.semester,
+        )
+        self.assertEqual(summary["updated"], 0)
+        tc.refresh_from_db()
+        self.assertEqual(tc.total, Decimal("0"))
+
+    def test_query_count_does_not_grow_with_students(self):
+        for value in ("10", "20"):
+            scores = {str(tc.pk): [value] * 5 for tc in self.taken_courses}
+            summary = record_scores(self.course, scores, self.session, self.semester)
+        self.assertEqual(summary["updated"], 5)
+
+        single = record_scores(
+            self.course,
+            {str(self.taken_courses[0].pk): ["10"] * 5},
+            self.session,
+            self.semester,
+        )
+        self.assertEqual(summary["queries"], single["queries"])
+
+
+class GradeLedgerTestCase(TestCase):
+    def setUp(self):
+        program = Program.objects.create(title="Computer Science")
+        self.first = Course.objects.create(
+            title="Algorithms",
+            code="CS301",
+            credit=3,
+            program=program,
+            level="Bachelor",
+            semester="First",
+        )
+        self.second = Course.objects.create(
+            title="Compilers",
+            code="CS401",
+            credit=4,
+            program=program,
+            level="Bachelor",
+            semester="Second",
+        )
+        user = User.objects.create(username="student")
+        self.student = Student.objects.create(
+            student=user, level="Bachelor", program=program
+        )
+
+    def test_ledger_follows_taken_course_changes(self):
+        tc = TakenCourse.objects.create(
+            student=self.student, course=self.first, final_exam=Decimal("90")
+        )
+        TakenCourse.objects.create(
+            student=self.student, course=self.second, final_exam=Decimal("60")
+        )
+        self.assertEqual(
+            GradeLedger.objects.gpa(self.student, "Bachelor", "First"), Decimal("4.00")
+        )
+        self.assertEqual(GradeLedger.objects.cgpa(self.student), Decimal("3.14"))
+
+        tc.delete()
+        self.assertFalse(
+            GradeLedger.objects.filter(student=self.student, semester="First").exists()
+        )
+        self.assertEqual(GradeLedger.objects.cgpa(self.student), Decimal("2.50"))
+
+    def test_ledger_follows_course_credit_changes(self):
+        TakenCourse.objects.create(
+            student=self.student, course=self.first, final_exam=Decimal("90")
+        )
+        self.first.credit = 5
+        self.first.save()
+        row = GradeLedger.objects.get(student=self.student, semester="First")
+        self.assertEqual(row.credits, 5)
+
+    def test_rebuild_command(self):
+        TakenCourse.objects.create(
+            student=self.student, course=self.first, final_exam=Decimal("90")
+        )
+        GradeLedger.objects.all().delete()
+        self.assertEqual(len(GradeLedger.objects.mismatches()), 1)
+
+        call_command("rebuild_grade_ledger", stdout=StringIO())
+        self.assertEqual(GradeLedger.objects.mismatches(), [])
+
+
+@override_settings(LANGUAGE_CODE="en")
+class PdfViewsTestCase(TestCase):
+    def setUp(self):
+        session = Session.objects.create(session="2024/2025", is_current_session=True)
+        Semester.objects.create(
+            semester="First", is_current_semester=True, session=session
+        )
+        program = Program.objects.create(title="Computer Science")
+        self.course = Course.objects.create(
+            title="Algorithms",
+            code="CS301",
+            credit=3,
+            program=program,
+            level="Bachelor",
+            semester="First",
+        )
+        self.lecturer = User.objects.create_user(
+            username="lecturer", password="password", is_lecturer=True
+        )
+        self.student_user = User.objects.create_user(
+            username="student", password="password", is_student=True
+        )
+        student = Student.objects.create(
+            student=self.student_user, level="Bachelor", program=program
+        )
+        TakenCourse.objects.create(
+            student=student, course=self.course, final_exam=Decimal("30")
+        )
+
+    def test_result_sheet_pdf(self):
+        self.client.force_login(self.lecturer)
+        response = self.client.get(
+            reverse("result_sheet_pdf_view", kwargs={"id": self.course.pk})
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertTrue(response.getvalue().startswith(b"%PDF"))
+
+    def test_registration_form_pdf(self):
+        self.client.force_login(self.student_user)
+        response = self.client.get(reverse("course_registration_form"))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("inline", response["Content-Disposition"])
+        self.assertTrue(response.getvalue().startswith(b"%PDF"))
+
+    def test_large_pdfs_are_streamed_without_caching(self):
+        cache.clear()
+        self.client.force_login(self.lecturer)
+        url = reverse("result_sheet_pdf_view", kwargs={"id": self.course.pk})
+        with mock.patch.object(utils, "PDF_CACHE_MAX_SIZE", 0):
+            response = self.client.get(url)
+        self.assertTrue(response.streaming)
+        self.assertTrue(response.getvalue().startswith(b"%PDF"))
+        self.assertIsNone(cache.get(f"pdf:{response['ETag'][1:-1]}"))
+
+        response = self.client.get(url)
+        self.assertIsNotNone(cache.get(f"pdf:{response['ETag'][1:-1]}"))
+
+    def test_result_sheet_etag(self):
+        self.client.force_login(self.lecturer)
+        url = reverse("result_sheet_pdf_view", kwargs={"id": self.course.pk})
+        etag = self.client.get(url)["ETag"]
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        taken_course = TakenCourse.objects.get(course=self.course)
+        taken_course.final_exam = Decimal("60")
+        taken_course.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
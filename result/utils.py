@@ -0,0 +1,274 @@
+import hashlib
+import logging
+import tempfile
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from reportlab.platypus import SimpleDocTemplate
+
+from core.stats import mark_stale
+from core.utils import QueryCounter
+from course.models import Course
+from course.utils import clear_course_access
+from .models import GradeLedger, TakenCourse, Result, average_point
+
+logger = logging.getLogger(__name__)
+
+SCORE_FIELDS = ("assignment", "mid_exam", "quiz", "attendance", "final_exam")
+
+# PDFs smaller than this are rendered in memory, bigger ones spill to an
+# anonymous temporary file.
+PDF_SPOOL_MAX_SIZE = 5 * 1024 * 1024
+
+# Bump whenever the layout of a generated PDF changes so that cached copies
+# rendered with the old layout are no longer served.
+PDF_TEMPLATE_VERSION = 1
+PDF_CACHE_TIMEOUT = 60 * 60 * 24
+# Bigger PDFs are streamed from their spooled file on every request rather
+# than read into memory for the cache.
+PDF_CACHE_MAX_SIZE = 1024 * 1024
+
+
+def calculate_gpas(students, semester):
+    """
+    Return {student_id: (gpa, cgpa)} for the given students, read from their
+    GradeLedger rows with a single query.
+    """
+    levels = {student.pk: student.level for student in students}
+    totals = {student_id: [0, Decimal("0.00"), None] for student_id in levels}
+    for row in GradeLedger.objects.filter(student_id__in=levels):
+        student_totals = totals[row.student_id]
+        student_totals[0] += row.credits
+        student_totals[1] += row.points
+        if (
+            semester is not None
+            and row.level == levels[row.student_id]
+            and row.semester == semester.semester
+        ):
+            student_totals[2] = row.gpa
+
+    return {
+        student_id: (
+            gpa if gpa is not None else Decimal("0.00"),
+            average_point(points, credits),
+        )
+        for student_id, (credits, points, gpa) in totals.items()
+    }
+
+
+def record_scores(course, scores, session, semester):
+    """
+    Save the scores a lecturer submitted for one course in bulk.
+
+    `scores` maps a TakenCourse id to its five assessment values, in the order
+    of SCORE_FIELDS. Every affected TakenCourse is loaded with one query,
+    graded in memory, written with a single bulk_update, the students'
+    GradeLedger rows are refreshed in one pass and their Result rows are
+    updated from the ledger. Returns a dict
+    with the number of updated rows and the number of queries it took.
+    """
+    with QueryCounter() as counter, transaction.atomic():
+        taken_courses = list(
+            TakenCourse.objects.select_related("course", "student").filter(
+                pk__in=[int(pk) for pk in scores], course=course
+            )
+        )
+        for taken_course in taken_courses:
+            values = scores[str(taken_course.pk)]
+            for field, value in zip(SCORE_FIELDS, values):
+                setattr(taken_course, field, Decimal(value or "0"))
+            taken_course.calculate_grade()
+
+        TakenCourse.objects.bulk_update(
+            taken_courses, SCORE_FIELDS + ("total", "grade", "point", "comment")
+        )
+
+        students = {tc.student_id: tc.student for tc in taken_courses}
+        GradeLedger.objects.refresh(students)
+        update_results(students.values(), session, semester)
+        # bulk_update sends no signals
+        mark_stale("courses")
+
+    logger.info(
+        "Recorded %d scores for %s in %d queries (%.1f ms in the database)",
+        len(taken_courses),
+        course,
+        counter.count,
+        counter.duration * 1000,
+    )
+    return {"updated": len(taken_courses), "queries": counter.count}
+
+
+def register_courses(student, course_ids):
+    """
+    Register the student for the given courses with a single bulk_create.
+    Unknown ids are ignored and courses the student already took are skipped,
+    both found with one query each. Returns (registered, duplicates) lists
+    of courses.
+    """
+    course_ids = {int(pk) for pk in course_ids}
+    with transaction.atomic():
+        taken = set(
+            TakenCourse.objects.filter(
+                student=student, course_id__in=course_ids
+            ).values_list("course_id", flat=True)
+        )
+        courses = list(Course.objects.filter(pk__in=course_ids).order_by("pk"))
+        registered = [course for course in courses if course.pk not in taken]
+        duplicates = [course for course in courses if course.pk in taken]
+
+        taken_courses = [
+            TakenCourse(student=student, course=course) for course in registered
+        ]
+        for taken_course in taken_courses:
+            taken_course.calculate_grade()
+        TakenCourse.objects.bulk_create(taken_courses)
+        if taken_courses:
+            # bulk_create sends no signals
+            GradeLedger.objects.refresh([student.pk])
+            mark_stale("courses")
+    if registered:
+        clear_course_access(student.student_id)
+    return registered, duplicates
+
+
+def drop_courses(student, course_ids):
+    """
+    Delete the student's TakenCourse rows for the given courses with a single
+    query and refresh their grade ledger, course access and the statistics
+    once. Returns the number of courses dropped.
+    """
+    course_ids = [int(pk) for pk in course_ids]
+    with transaction.atomic():
+        taken_courses = TakenCourse.objects.filter(
+            student=student, course_id__in=course_ids
+        )
+        # nothing references TakenCourse, so the rows can go in one DELETE
+        # without the per-row post_delete receivers, whose work is done
+        # once below
+        dropped = taken_courses._raw_delete(taken_courses.db)
+        if dropped:
+            GradeLedger.objects.refresh([student.pk])
+            mark_stale("courses")
+    if dropped:
+        clear_course_access(student.student_id)
+    return dropped
+
+
+def update_results(students, session, semester):
+    """
+    Create or update the Result row of each student for the given session
+    and semester with freshly computed GPA and CGPA.
+    """
+    students = list(students)
+    if not students:
+        return
+    gpas = calculate_gpas(students, semester)
+    existing = {
+        (result.student_id, result.level): result
+        for result in Result.objects.filter(
+            student__in=students, semester=str(semester), session=str(session)
+        )
+    }
+
+    to_update = []
+    to_create = []
+    for student in students:
+        gpa, cgpa = gpas[student.pk]
+        result = existing.get((student.pk, student.level))
+        if result is None:
+            to_create.append(
+                Result(
+                    student=student,
+                    gpa=gpa,
+                    cgpa=cgpa,
+                    semester=str(semester),
+                    session=str(session),
+                    level=student.level,
+                )
+            )
+        else:
+            result.gpa = gpa
+            result.cgpa = cgpa
+            to_update.append(result)
+
+    Result.objects.bulk_update(to_update, ["gpa", "cgpa"])
+    Result.objects.bulk_create(to_create)
+
+
+class FlowableStream(list):
+    """
+    A ReportLab story that pulls its flowables from an iterable while the
+    document is being built, so only the next few flowables (e.g. one page of
+    table rows) are kept in memory instead of the whole story.
+    """
+
+    def __init__(self, flowables, lookahead=2):
+        super().__init__()
+        self._source = iter(flowables)
+        self._lookahead = lookahead
+
+    def __len__(self):
+        # ReportLab checks len(story) before consuming each flowable
+        while super().__len__() < self._lookahead:
+            try:
+                self.append(next(self._source))
+            except StopIteration:
+                break
+        return super().__len__()
+
+
+def build_pdf(flowables, **doc_kwargs):
+    """
+    Render the flowables into a spooled buffer and return it rewound, ready to
+    be streamed back with a FileResponse. Nothing is written to MEDIA_ROOT.
+    """
+    buffer = tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_MAX_SIZE)
+    SimpleDocTemplate(buffer, **doc_kwargs).build(FlowableStream(flowables))
+    buffer.seek(0)
+    return buffer
+
+
+def pdf_fingerprint(kind, *parts):
+    """
+    Hash everything a generated PDF is made of (its rows, the current session
+    and semester, the template version...) into a key. Any change to those
+    parts yields a new key, so cached PDFs never need explicit invalidation.
+    """
+    digest = hashlib.sha256(repr((kind, PDF_TEMPLATE_VERSION) + parts).encode())
+    return f"{kind}-{digest.hexdigest()}"
+
+
+def cached_pdf_response(request, fingerprint, filename, render):
+    """
+    Serve the PDF identified by `fingerprint` from the cache, calling
+    `render()` (which returns a file-like PDF) only on a cache miss. PDFs
+    above PDF_CACHE_MAX_SIZE are not cached but streamed each time. The
+    fingerprint doubles as the ETag so browsers revalidate with
+    If-None-Match and get a 304 when nothing changed.
+    """
+    etag = f'"{fingerprint}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        key = f"pdf:{fingerprint}"
+        content = cache.get(key)
+        if content is not None:
+            response = HttpResponse(content, content_type="application/pdf")
+            response["Content-Disposition"] = f'inline; filename="{filename}"'
+        else:
+            buffer = render()
+            buffer.seek(0, 2)
+            if buffer.tell() <= PDF_CACHE_MAX_SIZE:
+                buffer.seek(0)
+                cache.set(key, buffer.read(), PDF_CACHE_TIMEOUT)
+            buffer.seek(0)
+            response = FileResponse(
+                buffer, filename=filename, content_type="application/pdf"
+            )
+    response["ETag"] = etag
+    # the PDFs are personal, let browsers keep them but always revalidate
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -1,14 +1,12 @@
 from django.shortcuts import render, get_object_or_404
 from django.contrib import messages
-from django.http import HttpResponseRedirect
+from django.http import Http404, HttpResponseRedirect
 from django.urls import reverse_lazy
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.files.storage import FileSystemStorage
-from django.http import HttpResponse
+from django.db.models import Count, Q
 
 from reportlab.platypus import (
-    SimpleDocTemplate,
     Paragraph,
     Spacer,
     Table,
@@ -22,12 +20,12 @@ from reportlab.lib.enums import TA_JUSTIFY, TA_LEFT, TA_CENTER, TA_RIGHT
 from reportlab.lib.units import inch
 from reportlab.lib import colors
 
-from core.models import Session, Semester
+from core.models import get_academic_period
 from course.models import Course
 from accounts.models import Student
 from accounts.decorators import lecturer_required, student_required
 from .models import TakenCourse, Result
-
+from .utils import build_pdf, cached_pdf_response, pdf_fingerprint, record_scores
 
 CM = 2.54
 
@@ -42,10 +40,8 @@ def add_score(request):
     Shows a page where a lecturer will select a course allocated
     to him for score entry. in a specific semester and session
     """
-    current_session = Session.objects.filter(is_current_session=True).first()
-    current_semester = Semester.objects.filter(
-        is_current_semester=True, session=current_session
-    ).first()
+    period = get_academic_period()
+    current_session, current_semester = period.session, period.session_semester
 
     if not current_session or not current_semester:
         messages.error(request, "No active semester found.")
@@ -72,10 +68,10 @@ def add_score_for(request, id):
     Shows a page where a lecturer will add score for students that
     are taking courses allocated to him in a specific semester and session
     """
-    current_session = Session.objects.get(is_current_session=True)
-    current_semester = get_object_or_404(
-        Semester, is_current_semester=True, session=current_session
-    )
+    period = get_academic_period()
+    current_session, current_semester = period.session, period.session_semester
+    if not current_session or not current_semester:
+        raise Http404("No active semester found.")
     if request.method == "GET":
         courses = Course.objects.filter(
             allocated_course__lecturer__pk=request.user.id
@@ -95,6 +91,7 @@ def add_score_for(request, id):
             )
             .filter(course__id=id)
             .filter(course__semester=current_semester)
+            .select_related("student__student")
         )
         context = {
             "title": "Submit Score",
@@ -108,89 +105,12 @@ def add_score_for(request, id):
         return render(request, "result/add_score_for.html", context)
 
     if request.method == "POST":
-        ids = ()
         data = request.POST.copy()
         data.pop("csrfmiddlewaretoken", None)  # remove csrf_token
-        for key in data.keys():
-            ids = ids + (
-                str(key),
-            )  # gather all the all students id (i.e the keys) in a tuple
-        for s in range(
-            0, len(ids)
-        ):  # iterate over the list of student ids gathered above
-            student = TakenCourse.objects.get(id=ids[s])
-            # print(student)
-            # print(student.student)
-            # print(student.student.program.id)
-            courses = (
-                Course.objects.filter(level=student.student.level)
-                .filter(program__pk=student.student.program.id)
-                .filter(semester=current_semester)
-            )  # all courses of a specific level in current semester
-            total_credit_in_semester = 0
-            for i in courses:
-                if i == courses.count():
-                    break
-                total_credit_in_semester += int(i.credit)
-            score = data.getlist(
-                ids[s]
-            )  # get list of score for current student in the loop
-            assignment = score[
-                0
-            ]  # subscript the list to get the fisrt value > ca score
-            mid_exam = score[1]  # do the same for exam score
-            quiz = score[2]
-            attendance = score[3]
-            final_exam = score[4]
-            obj = TakenCourse.objects.get(pk=ids[s])  # get the current student data
-            obj.assignment = assignment  # set current student assignment score
-            obj.mid_exam = mid_exam  # set current student mid_exam score
-            obj.quiz = quiz  # set current student quiz score
-            obj.attendance = attendance  # set current student attendance score
-            obj.final_exam = final_exam  # set current student final_exam score
-
-            obj.total = obj.get_total()
-            obj.grade = obj.get_grade()
-
-            # obj.total = obj.get_total(assignment, mid_exam, quiz, attendance, final_exam)
-            # obj.grade = obj.get_grade(assignment, mid_exam, quiz, attendance, final_exam)
-
-            obj.point = obj.get_point()
-            obj.comment = obj.get_comment()
-            # obj.carry_over(obj.grade)
-            # obj.is_repeating()
-            obj.save()
-            gpa = obj.calculate_gpa()
-            cgpa = obj.calculate_cgpa()
-
-            try:
-                a = Result.objects.get(
-                    student=student.student,
-                    semester=current_semester,
-                    session=current_session,
-                    level=student.student.level,
-                )
-                a.gpa = gpa
-                a.cgpa = cgpa
-                a.save()
-            except:
-                Result.objects.get_or_create(
-                    student=student.student,
-                    gpa=gpa,
-                    semester=current_semester,
-                    session=current_session,
-                    level=student.student.level,
-                )
-
-            # try:
-            #     a = Result.objects.get(student=student.student,
-            # semester=current_semester, level=student.student.level)
-            #     a.gpa = gpa
-            #     a.cgpa = cgpa
-            #     a.save()
-            # except:
-            #     Result.objects.get_or_create(student=student.student, gpa=gpa,
-            # semester=current_semester, level=student.student.level)
+        # every key is a TakenCourse id holding the list of its five scores
+        scores = {key: data.getlist(key) for key in data.keys()}
+        course = get_object_or_404(Course, pk=id)
+        record_scores(course, scores, current_session, current_semester)
 
         messages.success(request, "Successfully Recorded! ")
         return HttpResponseRedirect(reverse_lazy("add_score_for", kwargs={"id": id}))
@@ -274,15 +194,73 @@ def assessment_result(request):
     return render(request, "result/assessment_results.html", context)
 
 
+# Number of students per table on the result sheet; each table fits on a
+# page, so ReportLab only holds one page of rows at a time.
+RESULT_SHEET_ROWS_PER_TABLE = 40
+
+
+def result_sheet_rows(results):
+    """Yield the result sheet table one page-sized chunk at a time."""
+    styles = getSampleStyleSheet()
+    header = ("S/N", "ID NO.", "FULL NAME", "TOTAL", "GRADE", "POINT", "COMMENT")
+    rows = [header]
+    for count, student in enumerate(results, start=1):
+        rows.append(
+            (
+                count,
+                student.student.student.username.upper(),
+                Paragraph(
+                    student.student.student.get_full_name.capitalize(), styles["Normal"]
+                ),
+                student.total,
+                student.grade,
+                student.point,
+                student.comment,
+            )
+        )
+        if len(rows) > RESULT_SHEET_ROWS_PER_TABLE:
+            yield result_sheet_table(rows)
+            rows = [header]
+    if len(rows) > 1:
+        yield result_sheet_table(rows)
+
+
+def result_sheet_table(rows):
+    table = Table(
+        rows,
+        colWidths=[inch],
+        rowHeights=[0.5 * inch] + [None] * (len(rows) - 1),
+        repeatRows=1,
+    )
+    style = [
+        ("BACKGROUND", (0, 0), (-1, 0), colors.black),
+        ("TEXTCOLOR", (1, 0), (-1, 0), colors.white),
+        ("TEXTCOLOR", (0, 0), (0, 0), colors.cyan),
+        ("ALIGN", (0, 0), (-1, 0), "CENTER"),
+        ("VALIGN", (0, 0), (-1, 0), "MIDDLE"),
+        ("BOX", (0, 0), (-1, 0), 1, colors.black),
+        ("INNERGRID", (0, 1), (-1, -1), 0.05, colors.black),
+        ("BOX", (0, 1), (-1, -1), 0.1, colors.black),
+    ]
+    for index, row in enumerate(rows[1:], start=1):
+        if row[4] == "F":
+            style.append(("TEXTCOLOR", (0, index), (-1, index), colors.red))
+    table.setStyle(TableStyle(style))
+    return table
+
+
 @login_required
 @lecturer_required
 def result_sheet_pdf_view(request, id):
-    current_semester = Semester.objects.get(is_current_semester=True)
-    current_session = Session.objects.get(is_current_session=True)
-    result = TakenCourse.objects.filter(course__pk=id)
+    current_session, current_semester = get_academic_period()
+    if not current_session or not current_semester:
+        raise Http404("No active semester found.")
     course = get_object_or_404(Course, id=id)
-    no_of_pass = TakenCourse.objects.filter(course__pk=id, comment="PASS").count()
-    no_of_fail = TakenCourse.objects.filter(course__pk=id, comment="FAIL").count()
+    result = (
+        TakenCourse.objects.filter(course=course)
+        .select_related("student__student")
+        .order_by("pk")
+    )
     fname = (
         str(current_semester)
         + "_semester_"
@@ -292,173 +270,114 @@ def result_sheet_pdf_view(request, id):
         + "_resultSheet.pdf"
     )
     fname = fname.replace("/", "-")
-    flocation = settings.MEDIA_ROOT + "/result_sheet/" + fname
-
-    doc = SimpleDocTemplate(
-        flocation,
-        rightMargin=0,
-        leftMargin=6.5 * CM,
-        topMargin=0.3 * CM,
-        bottomMargin=0,
-    )
-    styles = getSampleStyleSheet()
-    styles.add(
-        ParagraphStyle(name="ParagraphTitle", fontSize=11, fontName="FreeSansBold")
-    )
-    Story = [Spacer(1, 0.2)]
-    style = styles["Normal"]
-
-    # picture = request.user.picture
-    # l_pic = Image(picture, 1*inch, 1*inch)
-    # l_pic.__setattr__("_offs_x", 200)
-    # l_pic.__setattr__("_offs_y", -130)
-    # Story.append(l_pic)
-
-    # logo = settings.MEDIA_ROOT + "/logo/logo-mini.png"
-    # im_logo = Image(logo, 1*inch, 1*inch)
-    # im_logo.__setattr__("_offs_x", -218)
-    # im_logo.__setattr__("_offs_y", -60)
-    # Story.append(im_logo)
-
-    print("\nsettings.MEDIA_ROOT", settings.MEDIA_ROOT)
-    print("\nsettings.STATICFILES_DIRS[0]", settings.STATICFILES_DIRS[0])
-    logo = settings.STATICFILES_DIRS[0] + "/img/brand.png"
-    im = Image(logo, 1 * inch, 1 * inch)
-    im.__setattr__("_offs_x", -200)
-    im.__setattr__("_offs_y", -45)
-    Story.append(im)
-
-    style = getSampleStyleSheet()
-    normal = style["Normal"]
-    normal.alignment = TA_CENTER
-    normal.fontName = "Helvetica"
-    normal.fontSize = 12
-    normal.leading = 15
-    title = (
-        "<b> "
-        + str(current_semester)
-        + " Semester "
-        + str(current_session)
-        + " Result Sheet</b>"
-    )
-    title = Paragraph(title.upper(), normal)
-    Story.append(title)
-    Story.append(Spacer(1, 0.1 * inch))
-
-    style = getSampleStyleSheet()
-    normal = style["Normal"]
-    normal.alignment = TA_CENTER
-    normal.fontName = "Helvetica"
-    normal.fontSize = 10
-    normal.leading = 15
-    title = "<b>Course lecturer: " + request.user.get_full_name + "</b>"
-    title = Paragraph(title.upper(), normal)
-    Story.append(title)
-    Story.append(Spacer(1, 0.1 * inch))
-
-    normal = style["Normal"]
-    normal.alignment = TA_CENTER
-    normal.fontName = "Helvetica"
-    normal.fontSize = 10
-    normal.leading = 15
-    level = result.filter(course_id=id).first()
-    title = "<b>Level: </b>" + str(level.course.level)
-    title = Paragraph(title.upper(), normal)
-    Story.append(title)
-    Story.append(Spacer(1, 0.6 * inch))
 
-    elements = []
-    count = 0
-    header = [("S/N", "ID NO.", "FULL NAME", "TOTAL", "GRADE", "POINT", "COMMENT")]
+    styles = getSampleStyleSheet()
 
-    table_header = Table(header, [inch], [0.5 * inch])
-    table_header.setStyle(
-        TableStyle(
-            [
-                ("BACKGROUND", (0, 0), (-1, -1), colors.black),
-                ("TEXTCOLOR", (1, 0), (-1, -1), colors.white),
-                ("TEXTCOLOR", (0, 0), (0, 0), colors.cyan),
-                ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-                ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-                ("BOX", (0, 0), (-1, -1), 1, colors.black),
-            ]
+    def story():
+        yield Spacer(1, 0.2)
+
+        logo = settings.STATICFILES_DIRS[0] + "/img/brand.png"
+        im = Image(logo, 1 * inch, 1 * inch)
+        im.__setattr__("_offs_x", -200)
+        im.__setattr__("_offs_y", -45)
+        yield im
+
+        style = getSampleStyleSheet()
+        normal = style["Normal"]
+        normal.alignment = TA_CENTER
+        normal.fontName = "Helvetica"
+        normal.fontSize = 12
+        normal.leading = 15
+        title = (
+            "<b> "
+            + str(current_semester)
+            + " Semester "
+            + str(current_session)
+            + " Result Sheet</b>"
         )
-    )
-    Story.append(table_header)
-
-    for student in result:
-        data = [
-            (
-                count + 1,
-                student.student.student.username.upper(),
+        yield Paragraph(title.upper(), normal)
+        yield Spacer(1, 0.1 * inch)
+
+        style = getSampleStyleSheet()
+        normal = style["Normal"]
+        normal.alignment = TA_CENTER
+        normal.fontName = "Helvetica"
+        normal.fontSize = 10
+        normal.leading = 15
+        title = "<b>Course lecturer: " + request.user.get_full_name + "</b>"
+        yield Paragraph(title.upper(), normal)
+        yield Spacer(1, 0.1 * inch)
+
+        title = "<b>Level: </b>" + str(course.level)
+        yield Paragraph(title.upper(), normal)
+        yield Spacer(1, 0.6 * inch)
+
+        # rows are read in chunks and laid out one page-sized table at a time
+        yield from result_sheet_rows(result.iterator(chunk_size=500))
+
+        yield Spacer(1, 1 * inch)
+        summary = result.aggregate(
+            no_of_pass=Count("pk", filter=Q(comment="PASS")),
+            no_of_fail=Count("pk", filter=Q(comment="FAIL")),
+        )
+        style_right = ParagraphStyle(
+            name="right", parent=styles["Normal"], alignment=TA_RIGHT
+        )
+        tbl_data = [
+            [
                 Paragraph(
-                    student.student.student.get_full_name.capitalize(), styles["Normal"]
+                    "<b>Date:</b>_____________________________", styles["Normal"]
                 ),
-                student.total,
-                student.grade,
-                student.point,
-                student.comment,
-            )
+                Paragraph(
+                    "<b>No. of PASS:</b> " + str(summary["no_of_pass"]), style_right
+                ),
+            ],
+            [
+                Paragraph(
+                    "<b>Siganture / Stamp:</b> _____________________________",
+                    styles["Normal"],
+                ),
+                Paragraph(
+                    "<b>No. of FAIL: </b>" + str(summary["no_of_fail"]), style_right
+                ),
+            ],
         ]
-        color = colors.black
-        if student.grade == "F":
-            color = colors.red
-        count += 1
-
-        t_body = Table(data, colWidths=[inch])
-        t_body.setStyle(
-            TableStyle(
-                [
-                    ("INNERGRID", (0, 0), (-1, -1), 0.05, colors.black),
-                    ("BOX", (0, 0), (-1, -1), 0.1, colors.black),
-                ]
+        yield Table(tbl_data)
+
+    fingerprint = pdf_fingerprint(
+        "result-sheet",
+        str(current_semester),
+        str(current_session),
+        str(course),
+        course.level,
+        request.user.get_full_name,
+        list(
+            result.values_list(
+                "pk",
+                "total",
+                "grade",
+                "point",
+                "comment",
+                "student__student__username",
+                "student__student__first_name",
+                "student__student__last_name",
             )
-        )
-        Story.append(t_body)
-
-    Story.append(Spacer(1, 1 * inch))
-    style_right = ParagraphStyle(
-        name="right", parent=styles["Normal"], alignment=TA_RIGHT
+        ),
     )
-    tbl_data = [
-        [
-            Paragraph("<b>Date:</b>_____________________________", styles["Normal"]),
-            Paragraph("<b>No. of PASS:</b> " + str(no_of_pass), style_right),
-        ],
-        [
-            Paragraph(
-                "<b>Siganture / Stamp:</b> _____________________________",
-                styles["Normal"],
-            ),
-            Paragraph("<b>No. of FAIL: </b>" + str(no_of_fail), style_right),
-        ],
-    ]
-    tbl = Table(tbl_data)
-    Story.append(tbl)
 
-    doc.build(Story)
+    def render():
+        return build_pdf(
+            story(),
+            rightMargin=0,
+            leftMargin=6.5 * CM,
+            topMargin=0.3 * CM,
+            bottomMargin=0,
+        )
 
-    fs = FileSystemStorage(settings.MEDIA_ROOT + "/result_sheet")
-    with fs.open(fname) as pdf:
-        response = HttpResponse(pdf, content_type="application/pdf")
-        response["Content-Disposition"] = "inline; filename=" + fname + ""
-        return response
-    return response
+    return cached_pdf_response(request, fingerprint, fname, render)
 
 
-@login_required
-@student_required
-def course_registration_form(request):
-    current_session = Session.objects.get(is_current_session=True)
-    courses = TakenCourse.objects.filter(student__student__id=request.user.id)
-    fname = request.user.username + ".pdf"
-    fname = fname.replace("/", "-")
-    # flocation = '/tmp/' + fname
-    # print(MEDIA_ROOT + "\\" + fname)
-    flocation = settings.MEDIA_ROOT + "/registration_form/" + fname
-    doc = SimpleDocTemplate(
-        flocation, rightMargin=15, leftMargin=15, topMargin=0, bottomMargin=0
-    )
+def registration_form_story(user, student, current_session, courses):
     styles = getSampleStyleSheet()
 
     Story = [Spacer(1, 0.5)]
@@ -504,18 +423,17 @@ def course_registration_form(request):
     title = "<b><u>STUDENT COURSE REGISTRATION FORM</u></b>"
     title = Paragraph(title.upper(), normal)
     Story.append(title)
-    student = Student.objects.get(student__pk=request.user.id)
 
     tbl_data = [
         [
             Paragraph(
-                "<b>Registration Number : " + request.user.username.upper() + "</b>",
+                "<b>Registration Number : " + user.username.upper() + "</b>",
                 styles["Normal"],
             )
         ],
         [
             Paragraph(
-                "<b>Name : " + request.user.get_full_name.upper() + "</b>",
+                "<b>Name : " + user.get_full_name.upper() + "</b>",
                 styles["Normal"],
             )
         ],
@@ -713,10 +631,9 @@ def course_registration_form(request):
     certification.fontName = "Helvetica"
     certification.fontSize = 8
     certification.leading = 18
-    student = Student.objects.get(student__pk=request.user.id)
     certification_text = (
         "CERTIFICATION OF REGISTRATION: I certify that <b>"
-        + str(request.user.get_full_name.upper())
+        + str(user.get_full_name.upper())
         + "</b>\
     has been duly registered for the <b>"
         + student.level
@@ -735,16 +652,47 @@ def course_registration_form(request):
     setattr(im_logo, "_offs_y", 480)
     Story.append(im_logo)
 
-    picture = settings.BASE_DIR + request.user.get_picture()
+    picture = settings.BASE_DIR + user.get_picture()
     im = Image(picture, 1.0 * inch, 1.0 * inch)
     setattr(im, "_offs_x", 218)
     setattr(im, "_offs_y", 550)
     Story.append(im)
 
-    doc.build(Story)
-    fs = FileSystemStorage(settings.MEDIA_ROOT + "/registration_form")
-    with fs.open(fname) as pdf:
-        response = HttpResponse(pdf, content_type="application/pdf")
-        response["Content-Disposition"] = "inline; filename=" + fname + ""
-        return response
-    return response
+    return Story
+
+
+@login_required
+@student_required
+def course_registration_form(request):
+    current_session = get_academic_period().session
+    if not current_session:
+        raise Http404("No active session found.")
+    student = get_object_or_404(Student, student__pk=request.user.id)
+    courses = TakenCourse.objects.filter(student=student).select_related("course")
+    fname = request.user.username + ".pdf"
+    fname = fname.replace("/", "-")
+    fingerprint = pdf_fingerprint(
+        "registration-form",
+        str(current_session),
+        request.user.username,
+        request.user.get_full_name,
+        str(request.user.picture),
+        student.level,
+        list(
+            courses.values_list(
+                "pk",
+                "course__code",
+                "course__title",
+                "course__credit",
+                "course__semester",
+            )
+        ),
+    )
+
+    def render():
+        story = registration_form_story(request.user, student, current_session, courses)
+        return build_pdf(
+            story, rightMargin=15, leftMargin=15, topMargin=0, bottomMargin=0
+        )
+
+    return cached_pdf_response(request, fingerprint, fname, render)
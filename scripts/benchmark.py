@@ -0,0 +1,282 @@
+"""
+Performance regression benchmarks.
+
+Seeds a fresh test database with scripts.bulk_seed at one of the SCALES
+below, then requests the key pages (score entry, grade result,
+search, quiz taking, course registration and the PDF exports) with the
+Django test client and records, per scenario, the number of SQL queries and
+the median wall time. The figures are compared with the baseline stored in
+benchmark_baseline.json; scripts/tests.py runs the "small" scale so that a
+query count regression fails the test suite. Timings depend on the machine,
+the test only compares them when BENCHMARK_TIMING is set in the environment.
+
+    python manage.py benchmark --scale small
+    python manage.py benchmark --scale full --update
+
+--update stores the measured figures as the new baseline of that scale.
+"""
+
+import json
+import statistics
+import time
+from collections import namedtuple
+from pathlib import Path
+
+from django.core.cache import cache
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.test.runner import DiscoverRunner
+from django.urls import reverse
+
+from accounts.models import Student
+from core.models import Semester, Session
+from core.utils import QueryCounter
+from course.models import Course, CourseAllocation
+from quiz.models import Choice, MCQuestion, Quiz, Sitting
+from result.models import Result, TakenCourse
+
+from .bulk_seed import seed_database
+
+BASELINE_PATH = Path(__file__).with_name("benchmark_baseline.json")
+
+# row counts passed to scripts.bulk_seed.seed_database
+SCALES = {
+    "small": {
+        "programs": 4,
+        "courses": 40,
+        "lecturers": 10,
+        "students": 200,
+        "parents": 20,
+        "taken_courses": 2000,
+        "uploads": 40,
+        "upload_videos": 10,
+        "news": 10,
+    },
+    "full": {
+        "programs": 40,
+        "courses": 2000,
+        "lecturers": 500,
+        "students": 20000,
+        "parents": 2000,
+        "taken_courses": 500000,
+        "uploads": 4000,
+        "upload_videos": 1000,
+        "news": 100,
+    },
+}
+QUIZ_QUESTIONS = 20
+# measured runs of each scenario, after one warm-up run
+REPEAT = 5
+# a scenario regresses when it runs more queries than its baseline or takes
+# longer than TIME_TOLERANCE times its baseline plus TIME_SLACK_MS
+TIME_TOLERANCE = 3
+TIME_SLACK_MS = 50
+
+BENCHMARK_SETTINGS = {
+    "LANGUAGE_CODE": "en",
+    "STATICFILES_STORAGE": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    "REQUEST_METRICS_SAMPLE_RATE": 0,
+    "REQUEST_METRICS_SLOW_MS": None,
+}
+
+# `data` and `before` are called with the seeded data before each run, out
+# of the measured time
+Scenario = namedtuple("Scenario", "name user method url data before")
+Scenario.__new__.__defaults__ = ("get", None, None, None)
+
+SeedData = namedtuple(
+    "SeedData", "lecturer student course quiz answers session semester"
+)
+
+
+def seed(scale):
+    """
+    Fill the database with the volumes of the given scale and return the
+    objects the scenarios need.
+    """
+    seed_database(SCALES[scale], seed=0, stdout=lambda message: None)
+    session = Session.objects.get(is_current_session=True)
+    semester = Semester.objects.get(is_current_semester=True)
+    course = Course.objects.filter(semester=semester.semester).order_by("pk").first()
+    lecturer = CourseAllocation.objects.filter(courses=course).first().lecturer
+    student = Student.objects.select_related("student").order_by("pk").first()
+    Result.objects.create(
+        student=student,
+        gpa=2.5,
+        cgpa=2.5,
+        semester=semester.semester,
+        session=str(session),
+        level=student.level,
+    )
+
+    quiz = Quiz.objects.create(course=course, title="Benchmark quiz")
+    answers = {}
+    for i in range(QUIZ_QUESTIONS):
+        question = MCQuestion.objects.create(content=f"Question {i}")
+        question.quiz.add(quiz)
+        answers[question.pk] = Choice.objects.create(
+            question=question, choice_text="Yes", correct=True
+        ).pk
+        Choice.objects.create(question=question, choice_text="No", correct=False)
+
+    return SeedData(lecturer, student.student, course, quiz, answers, session, semester)
+
+
+def score_form_data(data):
+    return {
+        str(pk): ["5", "10", "5", "5", "30"]
+        for pk in TakenCourse.objects.filter(course=data.course).values_list(
+            "pk", flat=True
+        )
+    }
+
+
+def quiz_answer_data(data):
+    sitting = Sitting.objects.get(user=data.student, quiz=data.quiz)
+    question_id = sitting.question_order[sitting.current_position]
+    return {"answers": data.answers[question_id]}
+
+
+def scenarios(data):
+    quiz_url = reverse(
+        "quiz_take", kwargs={"pk": data.course.pk, "slug": data.quiz.slug}
+    )
+    return [
+        Scenario(
+            "score_entry_form",
+            data.lecturer,
+            url=reverse("add_score_for", kwargs={"id": data.course.pk}),
+        ),
+        Scenario(
+            "score_entry_submit",
+            data.lecturer,
+            "post",
+            reverse("add_score_for", kwargs={"id": data.course.pk}),
+            data=score_form_data,
+        ),
+        Scenario("grade_result", data.student, url=reverse("grade_results")),
+        Scenario(
+            "search",
+            data.student,
+            url=reverse("query") + "?q=" + data.course.title.split()[0],
+        ),
+        Scenario("quiz_take", data.student, url=quiz_url),
+        Scenario("quiz_answer", data.student, "post", quiz_url, data=quiz_answer_data),
+        Scenario(
+            "course_registration", data.student, url=reverse("course_registration")
+        ),
+        Scenario(
+            "result_sheet_pdf",
+            data.lecturer,
+            url=reverse("result_sheet_pdf_view", kwargs={"id": data.course.pk}),
+            # measure the rendering, not the PDF cache
+            before=lambda data: cache.clear(),
+        ),
+        Scenario(
+            "registration_form_pdf",
+            data.student,
+            url=reverse("course_registration_form"),
+            before=lambda data: cache.clear(),
+        ),
+    ]
+
+
+def measure(data, scenario, repeat=REPEAT):
+    """Return the query count and median wall time (ms) of a scenario."""
+    client = Client()
+    client.force_login(scenario.user)
+    request = getattr(client, scenario.method)
+    runs = []
+    for _ in range(repeat + 1):
+        if scenario.before:
+            scenario.before(data)
+        post_data = scenario.data(data) if scenario.data else None
+        with QueryCounter() as counter:
+            start = time.perf_counter()
+            response = request(scenario.url, post_data)
+            if response.streaming:
+                b"".join(response.streaming_content)
+            elapsed = time.perf_counter() - start
+        if response.status_code >= 400:
+            raise AssertionError(
+                f"{scenario.name}: {scenario.url} returned {response.status_code}"
+            )
+        runs.append((counter.count, elapsed * 1000))
+    runs = runs[1:]
+    return {
+        "queries": max(count for count, _ in runs),
+        "time_ms": round(statistics.median(elapsed for _, elapsed in runs), 2),
+    }
+
+
+def run_benchmarks(data):
+    with override_settings(**BENCHMARK_SETTINGS):
+        cache.clear()
+        return {scenario.name: measure(data, scenario) for scenario in scenarios(data)}
+
+
+def load_baseline(scale):
+    if not BASELINE_PATH.exists():
+        return {}
+    return json.loads(BASELINE_PATH.read_text()).get(scale, {})
+
+
+def save_baseline(scale, results):
+    baseline = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+    baseline[scale] = results
+    BASELINE_PATH.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+
+
+def regressions(results, baseline, timing=True):
+    """
+    Return a message for every scenario that got worse than its baseline,
+    in queries or, if `timing` is true, in wall time.
+    """
+    messages = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        if result["queries"] > expected["queries"]:
+            messages.append(
+                f"{name}: {result['queries']} queries, baseline {expected['queries']}"
+            )
+        limit = expected["time_ms"] * TIME_TOLERANCE + TIME_SLACK_MS
+        if timing and result["time_ms"] > limit:
+            messages.append(
+                f"{name}: {result['time_ms']:.0f} ms, "
+                f"baseline {expected['time_ms']:.0f} ms"
+            )
+    return messages
+
+
+def run(scale="small", update=False, stdout=print):
+    """
+    Seed a throw-away test database, run the benchmarks and either store
+    them as the new baseline or return the regressions against it.
+    """
+    setup_test_environment()
+    runner = DiscoverRunner(verbosity=0)
+    old_config = runner.setup_databases()
+    try:
+        start = time.perf_counter()
+        data = seed(scale)
+        stdout(f"Seeded the {scale} data set in {time.perf_counter() - start:.1f}s")
+        results = run_benchmarks(data)
+    finally:
+        runner.teardown_databases(old_config)
+        teardown_test_environment()
+
+    baseline = load_baseline(scale)
+    for name, result in results.items():
+        expected = baseline.get(name, {})
+        stdout(
+            f"{name:25} {result['queries']:5} queries {result['time_ms']:10.2f} ms"
+            f"   (baseline {expected.get('queries', '-')} queries,"
+            f" {expected.get('time_ms', '-')} ms)"
+        )
+    if update:
+        save_baseline(scale, results)
+        stdout(f"Saved the {scale} baseline to {BASELINE_PATH.name}")
+        return []
+    return regressions(results, baseline)
@@ -0,0 +1,253 @@
+"""
+High-volume seeding.
+
+The generate_fake_* scripts save their objects one at a time, so every row
+goes through its post_save receivers (activity log, credential email, slug
+lookup, search index, grade ledger...). That is fine for a few hundred rows
+but takes hours for a load-test sized database.
+
+`seed_database` builds the same factories in memory and writes them with
+bulk_create in batches. bulk_create sends no signals; slugs are computed up
+front and the data the receivers would have maintained (grade ledger,
+search index, dashboard statistics) is rebuilt once at the end. With the
+same `seed` the generated data is the same.
+
+    python manage.py seed_fake_data --students 20000 --taken-courses 500000
+"""
+
+import math
+import random
+from decimal import Decimal
+
+import factory.random
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils.text import slugify
+from factory import Iterator, LazyAttribute, Sequence
+from faker import Faker
+
+from accounts.models import Parent, Student, User
+from core.models import NewsAndEvents, Semester, Session
+from core.stats import SECTIONS, mark_stale
+from course.models import Course, CourseAllocation, Program, Upload, UploadVideo
+from result.models import GradeLedger, TakenCourse
+from search.index import rebuild_index
+
+from .generate_fake_accounts_data import ParentFactory, StudentFactory, UserFactory
+from .generate_fake_core_data import NewsAndEventsFactory
+from .generate_fake_data import (
+    CourseFactory,
+    ProgramFactory,
+    UploadFactory,
+    UploadVideoFactory,
+)
+
+DEFAULT_COUNTS = {
+    "programs": 10,
+    "courses": 200,
+    "lecturers": 50,
+    "students": 2000,
+    "parents": 200,
+    "taken_courses": 20000,
+    "uploads": 200,
+    "upload_videos": 50,
+    "news": 20,
+}
+BATCH_SIZE = 2000
+FACTORIES = (
+    ProgramFactory,
+    CourseFactory,
+    UserFactory,
+    StudentFactory,
+    ParentFactory,
+    UploadFactory,
+    UploadVideoFactory,
+    NewsAndEventsFactory,
+)
+PASSWORD = "password"
+
+fake = Faker()
+phone = LazyAttribute(lambda x: fake.numerify("09#########"))
+
+
+def bulk_create(model, objects):
+    return model.objects.bulk_create(objects, batch_size=BATCH_SIZE)
+
+
+def build_users(count, prefix, **kwargs):
+    return UserFactory.build_batch(
+        count,
+        username=Sequence(lambda n: f"{prefix}-{n}"),
+        phone=phone,
+        **kwargs,
+    )
+
+
+def taken_course_pairs(students, courses, count, rng):
+    """
+    Spread `count` registrations over the students, each student taking
+    distinct courses starting from a random offset.
+    """
+    per_student = min(math.ceil(count / len(students)), len(courses))
+    for student in students:
+        offset = rng.randrange(len(courses))
+        for i in range(per_student):
+            if count <= 0:
+                return
+            yield student, courses[(offset + i) % len(courses)]
+            count -= 1
+
+
+def seed_database(counts=None, seed=0, stdout=print):
+    """
+    Create the given number of rows per model (see DEFAULT_COUNTS) plus a
+    current session and semester. Returns {model name: rows created}.
+    """
+    counts = {**DEFAULT_COUNTS, **(counts or {})}
+    rng = random.Random(seed)
+    Faker.seed(seed)
+    factory.random.reseed_random(seed)
+    for factory_class in FACTORIES:
+        factory_class.reset_sequence()
+    password = make_password(PASSWORD, salt=f"seed{seed}")
+    created = {}
+
+    with transaction.atomic():
+        session = Session.objects.create(
+            session=f"seed-{seed}", is_current_session=True
+        )
+        Session.objects.exclude(pk=session.pk).update(is_current_session=False)
+        Semester.objects.update(is_current_semester=False)
+        Semester.objects.create(
+            semester="First", is_current_semester=True, session=session
+        )
+
+        programs = bulk_create(
+            Program,
+            ProgramFactory.build_batch(
+                counts["programs"], title=Sequence(lambda n: f"Program {seed}-{n}")
+            ),
+        )
+        courses = bulk_create(
+            Course,
+            CourseFactory.build_batch(
+                counts["courses"],
+                program=Iterator(programs),
+                code=Sequence(lambda n: f"S{seed}-{n:05d}"),
+                slug=LazyAttribute(lambda course: slugify(course.code)),
+                level=Iterator(["Bachelor", "Master"]),
+            ),
+        )
+
+        lecturers = bulk_create(
+            User,
+            build_users(
+                counts["lecturers"], f"lec-{seed}", is_lecturer=True, password=password
+            ),
+        )
+        student_users = bulk_create(
+            User,
+            build_users(
+                counts["students"], f"ugr-{seed}", is_student=True, password=password
+            ),
+        )
+        students = bulk_create(
+            Student,
+            StudentFactory.build_batch(
+                counts["students"],
+                student=Iterator(student_users),
+                program=Iterator(programs),
+                level=Iterator(["Bachelor", "Master"]),
+            ),
+        )
+        parent_count = min(counts["parents"], len(students))
+        parent_users = bulk_create(
+            User,
+            build_users(parent_count, f"par-{seed}", is_parent=True, password=password),
+        )
+        bulk_create(
+            Parent,
+            ParentFactory.build_batch(
+                parent_count,
+                user=Iterator(parent_users),
+                student=Iterator(students),
+                phone=phone,
+            ),
+        )
+
+        if lecturers and courses:
+            allocations = bulk_create(
+                CourseAllocation,
+                [
+                    CourseAllocation(lecturer=lecturer, session=session)
+                    for lecturer in lecturers
+                ],
+            )
+            Through = CourseAllocation.courses.through
+            bulk_create(
+                Through,
+                [
+                    Through(
+                        courseallocation=allocations[i % len(allocations)],
+                        course=course,
+                    )
+                    for i, course in enumerate(courses)
+                ],
+            )
+
+        batch = []
+        taken_courses = 0
+        if students and courses:
+            for student, course in taken_course_pairs(
+                students, courses, counts["taken_courses"], rng
+            ):
+                taken_course = TakenCourse(
+                    student=student,
+                    course=course,
+                    assignment=Decimal(rng.randint(0, 10)),
+                    mid_exam=Decimal(rng.randint(0, 20)),
+                    quiz=Decimal(rng.randint(0, 10)),
+                    attendance=Decimal(rng.randint(0, 10)),
+                    final_exam=Decimal(rng.randint(0, 50)),
+                )
+                taken_course.calculate_grade()
+                batch.append(taken_course)
+                if len(batch) >= BATCH_SIZE:
+                    taken_courses += len(TakenCourse.objects.bulk_create(batch))
+                    batch = []
+            taken_courses += len(TakenCourse.objects.bulk_create(batch))
+
+        if courses:
+            bulk_create(
+                Upload,
+                UploadFactory.build_batch(counts["uploads"], course=Iterator(courses)),
+            )
+            bulk_create(
+                UploadVideo,
+                UploadVideoFactory.build_batch(
+                    counts["upload_videos"],
+                    course=Iterator(courses),
+                    slug=Sequence(lambda n: f"video-{seed}-{n}"),
+                ),
+            )
+        bulk_create(NewsAndEvents, NewsAndEventsFactory.build_batch(counts["news"]))
+
+        created = {
+            "programs": len(programs),
+            "courses": len(courses),
+            "lecturers": len(lecturers),
+            "students": len(students),
+            "parents": parent_count,
+            "taken_courses": taken_courses,
+            "uploads": counts["uploads"] if courses else 0,
+            "upload_videos": counts["upload_videos"] if courses else 0,
+            "news": counts["news"],
+        }
+        for name, count in created.items():
+            stdout(f"Created {count} {name.replace('_', ' ')}.")
+
+        # what the skipped receivers would have maintained
+        GradeLedger.objects.rebuild()
+        rebuild_index()
+        mark_stale(*SECTIONS)
+    return created
@@ -0,0 +1,96 @@
+import os
+
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+
+from accounts.models import Parent, Student, User
+from core.models import ActivityLog, OutboxEmail
+from core.utils import QueryCounter
+from course.models import Course, CourseAllocation
+from result.models import GradeLedger, TakenCourse
+from search.models import SearchEntry
+from .benchmark import load_baseline, regressions, run_benchmarks, seed
+from .bulk_seed import seed_database
+
+
+class BenchmarkTestCase(TransactionTestCase):
+    # not wrapped in a transaction, so the query counts match the ones of
+    # `manage.py benchmark` that the baseline was recorded with
+
+    def test_no_regressions(self):
+        results = run_benchmarks(seed("small"))
+        baseline = load_baseline("small")
+        self.assertEqual(set(results), set(baseline))
+        # wall times vary from one machine to the next, opt in to compare them
+        timing = bool(os.environ.get("BENCHMARK_TIMING"))
+        self.assertEqual(regressions(results, baseline, timing=timing), [])
+
+    def test_timing_is_opt_in(self):
+        baseline = {"page": {"queries": 5, "time_ms": 1}}
+        results = {"page": {"queries": 5, "time_ms": 1000}}
+        self.assertEqual(regressions(results, baseline, timing=False), [])
+        self.assertEqual(len(regressions(results, baseline)), 1)
+        results["page"]["queries"] = 6
+        self.assertEqual(
+            regressions(results, baseline, timing=False),
+            ["page: 6 queries, baseline 5"],
+        )
+
+
+class BulkSeedTestCase(TestCase):
+    counts = {
+        "programs": 2,
+        "courses": 6,
+        "lecturers": 2,
+        "students": 10,
+        "parents": 3,
+        "taken_courses": 25,
+        "uploads": 4,
+        "upload_videos": 2,
+        "news": 2,
+    }
+
+    def seed(self, seed, counts=None):
+        seed_database(counts or self.counts, seed=seed, stdout=lambda message: None)
+        return (
+            list(Course.objects.values_list("code", "title", "slug")),
+            list(User.objects.values_list("username", "first_name", "email")),
+            list(TakenCourse.objects.values_list("course__code", "total")),
+        )
+
+    def seed_and_roll_back(self, seed, counts=None):
+        try:
+            with transaction.atomic():
+                data = self.seed(seed, counts)
+                raise RuntimeError
+        except RuntimeError:
+            return data
+
+    def test_rows_are_created_in_bulk(self):
+        self.seed(0)
+        self.assertEqual(Course.objects.count(), 6)
+        self.assertEqual(Student.objects.count(), 10)
+        self.assertEqual(Parent.objects.count(), 3)
+        self.assertEqual(TakenCourse.objects.count(), 25)
+        self.assertEqual(CourseAllocation.objects.count(), 2)
+        # no receiver ran...
+        self.assertFalse(ActivityLog.objects.exists())
+        self.assertFalse(OutboxEmail.objects.exists())
+        # ...but what they maintain was rebuilt
+        self.assertEqual(GradeLedger.objects.mismatches(), [])
+        self.assertTrue(SearchEntry.objects.exists())
+
+    def test_rows_are_written_in_batches(self):
+        with QueryCounter() as small:
+            self.seed_and_roll_back(0)
+        with QueryCounter() as large:
+            self.seed_and_roll_back(
+                0, {name: count * 10 for name, count in self.counts.items()}
+            )
+        # ten times the rows, only a few more batches
+        self.assertLess(large.count, small.count * 1.5)
+
+    def test_same_seed_same_data(self):
+        first = self.seed_and_roll_back(1)
+        self.assertEqual(self.seed_and_roll_back(1), first)
+        self.assertNotEqual(self.seed_and_roll_back(2), first)
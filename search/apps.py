@@ -3,3 +3,19 @@ from django.apps import AppConfig
 
 class SearchConfig(AppConfig):
     name = "search"
+
+    def ready(self) -> None:
+        from django.db.models.signals import post_delete, post_migrate, post_save
+        from .index import indexed_models
+        from .signals import (
+            post_delete_search_receiver,
+            post_migrate_search_receiver,
+            post_save_search_receiver,
+        )
+
+        for model in indexed_models():
+            post_save.connect(post_save_search_receiver, sender=model)
+            post_delete.connect(post_delete_search_receiver, sender=model)
+        post_migrate.connect(post_migrate_search_receiver, sender=self)
+
+        return super().ready()
@@ -0,0 +1,183 @@
+"""
+A small inverted index over the searchable models. Every indexed object gets
+a SearchEntry whose words are stored as SearchTerm rows, kept in sync by the
+post_save/post_delete signals connected in SearchConfig.ready(). Searching
+is a single grouped query over the term index instead of one icontains scan
+per model.
+"""
+
+import re
+from collections import Counter, defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Case, IntegerField, Max, Q, Sum, Value, When
+
+from .models import SearchEntry, SearchTerm
+
+# model label -> {field: weight}
+SEARCH_FIELDS = {
+    "core.NewsAndEvents": {"title": 3, "summary": 1, "posted_as": 1},
+    "course.Program": {"title": 3, "summary": 1},
+    "course.Course": {"title": 3, "code": 3, "summary": 1, "slug": 1},
+    "quiz.Quiz": {"title": 3, "description": 1, "category": 1, "slug": 1},
+}
+
+# related objects the search results template displays
+SEARCH_SELECT_RELATED = {
+    "course.Course": ["program"],
+    "quiz.Quiz": ["course"],
+}
+
+# Searches never return more hits than this, however common the words are.
+SEARCH_RESULT_WINDOW = 200
+
+TERM_MAX_LENGTH = SearchTerm._meta.get_field("term").max_length
+WORD_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return [word[:TERM_MAX_LENGTH] for word in WORD_RE.findall(str(text).lower())]
+
+
+def indexed_models():
+    return [apps.get_model(label) for label in SEARCH_FIELDS]
+
+
+def _field_values(instance, field):
+    # index every translation of modeltranslation fields
+    values = [getattr(instance, field, None)]
+    for code, _name in settings.LANGUAGES:
+        values.append(getattr(instance, f"{field}_{code}", None))
+    return {value for value in values if value}
+
+
+def get_terms(instance):
+    """Return {term: weight} for the words of an indexed instance."""
+    terms = Counter()
+    for field, weight in SEARCH_FIELDS[instance._meta.label].items():
+        for value in _field_values(instance, field):
+            for word in set(tokenize(value)):
+                terms[word] += weight
+    return terms
+
+
+def index_instance(instance):
+    content_type = ContentType.objects.get_for_model(instance)
+    with transaction.atomic():
+        entry, created = SearchEntry.objects.get_or_create(
+            content_type=content_type, object_id=instance.pk
+        )
+        if not created:
+            entry.terms.all().delete()
+        SearchTerm.objects.bulk_create(
+            SearchTerm(term=term, entry=entry, weight=weight)
+            for term, weight in get_terms(instance).items()
+        )
+
+
+def remove_instance(instance):
+    SearchEntry.objects.filter(
+        content_type=ContentType.objects.get_for_model(instance),
+        object_id=instance.pk,
+    ).delete()
+
+
+def rebuild_index(batch_size=500):
+    """Drop the whole index and re-index every object of the indexed models."""
+    with transaction.atomic():
+        SearchEntry.objects.all().delete()
+        for model in indexed_models():
+            content_type = ContentType.objects.get_for_model(model)
+            instances = model.objects.order_by("pk").iterator(chunk_size=batch_size)
+            batch = []
+            for instance in instances:
+                batch.append(instance)
+                if len(batch) >= batch_size:
+                    _index_batch(content_type, batch)
+                    batch = []
+            _index_batch(content_type, batch)
+    return SearchEntry.objects.count()
+
+
+def _index_batch(content_type, instances):
+    entries = SearchEntry.objects.bulk_create(
+        SearchEntry(content_type=content_type, object_id=instance.pk)
+        for instance in instances
+    )
+    SearchTerm.objects.bulk_create(
+        (
+            SearchTerm(term=term, entry=entry, weight=weight)
+            for entry, instance in zip(entries, instances)
+            for term, weight in get_terms(instance).items()
+        ),
+        batch_size=1000,
+    )
+
+
+def _prefix(term):
+    # a range instead of startswith so the term index can be used
+    return Q(term__gte=term, term__lt=term + "\uffff")
+
+
+def search(query, limit=SEARCH_RESULT_WINDOW):
+    """
+    Return up to `limit` hits for the query, best first, as dicts with the
+    entry's content_type_id and object_id. Every word of the query must
+    match the start of an indexed word; titles and codes rank higher.
+    """
+    words = list(dict.fromkeys(tokenize(query)))
+    if not words:
+        return []
+
+    matches = {
+        f"match_{i}": Max(
+            Case(When(_prefix(word), then=Value(1)), default=Value(0)),
+            output_field=IntegerField(),
+        )
+        for i, word in enumerate(words)
+    }
+    condition = Q()
+    for word in words:
+        condition |= _prefix(word)
+
+    hits = (
+        SearchTerm.objects.filter(condition)
+        .values("entry_id", "entry__content_type_id", "entry__object_id")
+        .annotate(score=Sum("weight"), **matches)
+        .filter(**{name: 1 for name in matches})
+        .order_by("-score", "-entry__object_id")
+    )
+    return [
+        {
+            "content_type_id": hit["entry__content_type_id"],
+            "object_id": hit["entry__object_id"],
+            "score": hit["score"],
+        }
+        for hit in hits[:limit]
+    ]
+
+
+def load_objects(hits):
+    """Fetch the objects of the given hits, one query per model, in order."""
+    ids = defaultdict(list)
+    for hit in hits:
+        ids[hit["content_type_id"]].append(hit["object_id"])
+
+    objects = {}
+    for content_type_id, object_ids in ids.items():
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        queryset = model.objects.filter(pk__in=object_ids)
+        related = SEARCH_SELECT_RELATED.get(model._meta.label)
+        if related:
+            queryset = queryset.select_related(*related)
+        for obj in queryset:
+            objects[content_type_id, obj.pk] = obj
+
+    return [
+        objects[key]
+        for key in ((hit["content_type_id"], hit["object_id"]) for hit in hits)
+        if key in objects
+    ]
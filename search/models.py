@@ -1,3 +1,37 @@
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
 from django.db import models
 
-# Create your models here.
+
+class SearchEntry(models.Model):
+    """One indexed object (a program, course, quiz or news item)."""
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    content_object = GenericForeignKey("content_type", "object_id")
+
+    class Meta:
+        unique_together = ("content_type", "object_id")
+        verbose_name_plural = "Search entries"
+
+    def __str__(self):
+        return f"{self.content_type.model} #{self.object_id}"
+
+
+class SearchTerm(models.Model):
+    """
+    Inverted index row: a normalized word and the weight it carries for an
+    entry (words found in titles and codes weigh more than in summaries).
+    """
+
+    term = models.CharField(max_length=64)
+    entry = models.ForeignKey(
+        SearchEntry, on_delete=models.CASCADE, related_name="terms"
+    )
+    weight = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        unique_together = ("term", "entry")
+
+    def __str__(self):
+        return self.term
@@ -0,0 +1,24 @@
+from .index import index_instance, remove_instance
+
+
+def post_save_search_receiver(sender, instance=None, raw=False, **kwargs):
+    """
+    Keep the search index entry of an indexed object up to date
+    """
+    if not raw:
+        index_instance(instance)
+
+
+def post_delete_search_receiver(sender, instance=None, **kwargs):
+    remove_instance(instance)
+
+
+def post_migrate_search_receiver(sender, **kwargs):
+    """
+    Build the index the first time the search tables exist
+    """
+    from .index import rebuild_index
+    from .models import SearchEntry
+
+    if not SearchEntry.objects.exists():
+        rebuild_index()
@@ -1,3 +1,84 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.urls import reverse
 
-# Create your tests here.
+from accounts.models import User
+from core.models import NewsAndEvents
+from course.models import Program, Course
+from quiz.models import Quiz
+from .index import rebuild_index, search, load_objects
+from .models import SearchEntry
+
+
+class SearchIndexTestCase(TestCase):
+    def setUp(self):
+        self.program = Program.objects.create(
+            title="Computer Science", summary="Programs about computers"
+        )
+        self.course = Course.objects.create(
+            title="Compiler Construction",
+            code="CS401",
+            credit=3,
+            program=self.program,
+            level="Bachelor",
+            semester="First",
+        )
+        self.quiz = Quiz.objects.create(
+            course=self.course, title="Parsing quiz", category="exam"
+        )
+        self.news = NewsAndEvents.objects.create(
+            title="Science fair", summary="Annual event", posted_as="Event"
+        )
+
+    def search_objects(self, query):
+        return load_objects(search(query))
+
+    def test_objects_are_indexed_on_save(self):
+        self.assertEqual(self.search_objects("parsing"), [self.quiz])
+        self.assertEqual(self.search_objects("cs401"), [self.course])
+
+    def test_prefix_and_all_words_must_match(self):
+        self.assertEqual(set(self.search_objects("comp")), {self.program, self.course})
+        self.assertEqual(self.search_objects("computer science"), [self.program])
+
+    def test_titles_rank_first(self):
+        program = Program.objects.create(title="Annual report")
+        self.assertEqual(self.search_objects("annual"), [program, self.news])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.course.code = "CS999"
+        self.course.save()
+        self.assertEqual(self.search_objects("cs401"), [])
+        self.assertEqual(self.search_objects("cs999"), [self.course])
+
+        self.program.delete()
+        self.assertEqual(self.search_objects("computer"), [])
+        self.assertEqual(self.search_objects("cs999"), [])
+        self.assertEqual(SearchEntry.objects.count(), 1)
+
+    def test_rebuild(self):
+        SearchEntry.objects.all().delete()
+        self.assertEqual(rebuild_index(), 4)
+        self.assertEqual(self.search_objects("parsing"), [self.quiz])
+
+    def test_result_window_is_bounded(self):
+        for i in range(5):
+            Program.objects.create(title=f"Science {i}")
+        self.assertEqual(len(search("science", limit=3)), 3)
+
+
+@override_settings(
+    LANGUAGE_CODE="en",
+    STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage",
+)
+class SearchViewTestCase(TestCase):
+    def setUp(self):
+        Program.objects.create(title="Computer Science")
+
+    def test_search_view(self):
+        self.client.force_login(
+            User.objects.create_superuser(username="admin", password="password")
+        )
+        response = self.client.get(reverse("query"), {"q": "computer"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["count"], 1)
+        self.assertContains(response, "Computer Science")
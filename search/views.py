@@ -1,8 +1,6 @@
-from itertools import chain
 from django.views.generic import ListView
-from core.models import NewsAndEvents
-from course.models import Program, Course
-from quiz.models import Quiz
+
+from .index import load_objects, search
 
 
 class SearchView(ListView):
@@ -12,27 +10,17 @@ class SearchView(ListView):
 
     def get_context_data(self, *args, **kwargs):
         context = super().get_context_data(*args, **kwargs)
+        # only the hits of the current page are loaded from their tables
+        context["object_list"] = load_objects(context["object_list"])
         context["count"] = self.count or 0
         context["query"] = self.request.GET.get("q")
         return context
 
     def get_queryset(self):
-        request = self.request
-        query = request.GET.get("q", None)
+        query = self.request.GET.get("q", None)
 
         if query is not None:
-            news_events_results = NewsAndEvents.objects.search(query)
-            program_results = Program.objects.search(query)
-            course_results = Course.objects.search(query)
-            quiz_results = Quiz.objects.search(query)
-
-            # combine querysets
-            queryset_chain = chain(
-                news_events_results, program_results, course_results, quiz_results
-            )
-            queryset = sorted(
-                queryset_chain, key=lambda instance: instance.pk, reverse=True
-            )
-            self.count = len(queryset)  # since queryset is actually a list
-            return queryset
-        return NewsAndEvents.objects.none()  # just an empty queryset as default
+            hits = search(query)
+            self.count = len(hits)  # bounded by SEARCH_RESULT_WINDOW
+            return hits
+        return []
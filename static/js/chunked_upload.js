@@ -0,0 +1,152 @@
+"use strict";
+
+// #################################
+// chunked uploads (see course/chunked.py)
+//
+// Forms with a data-chunked-upload attribute (the URL starting an upload)
+// send their file in chunks instead of one multipart POST. A chunk that
+// fails is retried from the offset the server reports, so a dropped
+// connection only costs the chunk in flight. Each chunk is hashed on its
+// own and the file's checksum is the SHA-256 of the chunks' hex digests,
+// so the file is never read into memory as a whole.
+
+const CHUNK_RETRIES = 5;
+
+function csrfToken(form) {
+  return form.querySelector("[name=csrfmiddlewaretoken]").value;
+}
+
+async function sha256(blob) {
+  if (!window.crypto || !crypto.subtle) {
+    // not a secure context, the server accepts chunks without checksum
+    return null;
+  }
+  const digest = await crypto.subtle.digest("SHA-256", await blob.arrayBuffer());
+  return Array.from(new Uint8Array(digest))
+    .map((byte) => byte.toString(16).padStart(2, "0"))
+    .join("");
+}
+
+async function request(form, url, options) {
+  const headers = Object.assign(
+    { "X-CSRFToken": csrfToken(form) },
+    options.headers || {}
+  );
+  const response = await fetch(url, Object.assign({}, options, { headers }));
+  const data = await response.json().catch(() => ({}));
+  return { ok: response.ok, status: response.status, data };
+}
+
+async function sendChunks(form, state, file, progress) {
+  // the digest of the chunk at each offset, for the file's checksum
+  const digests = new Map();
+  let offset = state.offset;
+  let retries = 0;
+  while (offset < file.size) {
+    const chunk = file.slice(offset, offset + state.chunk_size);
+    const headers = { "Content-Type": "application/octet-stream" };
+    const checksum = await sha256(chunk);
+    if (checksum) {
+      headers["X-Chunk-SHA256"] = checksum;
+      digests.set(offset, checksum);
+    }
+    let result;
+    try {
+      result = await request(form, `${state.url}?offset=${offset}`, {
+        method: "PUT",
+        headers,
+        body: chunk,
+      });
+    } catch (error) {
+      result = { ok: false, status: 0, data: {} };
+    }
+    if (result.ok) {
+      offset = result.data.offset;
+      retries = 0;
+      progress(offset / file.size);
+      continue;
+    }
+    if (result.status === 400 || result.status === 413 || retries >= CHUNK_RETRIES) {
+      throw new Error(result.data.error || gettext("The upload failed."));
+    }
+    retries += 1;
+    await new Promise((resolve) => setTimeout(resolve, 1000 * 2 ** retries));
+    // resume from wherever the server got to
+    const current = await request(form, state.url, { method: "GET" }).catch(
+      () => null
+    );
+    if (current && current.ok) {
+      offset = current.data.offset;
+    } else if (result.data.offset !== undefined) {
+      offset = result.data.offset;
+    }
+  }
+  return digests;
+}
+
+async function combinedChecksum(digests, file, chunkSize) {
+  const chunks = [];
+  for (let offset = 0; offset < file.size; offset += chunkSize) {
+    if (!digests.has(offset)) {
+      return null;
+    }
+    chunks.push(digests.get(offset));
+  }
+  return sha256(new Blob([chunks.join("")]));
+}
+
+async function chunkedUpload(form) {
+  const fileInput = form.querySelector("input[type=file]");
+  const file = fileInput.files[0];
+  const progress = form.querySelector(".chunked-upload-progress");
+  const showProgress = (fraction) => {
+    progress.classList.remove("d-none");
+    progress.firstElementChild.style.width = `${Math.round(fraction * 100)}%`;
+  };
+
+  const start = new FormData();
+  start.append("kind", form.dataset.chunkedUploadKind);
+  start.append("title", form.querySelector("[name=title]").value);
+  start.append("filename", file.name);
+  start.append("size", file.size);
+  const started = await request(form, form.dataset.chunkedUpload, {
+    method: "POST",
+    body: start,
+  });
+  if (!started.ok) {
+    throw new Error(started.data.error || gettext("The upload failed."));
+  }
+  showProgress(0);
+  const digests = await sendChunks(form, started.data, file, showProgress);
+
+  const finalize = new FormData();
+  const checksum = await combinedChecksum(digests, file, started.data.chunk_size);
+  if (checksum) {
+    finalize.append("chunks_sha256", checksum);
+  }
+  const finalized = await request(form, started.data.finalize_url, {
+    method: "POST",
+    body: finalize,
+  });
+  if (!finalized.ok) {
+    throw new Error(finalized.data.error || gettext("The upload failed."));
+  }
+  window.location = finalized.data.redirect;
+}
+
+document.querySelectorAll("form[data-chunked-upload]").forEach((form) => {
+  form.addEventListener("submit", (event) => {
+    const fileInput = form.querySelector("input[type=file]");
+    if (!window.fetch || !fileInput.files.length) {
+      // let the regular form submission show the validation errors
+      return;
+    }
+    event.preventDefault();
+    const button = form.querySelector("button[type=submit]");
+    button.disabled = true;
+    chunkedUpload(form).catch((error) => {
+      button.disabled = false;
+      window.alert(error.message);
+    });
+  });
+});